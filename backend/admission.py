@@ -0,0 +1,219 @@
+# admission.py
+"""Admission control: per-route-class concurrency limits and bounded queues.
+
+Requests are sorted into classes by path prefix (ROUTE_CLASSES). Each
+class runs at most ADMISSION_<CLASS>_CONCURRENCY requests at once. The
+next ADMISSION_<CLASS>_QUEUE wait in FIFO order, for at most
+ADMISSION_<CLASS>_QUEUE_TIMEOUT seconds. Overflow is rejected straight
+away, before the request body is read:
+  429 – the class's queue is full
+  503 – the request waited its whole queue timeout, or it was shed
+Both carry Retry-After.
+
+Classes have a priority (0 is most urgent). While a more urgent class
+has requests queued, new requests of less urgent classes are shed. So a
+burst of voice webhooks pushes dashboard polling out rather than the
+other way round. A burst of bcrypt logins or dashboard queries only fills
+its own class and cannot starve the webhook.
+
+Health, metrics and streaming endpoints (SSE, WebSocket) and CORS
+preflights are never limited.
+Limits are per worker process.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from observability import registry
+
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "on").lower() != "off"
+
+QUEUE_WAIT = registry.histogram(
+    "admission_queue_wait_seconds", "Time requests waited for an admission slot", ("class",),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+REJECTIONS = registry.counter(
+    "admission_rejections_total", "Requests turned away by admission control", ("class", "reason")
+)
+IN_FLIGHT = registry.gauge("admission_in_flight", "Requests running per admission class", ("class",))
+QUEUED = registry.gauge("admission_queued", "Requests waiting per admission class", ("class",))
+
+QUEUE_FULL = "queue_full"
+QUEUE_TIMEOUT = "queue_timeout"
+SHED = "shed"
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def status_code(self) -> int:
+        return 429 if self.reason == QUEUE_FULL else 503
+
+
+def _setting(name: str, key: str, default: str) -> str:
+    return os.getenv(f"ADMISSION_{name.upper()}_{key}", default)
+
+
+@dataclass
+class RouteClass:
+    name: str
+    priority: int
+    concurrency: int
+    max_queue: int
+    queue_timeout: float
+    active: int = 0
+    _waiters: deque = field(default_factory=deque)
+
+    @classmethod
+    def from_env(cls, name: str, priority: int, concurrency: int, max_queue: int, queue_timeout: float) -> "RouteClass":
+        return cls(
+            name,
+            priority,
+            int(_setting(name, "CONCURRENCY", str(concurrency))),
+            int(_setting(name, "QUEUE", str(max_queue))),
+            float(_setting(name, "QUEUE_TIMEOUT", str(queue_timeout))),
+        )
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _update_gauges(self) -> None:
+        IN_FLIGHT.set(self.active, **{"class": self.name})
+        QUEUED.set(len(self._waiters), **{"class": self.name})
+
+    async def acquire(self) -> float:
+        """Wait for a slot; returns the seconds waited or raises Rejected"""
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            self._update_gauges()
+            return 0.0
+        if len(self._waiters) >= self.max_queue:
+            raise Rejected(QUEUE_FULL, self.queue_timeout)
+
+        started = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._update_gauges()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if waiter.done() and not waiter.cancelled():
+                # Handed a slot just as we gave up: pass it on
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+                self._update_gauges()
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+            raise Rejected(QUEUE_TIMEOUT, self.queue_timeout)
+        return time.perf_counter() - started
+
+    def release(self) -> None:
+        # The slot passes straight to the oldest waiter, so `active` is unchanged
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._update_gauges()
+                return
+        self.active -= 1
+        self._update_gauges()
+
+
+# Order matters: the first matching prefix wins
+ROUTE_CLASSES = (
+    ("/api/webhook", "webhook"),
+    ("/api/auth/login", "auth"),
+    ("/api/auth/register", "auth"),
+    ("/api/dashboard", "dashboard"),
+)
+EXEMPT_PREFIXES = ("/health", "/metrics", "/api/messages/stream", "/api/messages/ws")
+DEFAULT_CLASS = "default"
+
+
+def default_classes() -> Dict[str, RouteClass]:
+    return {
+        route_class.name: route_class
+        for route_class in (
+            # Voice turns: cheap to hold (awaiting upstreams), expensive to delay
+            RouteClass.from_env("webhook", 0, concurrency=64, max_queue=256, queue_timeout=2.0),
+            RouteClass.from_env(DEFAULT_CLASS, 1, concurrency=32, max_queue=128, queue_timeout=5.0),
+            # bcrypt holds a CPU for ~100-300ms per request
+            RouteClass.from_env("auth", 1, concurrency=4, max_queue=32, queue_timeout=5.0),
+            RouteClass.from_env("dashboard", 2, concurrency=4, max_queue=16, queue_timeout=5.0),
+        )
+    }
+
+
+def classify(path: str, method: str = "GET") -> Optional[str]:
+    """Admission class for a request; None when it is never limited"""
+    # Preflights are answered by CORSMiddleware without touching a route
+    if method == "OPTIONS" or path.startswith(EXEMPT_PREFIXES):
+        return None
+    for prefix, name in ROUTE_CLASSES:
+        if path.startswith(prefix):
+            return name
+    return DEFAULT_CLASS
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware; place it outside anything that does real work"""
+
+    def __init__(self, app, classes: Optional[Dict[str, RouteClass]] = None):
+        self.app = app
+        self.classes = classes or default_classes()
+
+    def _shed(self, route_class: RouteClass) -> bool:
+        return any(
+            other.priority < route_class.priority and other.queued
+            for other in self.classes.values()
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        name = classify(scope["path"], scope["method"])
+        route_class = self.classes.get(name) if name else None
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        labels = {"class": route_class.name}
+        try:
+            if self._shed(route_class):
+                raise Rejected(SHED, 1.0)
+            waited = await route_class.acquire()
+        except Rejected as rejected:
+            REJECTIONS.inc(reason=rejected.reason, **labels)
+            await self._reject(send, rejected)
+            return
+        QUEUE_WAIT.observe(waited, **labels)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route_class.release()
+
+    @staticmethod
+    async def _reject(send, rejected: Rejected) -> None:
+        body = json.dumps({"detail": "Server busy, please retry", "reason": rejected.reason}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": rejected.status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, round(rejected.retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,54 @@
+"""add full-text search vectors and trigram indexes
+
+Revision ID: 7c2e4f1a9b3d
+Revises: 3053f58012d5
+Create Date: 2026-10-19 09:00:00.000000+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# table -> free-text column indexed next to `name`
+SEARCHABLE = {
+    "companies": "details",
+    "products":  "description",
+    "offerings": "description",
+}
+
+# revision identifiers, used by Alembic.
+revision = '7c2e4f1a9b3d'
+down_revision = '3053f58012d5'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    for table, body in SEARCHABLE.items():
+        # 'simple' config: the seeded data is mixed Armenian/English and
+        # Postgres ships no Armenian stemmer.
+        op.execute(
+            f"""
+            ALTER TABLE {table}
+            ADD COLUMN search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce({body}, '')), 'B')
+            ) STORED
+            """
+        )
+        op.create_index(
+            f"ix_{table}_search_vector", table, ["search_vector"],
+            postgresql_using="gin",
+        )
+        op.create_index(
+            f"ix_{table}_name_trgm", table, ["name"],
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        )
+
+def downgrade() -> None:
+    for table in SEARCHABLE:
+        op.drop_index(f"ix_{table}_name_trgm", table_name=table)
+        op.drop_index(f"ix_{table}_search_vector", table_name=table)
+        op.drop_column(table, "search_vector")
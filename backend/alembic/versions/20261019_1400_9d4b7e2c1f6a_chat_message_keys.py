@@ -0,0 +1,43 @@
+"""chat messages: company / conversation keys and keyset indexes
+
+Revision ID: 9d4b7e2c1f6a
+Revises: 7c2e4f1a9b3d
+Create Date: 2026-10-19 14:00:00.000000+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '9d4b7e2c1f6a'
+down_revision = '7c2e4f1a9b3d'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('chat_messages', sa.Column('company_id', sa.Integer(), nullable=True))
+    op.add_column('chat_messages', sa.Column('conversation_id', sa.String(length=64), server_default='default', nullable=False))
+    op.create_foreign_key(
+        'fk_chat_messages_company_id', 'chat_messages', 'companies', ['company_id'], ['id'], ondelete='CASCADE'
+    )
+
+    # Older rows may predate the server default; the keyset cursor needs a value
+    op.execute("UPDATE chat_messages SET created_at = now() WHERE created_at IS NULL")
+    op.alter_column('chat_messages', 'created_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+
+    op.create_index(
+        'ix_chat_messages_conversation_created', 'chat_messages',
+        ['company_id', 'conversation_id', 'created_at', 'id'], unique=False,
+    )
+    op.create_index(
+        'ix_chat_messages_company_created', 'chat_messages',
+        ['company_id', 'created_at', 'id'], unique=False,
+    )
+
+def downgrade() -> None:
+    op.drop_index('ix_chat_messages_company_created', table_name='chat_messages')
+    op.drop_index('ix_chat_messages_conversation_created', table_name='chat_messages')
+    op.alter_column('chat_messages', 'created_at', existing_type=sa.DateTime(timezone=True), nullable=True)
+    op.drop_constraint('fk_chat_messages_company_id', 'chat_messages', type_='foreignkey')
+    op.drop_column('chat_messages', 'conversation_id')
+    op.drop_column('chat_messages', 'company_id')
@@ -0,0 +1,21 @@
+"""chat messages: meta column for logged assistant turns
+
+Revision ID: 4a8f3c6d2e71
+Revises: 9d4b7e2c1f6a
+Create Date: 2026-10-19 15:00:00.000000+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '4a8f3c6d2e71'
+down_revision = '9d4b7e2c1f6a'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('chat_messages', sa.Column('meta', sa.JSON(), nullable=True))
+
+def downgrade() -> None:
+    op.drop_column('chat_messages', 'meta')
@@ -0,0 +1,32 @@
+"""vector outbox: company changes waiting to reach Qdrant
+
+Revision ID: b3e91d5a7c24
+Revises: 4a8f3c6d2e71
+Create Date: 2026-10-19 16:00:00.000000+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b3e91d5a7c24'
+down_revision = '4a8f3c6d2e71'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'vector_outbox',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), primary_key=True),
+        sa.Column('company_id', sa.Integer(), nullable=False),
+        sa.Column('op', sa.String(length=16), nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('available_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+    op.create_index('ix_vector_outbox_available', 'vector_outbox', ['available_at', 'id'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index('ix_vector_outbox_available', table_name='vector_outbox')
+    op.drop_table('vector_outbox')
@@ -0,0 +1,33 @@
+"""vector outbox: claim leases and dead letters
+
+Revision ID: e1c7a4f02b98
+Revises: b3e91d5a7c24
+Create Date: 2026-10-19 17:00:00.000000+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e1c7a4f02b98'
+down_revision = 'b3e91d5a7c24'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('vector_outbox', sa.Column('leased_until', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('vector_outbox', sa.Column('dead_lettered_at', sa.DateTime(timezone=True), nullable=True))
+    # Dead letters pile up at the old end of the claim index; keep them out of it
+    op.drop_index('ix_vector_outbox_available', table_name='vector_outbox')
+    op.create_index(
+        'ix_vector_outbox_available', 'vector_outbox', ['available_at', 'id'], unique=False,
+        postgresql_where=sa.text('dead_lettered_at IS NULL'),
+    )
+    op.create_index('ix_vector_outbox_company', 'vector_outbox', ['company_id'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index('ix_vector_outbox_company', table_name='vector_outbox')
+    op.drop_index('ix_vector_outbox_available', table_name='vector_outbox')
+    op.create_index('ix_vector_outbox_available', 'vector_outbox', ['available_at', 'id'], unique=False)
+    op.drop_column('vector_outbox', 'dead_lettered_at')
+    op.drop_column('vector_outbox', 'leased_until')
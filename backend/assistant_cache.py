@@ -0,0 +1,132 @@
+# assistant_cache.py
+"""Embedding and answer caches for the assistant webhook.
+
+Both are keyed by the normalised question text (case and whitespace
+folded), so repeated calls skip the OpenAI round trips. prewarm.py fills
+them from recent call logs at startup.
+
+Embeddings depend only on the text and model, so they just age out. An
+answer also depends on catalog data. A tenant's answers come from that
+tenant's rows only, so each records the tenant's version in
+`tenant_cache.catalog_cache`, and only a write to that company, its
+products or its offerings (in any worker) makes them stale. Answers
+without a tenant may draw on any company and go stale on every write.
+Stale answers are kept until replaced or aged out: `get_stale()` still
+serves them while an upstream circuit is open.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, List, Optional
+
+from observability import registry
+from tenant_cache import catalog_cache
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("ASSISTANT_EMBEDDING_CACHE_SIZE", "4096"))
+EMBEDDING_CACHE_TTL = float(os.getenv("ASSISTANT_EMBEDDING_CACHE_TTL", "86400"))
+ANSWER_CACHE_SIZE = int(os.getenv("ASSISTANT_ANSWER_CACHE_SIZE", "2048"))
+ANSWER_CACHE_TTL = float(os.getenv("ASSISTANT_ANSWER_CACHE_TTL", "3600"))
+
+CACHE_REQUESTS = registry.counter("assistant_cache_requests_total", "Assistant cache lookups", ("cache", "result"))
+CACHE_ENTRIES = registry.gauge("assistant_cache_entries", "Entries held by the assistant caches", ("cache",))
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split())
+
+
+class TTLCache:
+    """Thread-safe LRU with a per-entry age limit"""
+
+    def __init__(self, name: str, max_entries: int, ttl: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        CACHE_REQUESTS.inc(cache=self.name, result="hit" if entry is not None else "miss")
+        return entry[1] if entry is not None else None
+
+    def put(self, key: Hashable, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            CACHE_ENTRIES.set(len(self._entries), cache=self.name)
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            CACHE_ENTRIES.set(len(self._entries), cache=self.name)
+
+
+class EmbeddingCache:
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE, ttl: float = EMBEDDING_CACHE_TTL):
+        self._cache = TTLCache("embedding", max_entries, ttl)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def get(self, text: str) -> Optional[List[float]]:
+        return self._cache.get(normalize_question(text))
+
+    def put(self, text: str, vector: List[float]) -> None:
+        self._cache.put(normalize_question(text), vector)
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL):
+        self._cache = TTLCache("answer", max_entries, ttl)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def begin(self) -> int:
+        """Catalog generation to take before answering, passed back to put()"""
+        return catalog_cache.begin()
+
+    @staticmethod
+    def _version(company_id: Optional[int]) -> int:
+        # Untenanted answers may come from any company: every write counts
+        return catalog_cache.version(company_id) if company_id is not None else catalog_cache.begin()
+
+    def get(self, company_id: Optional[int], question: str) -> Optional[str]:
+        key = (company_id, normalize_question(question))
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        version, answer = entry
+        if version != self._version(company_id):
+            CACHE_REQUESTS.inc(cache="answer", result="stale")
+            return None
+        return answer
+
+    def get_stale(self, company_id: Optional[int], question: str) -> Optional[str]:
+        """The last answer whatever the catalog generation, for degraded mode"""
+        entry = self._cache.get((company_id, normalize_question(question)))
+        return entry[1] if entry is not None else None
+
+    def put(self, company_id: Optional[int], question: str, answer: str, generation: int) -> None:
+        version = self._version(company_id)
+        # The tenant changed while answering: the answer may predate the write
+        if version > generation:
+            return
+        self._cache.put((company_id, normalize_question(question)), (version, answer))
+
+
+embedding_cache = EmbeddingCache()
+answer_cache = AnswerCache()
@@ -0,0 +1,160 @@
+# catalog_facts.py
+"""Structured fast path for price / stock questions.
+
+"How much is X?" and "Is Y in stock?" are answered straight from
+`products` / `offerings` with a templated sentence, no embedding or LLM
+call. Anything that is not clearly a catalog lookup returns None and the
+caller falls through to the RAG pipeline.
+"""
+import logging
+import re
+from dataclasses import dataclass, replace
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from models import Offering, Product
+from search import mentions, search_catalog, search_tokens
+
+logger = logging.getLogger(__name__)
+
+MAX_LISTED_ITEMS = 3
+
+PRICE = "price"
+STOCK = "stock"
+
+# English and Armenian cues; checked against the lower-cased question
+_INTENT_PATTERNS = (
+    (STOCK, re.compile(r"\b(in stock|out of stock|stock|available|availability|how many (are )?left)\b|առկա|պահեստ")),
+    (PRICE, re.compile(r"\b(how much|price|prices|cost|costs|pricing|fee|fees)\b|արժե|գին|վճար")),
+)
+
+
+@dataclass
+class CatalogItem:
+    kind: str
+    name: str
+    company_id: int
+    price: Optional[Decimal]
+    currency: Optional[str]
+    stock_qty: Optional[int]
+
+
+def detect_intent(question: str) -> Optional[str]:
+    """Return PRICE, STOCK or None for an open-ended question"""
+    text = question.lower()
+    for intent, pattern in _INTENT_PATTERNS:
+        if pattern.search(text):
+            return intent
+    return None
+
+
+def _candidate_ids(db: Session, question: str, company_id: Optional[int]):
+    """(kind, id) pairs whose name appears in the question, via the search indexes"""
+    question_tokens = search_tokens(question)
+    try:
+        rows, _ = search_catalog(
+            db, question, company_id=company_id, kinds=("product", "offering"), limit=20, match_any=True
+        )
+        named = [(row.kind, row.id, row.name) for row in rows]
+    except SQLAlchemyError:
+        # No full-text support (e.g. SQLite): scan the tenant's catalog names
+        logger.debug("Catalog full-text search unavailable, scanning names", exc_info=True)
+        db.rollback()
+        if company_id is None:
+            return []
+        named = [
+            (kind, row.id, row.name)
+            for model, kind in ((Product, "product"), (Offering, "offering"))
+            for row in db.query(model.id, model.name).filter(model.company_id == company_id)
+        ]
+    matched = [(kind, row_id, name) for kind, row_id, name in named if mentions(question_tokens, name)]
+    # "knee brace xl" should not also match a plain "knee brace"
+    return [
+        (kind, row_id)
+        for kind, row_id, name in matched
+        if not any(other != name and mentions(search_tokens(other), name) for _, _, other in matched)
+    ]
+
+
+def lookup_items(db: Session, question: str, company_id: Optional[int]) -> List[CatalogItem]:
+    candidates = _candidate_ids(db, question, company_id)
+    product_ids = [row_id for kind, row_id in candidates if kind == "product"]
+    offering_ids = [row_id for kind, row_id in candidates if kind == "offering"]
+
+    items: List[CatalogItem] = []
+    if product_ids:
+        for row in db.query(
+            Product.name, Product.company_id, Product.price, Product.stock_qty
+        ).filter(Product.id.in_(product_ids)):
+            items.append(CatalogItem("product", row.name, row.company_id, row.price, None, row.stock_qty))
+    if offering_ids:
+        for row in db.query(
+            Offering.name, Offering.company_id, Offering.price, Offering.currency
+        ).filter(Offering.id.in_(offering_ids)):
+            items.append(CatalogItem("offering", row.name, row.company_id, row.price, row.currency, None))
+
+    # Products have no currency column: they are priced in their tenant's
+    unpriced = {item.company_id for item in items if item.currency is None}
+    if unpriced:
+        currencies = tenant_currencies(db, unpriced)
+        items = [
+            replace(item, currency=currencies.get(item.company_id)) if item.currency is None else item
+            for item in items
+        ]
+    return items
+
+
+def tenant_currencies(db: Session, company_ids: Iterable[int]) -> Dict[int, str]:
+    """The one currency each company prices its offerings in; companies using none or several are left out"""
+    seen: Dict[int, set] = {}
+    for company_id, currency in (
+        db.query(Offering.company_id, Offering.currency)
+        .filter(Offering.company_id.in_(list(company_ids)), Offering.currency.isnot(None))
+        .distinct()
+    ):
+        seen.setdefault(company_id, set()).add(currency)
+    return {company_id: found.pop() for company_id, found in seen.items() if len(found) == 1}
+
+
+def format_price(price: Decimal, currency: Optional[str]) -> str:
+    amount = f"{price:,.2f}".rstrip("0").rstrip(".")
+    # No guessing: a wrong currency is worse than none
+    return f"{amount} {currency}" if currency else amount
+
+
+def _price_sentence(item: CatalogItem) -> Optional[str]:
+    if item.price is None:
+        return None
+    return f"{item.name} costs {format_price(item.price, item.currency)}."
+
+
+def _stock_sentence(item: CatalogItem) -> Optional[str]:
+    if item.kind != "product":
+        return None
+    if item.stock_qty and item.stock_qty > 0:
+        return f"{item.name} is in stock, {item.stock_qty} available."
+    return f"{item.name} is currently out of stock."
+
+
+def answer_catalog_question(db: Session, question: str, company_id: Optional[int] = None) -> Optional[str]:
+    """Answer a price/stock question from the catalog, or None to fall through to RAG"""
+    intent = detect_intent(question)
+    if intent is None:
+        return None
+
+    items = lookup_items(db, question, company_id)
+    if not items:
+        return None
+    # Without a tenant, only answer when every match belongs to one company
+    if company_id is None and len({item.company_id for item in items}) > 1:
+        return None
+
+    render = _price_sentence if intent == PRICE else _stock_sentence
+    sentences = [render(item) for item in items[:MAX_LISTED_ITEMS]]
+    if any(sentence is None for sentence in sentences):
+        # e.g. no price on file, or a stock question about a service
+        return None
+    return " ".join(sentences)
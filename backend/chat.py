@@ -0,0 +1,350 @@
+# chat.py
+"""Chat message store: keyset-paginated reads and live fan-out.
+
+Messages belong to a conversation (`conversation_id`) within an optional
+company. Reads page on `(created_at, id)` with opaque cursors, so a page
+costs the same however long the conversation grows.
+
+`create_message` flushes the row and hands it to `broadcaster`, which
+delivers it to this worker's subscribers once the transaction commits; on
+Postgres a NOTIFY in the same transaction reaches the other workers. A
+subscriber that falls behind (or a worker whose LISTEN connection dropped)
+gets a `resync` marker instead and re-reads from its last cursor.
+
+Stream reads go to the primary, and a resync re-reads
+CHAT_CATCH_UP_OVERLAP_SECONDS before the cursor. `created_at` is stamped
+before commit, by each worker's own clock, so a row can commit after
+rows stamped later than it. A strict "after the cursor" read would step
+past such a row for good. Rows in the overlap that were already sent are
+dropped.
+"""
+import asyncio
+import base64
+import json
+import os
+import threading
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event, select, tuple_
+from sqlalchemy.orm import Session
+
+import schemas
+from database import SessionLocal
+from models import ChatMessage
+from observability import registry
+from pg_notify import listener, notify
+
+CHAT_CHANNEL = "chat_messages"
+# Events buffered per subscriber before it is told to resync from the database
+CHAT_SUBSCRIBER_QUEUE = int(os.getenv("CHAT_SUBSCRIBER_QUEUE", "256"))
+# Rows read per query while a stream catches up
+_CATCH_UP_PAGE = 200
+# How far before its cursor a catch-up starts reading, for rows committed late
+CHAT_CATCH_UP_OVERLAP_SECONDS = float(os.getenv("CHAT_CATCH_UP_OVERLAP_SECONDS", "5"))
+# Postgres caps NOTIFY payloads at 8000 bytes; larger messages travel by id
+_NOTIFY_LIMIT = 7000
+# Tells this worker's own notifications apart from other workers'
+_ORIGIN = uuid.uuid4().hex
+
+Cursor = Tuple[datetime, int]
+Topic = Tuple[Optional[int], str]
+RESYNC = {"type": "resync"}
+
+CHAT_SUBSCRIBERS = registry.gauge("chat_subscribers", "Open chat stream subscriptions")
+CHAT_EVENTS = registry.counter("chat_events_total", "Chat events delivered to subscribers", ("kind",))
+
+
+# ── Cursors ───────────────────────────────────────────────────────────────
+def encode_cursor(created_at: datetime, message_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), message_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _parse_timestamp(value: str) -> datetime:
+    # SQLite hands back naive datetimes; they are stored in UTC
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Decode a keyset cursor; raises ValueError if it is malformed"""
+    try:
+        created_at, message_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return _parse_timestamp(created_at), int(message_id)
+    except Exception as exc:
+        raise ValueError("Invalid chat cursor") from exc
+
+
+def payload_cursor(payload: dict) -> Cursor:
+    return _parse_timestamp(payload["created_at"]), payload["id"]
+
+
+def message_payload(message: ChatMessage) -> dict:
+    return schemas.ChatMessage.model_validate(message).model_dump(mode="json")
+
+
+# ── Reads / writes ────────────────────────────────────────────────────────
+def _conversation(company_id: Optional[int], conversation_id: str):
+    stmt = select(ChatMessage).where(ChatMessage.conversation_id == conversation_id)
+    if company_id is None:
+        return stmt.where(ChatMessage.company_id.is_(None))
+    return stmt.where(ChatMessage.company_id == company_id)
+
+
+def _key():
+    return tuple_(ChatMessage.created_at, ChatMessage.id)
+
+
+def list_messages(
+    db: Session,
+    conversation_id: str,
+    company_id: Optional[int] = None,
+    limit: int = 50,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+) -> Tuple[List[ChatMessage], Optional[str], Optional[str]]:
+    """One page of a conversation, oldest first, plus (prev_cursor, next_cursor).
+
+    Without cursors this is the latest page. `before` pages back in history;
+    `after` returns what arrived since. prev_cursor is None once the start of
+    the conversation is reached; next_cursor is what to pass as `after` later.
+    """
+    stmt = _conversation(company_id, conversation_id)
+    if after:
+        rows = db.scalars(
+            stmt.where(_key() > tuple_(*decode_cursor(after)))
+            .order_by(ChatMessage.created_at, ChatMessage.id)
+            .limit(limit)
+        ).all()
+        prev_cursor = encode_cursor(rows[0].created_at, rows[0].id) if rows else after
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if rows else after
+        return rows, prev_cursor, next_cursor
+
+    if before:
+        stmt = stmt.where(_key() < tuple_(*decode_cursor(before)))
+    rows = db.scalars(
+        stmt.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(limit + 1)
+    ).all()
+    more = len(rows) > limit
+    rows = rows[:limit][::-1]
+    prev_cursor = encode_cursor(rows[0].created_at, rows[0].id) if more else None
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if rows else None
+    return rows, prev_cursor, next_cursor
+
+
+def latest_cursor(db: Session, conversation_id: str, company_id: Optional[int] = None) -> Optional[str]:
+    row = db.execute(
+        _conversation(company_id, conversation_id)
+        .with_only_columns(ChatMessage.created_at, ChatMessage.id)
+        .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+        .limit(1)
+    ).first()
+    return encode_cursor(*row) if row else None
+
+
+def create_message(db: Session, data: schemas.ChatMessageCreate) -> dict:
+    """Insert a message and publish it on commit; returns its payload"""
+    message = ChatMessage(**data.model_dump())
+    db.add(message)
+    db.flush()
+    payload = message_payload(message)
+    broadcaster.publish(db, payload)
+    db.commit()
+    return payload
+
+
+# ── Fan-out ───────────────────────────────────────────────────────────────
+class Subscription:
+    def __init__(self, topic: Topic, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.topic = topic
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def push(self, event: dict) -> None:
+        # Runs on the subscriber's loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow to keep up: drop the backlog, it is re-read from the database
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            CHAT_EVENTS.inc(kind="overflow")
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Next event, or None after `timeout` seconds without one"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class ChatBroadcaster:
+    """In-process fan-out of new messages to stream subscribers, by topic"""
+
+    def __init__(self, queue_size: int = CHAT_SUBSCRIBER_QUEUE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[Topic, Set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic: Topic) -> Subscription:
+        subscription = Subscription(topic, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers[topic].add(subscription)
+        CHAT_SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.topic]
+        CHAT_SUBSCRIBERS.inc(-1)
+
+    def deliver(self, topic: Topic, event: dict) -> None:
+        """Hand `event` to every subscriber of `topic`; safe from any thread"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, event)
+            except RuntimeError:
+                # Its event loop has closed (worker shutting down)
+                pass
+        CHAT_EVENTS.inc(len(subscribers), kind=event["type"])
+
+    def resync_all(self) -> None:
+        with self._lock:
+            topics = list(self._subscribers)
+        for topic in topics:
+            self.deliver(topic, RESYNC)
+
+    # ── Publishing ──
+    def publish(self, db: Session, payload: dict) -> None:
+        """Deliver `payload` here and in every other worker once `db` commits"""
+        db.info.setdefault("chat_events", []).append(payload)
+        message = json.dumps({"origin": _ORIGIN, "message": payload})
+        if len(message.encode("utf-8")) > _NOTIFY_LIMIT:
+            message = json.dumps({"origin": _ORIGIN, "id": payload["id"]})
+        notify(db, CHAT_CHANNEL, message)
+
+    def on_notify(self, raw: str) -> None:
+        notification = json.loads(raw)
+        if notification.get("origin") == _ORIGIN:
+            return
+        payload = notification.get("message")
+        if payload is None:
+            with SessionLocal() as db:
+                message = db.get(ChatMessage, notification["id"])
+                if message is None:
+                    return
+                payload = message_payload(message)
+        self.deliver(_topic(payload), {"type": "message", "message": payload})
+
+
+def _topic(payload: dict) -> Topic:
+    return payload["company_id"], payload["conversation_id"]
+
+
+broadcaster = ChatBroadcaster()
+
+listener.subscribe(CHAT_CHANNEL, broadcaster.on_notify)
+# Notifications sent while the LISTEN connection was down are lost
+listener.on_reconnect(broadcaster.resync_all)
+
+
+@event.listens_for(Session, "after_commit")
+def _deliver_committed(session):
+    for payload in session.info.pop("chat_events", ()):
+        broadcaster.deliver(_topic(payload), {"type": "message", "message": payload})
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_uncommitted(session):
+    session.info.pop("chat_events", None)
+
+
+# ── Streams ───────────────────────────────────────────────────────────────
+# Stream reads use the primary: a lagging replica would move the cursor past
+# rows it has not received yet
+def _read_tail(conversation_id: str, company_id: Optional[int]) -> Optional[str]:
+    with SessionLocal() as db:
+        return latest_cursor(db, conversation_id, company_id)
+
+
+def _read_since(conversation_id: str, company_id: Optional[int], cursor: Optional[str], rewind: bool = False):
+    """Up to _CATCH_UP_PAGE payloads after `cursor` (from the start when None).
+
+    With `rewind`, reading starts CHAT_CATCH_UP_OVERLAP_SECONDS before the
+    cursor, so the caller gets (and must drop) some rows it already has.
+    """
+    stmt = _conversation(company_id, conversation_id)
+    if cursor is not None:
+        created_at, message_id = decode_cursor(cursor)
+        if rewind:
+            stmt = stmt.where(ChatMessage.created_at >= created_at - timedelta(seconds=CHAT_CATCH_UP_OVERLAP_SECONDS))
+        else:
+            stmt = stmt.where(_key() > tuple_(created_at, message_id))
+    with SessionLocal() as db:
+        rows = db.scalars(stmt.order_by(ChatMessage.created_at, ChatMessage.id).limit(_CATCH_UP_PAGE)).all()
+        payloads = [message_payload(row) for row in rows]
+    return payloads, (encode_cursor(rows[-1].created_at, rows[-1].id) if rows else cursor)
+
+
+async def follow(
+    conversation_id: str,
+    company_id: Optional[int] = None,
+    after: Optional[str] = None,
+    heartbeat: Optional[float] = None,
+) -> AsyncIterator[Optional[dict]]:
+    """Yield a conversation's messages from `after` on, then live ones as they commit.
+
+    Without `after` only messages newer than the current tail are yielded.
+    Yields None every `heartbeat` seconds of silence.
+    """
+    subscription = broadcaster.subscribe((company_id, conversation_id))
+    # Ids already sent, so live events that raced a database read are not repeated
+    sent: deque = deque(maxlen=CHAT_SUBSCRIBER_QUEUE * 2)
+    try:
+        # Subscribed before the first read, so nothing can fall between the two
+        if after is None:
+            cursor, catch_up = await asyncio.to_thread(_read_tail, conversation_id, company_id), False
+        else:
+            cursor, catch_up = after, True
+        # After a resync the first read looks back over the overlap (what we sent
+        # is known, so repeats are dropped); later pages continue strictly after
+        # the cursor, so a busy window cannot loop forever. A client's own cursor
+        # is not rewound: we cannot tell what it already has.
+        rewind = False
+        while True:
+            if catch_up:
+                payloads, cursor = await asyncio.to_thread(
+                    _read_since, conversation_id, company_id, cursor, rewind
+                )
+                rewind = False
+                for payload in payloads:
+                    if payload["id"] not in sent:
+                        sent.append(payload["id"])
+                        yield payload
+                # A full page means there is more to read before going live
+                catch_up = len(payloads) >= _CATCH_UP_PAGE
+                continue
+            event = await subscription.get(heartbeat)
+            if event is None:
+                yield None
+            elif event["type"] == "resync":
+                catch_up = rewind = True
+            elif event["message"]["id"] not in sent:
+                payload = event["message"]
+                sent.append(payload["id"])
+                current = payload_cursor(payload)
+                if cursor is None or current > decode_cursor(cursor):
+                    cursor = encode_cursor(*current)
+                yield payload
+    finally:
+        broadcaster.unsubscribe(subscription)
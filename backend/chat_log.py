@@ -0,0 +1,232 @@
+# chat_log.py
+"""Write-behind logging of assistant questions and answers into chat_messages.
+
+The webhook calls `chat_log.log_exchange(...)`, which only appends to an in-memory
+buffer; a background thread drains it in multi-row INSERTs whenever
+CHAT_LOG_BATCH_SIZE records are waiting or CHAT_LOG_FLUSH_SECONDS have
+passed, whichever comes first. Shutdown flushes what is left.
+
+Written rows go through `chat.broadcaster` like any other message, so
+/messages/stream and /messages/ws subscribers see logged turns. created_at
+is stamped at insert, not when the call happened: a reader whose keyset
+cursor already moved past the call time would otherwise never see the
+rows. The ask and answer times are kept in `meta` (askedAt, answeredAt).
+
+Backpressure: the buffer holds at most CHAT_LOG_MAX_PENDING records. While
+the database is slow or down, batches are retried with backoff and new
+records beyond that bound are dropped (and counted) rather than making
+calls wait. A batch rejected for a bad row (an unknown or out-of-range
+company id, a value that cannot be encoded) is retried row by row so only
+the offending rows are lost. A batch still failing after
+CHAT_LOG_MAX_ATTEMPTS tries is dropped so it cannot block later records.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError, StatementError
+
+from chat import broadcaster, message_payload
+from database import SessionLocal
+from models import ChatMessage
+from observability import registry
+
+logger = logging.getLogger(__name__)
+
+CHAT_LOG_ENABLED = os.getenv("CHAT_LOG_ENABLED", "1") != "0"
+CHAT_LOG_BATCH_SIZE = int(os.getenv("CHAT_LOG_BATCH_SIZE", "100"))
+CHAT_LOG_FLUSH_SECONDS = float(os.getenv("CHAT_LOG_FLUSH_SECONDS", "1.0"))
+CHAT_LOG_MAX_PENDING = int(os.getenv("CHAT_LOG_MAX_PENDING", "10000"))
+CHAT_LOG_SHUTDOWN_SECONDS = float(os.getenv("CHAT_LOG_SHUTDOWN_SECONDS", "10"))
+CHAT_LOG_MAX_ATTEMPTS = int(os.getenv("CHAT_LOG_MAX_ATTEMPTS", "8"))
+# conversation_id column width
+_CONVERSATION_MAX = 64
+
+LOG_RECORDS = registry.counter("chat_log_records_total", "Q/A records by outcome", ("result",))
+LOG_PENDING = registry.gauge("chat_log_pending", "Q/A records waiting to be written")
+LOG_FLUSH_DURATION = registry.histogram("chat_log_flush_seconds", "Time to write one batch of Q/A records")
+LOG_BATCH_SIZE = registry.histogram(
+    "chat_log_batch_size", "Records per write-behind flush", buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+
+
+def is_record_error(exc: Exception) -> bool:
+    """Whether `exc` is down to the rows written rather than the database being unavailable"""
+    if isinstance(exc, (IntegrityError, DataError, TypeError, ValueError)):
+        return True
+    # Raised before the statement reached the database, e.g. a value that cannot be JSON-encoded
+    return isinstance(exc, StatementError) and not isinstance(exc, DBAPIError)
+
+
+class WriteBehindLog:
+    def __init__(
+        self,
+        batch_size: int = CHAT_LOG_BATCH_SIZE,
+        flush_seconds: float = CHAT_LOG_FLUSH_SECONDS,
+        max_pending: int = CHAT_LOG_MAX_PENDING,
+    ):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._pending: deque = deque()
+        # Records taken off the buffer but not yet written (retried on failure)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> bool:
+        if not CHAT_LOG_ENABLED or self.running:
+            return False
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="chat-log", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self, timeout: float = CHAT_LOG_SHUTDOWN_SECONDS) -> None:
+        """Flush what is buffered (up to `timeout` seconds), then stop the writer"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.warning("Chat log still flushing after %.0fs; %d records left", timeout, self.pending)
+            self._thread = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending) + self._in_flight
+
+    # ── Producers ──
+    def submit(self, record: Dict) -> bool:
+        """Queue one chat_messages row; never blocks. False when it was dropped"""
+        if not self.running:
+            LOG_RECORDS.inc(result="dropped")
+            return False
+        with self._cond:
+            if self.pending >= self.max_pending:
+                LOG_RECORDS.inc(result="dropped")
+                return False
+            self._pending.append(record)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        LOG_PENDING.set(self.pending)
+        return True
+
+    def log_exchange(
+        self,
+        conversation_id: str,
+        company_id: Optional[int],
+        question: str,
+        answer: str,
+        asked_at: datetime,
+        answered_at: datetime,
+        meta: Optional[Dict] = None,
+    ) -> None:
+        """Queue a caller question and the assistant's answer as two messages"""
+        conversation_id = conversation_id[:_CONVERSATION_MAX]
+        self.submit({
+            "conversation_id": conversation_id,
+            "company_id": company_id,
+            "sender": "caller",
+            "message": question,
+            "meta": {"askedAt": asked_at.isoformat()},
+        })
+        self.submit({
+            "conversation_id": conversation_id,
+            "company_id": company_id,
+            "sender": "assistant",
+            "message": answer,
+            "meta": {**(meta or {}), "askedAt": asked_at.isoformat(), "answeredAt": answered_at.isoformat()},
+        })
+
+    # ── Writer thread ──
+    def _take_batch(self) -> List[Dict]:
+        with self._cond:
+            deadline = time.monotonic() + self.flush_seconds
+            while len(self._pending) < self.batch_size and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            self._in_flight = len(batch)
+        return batch
+
+    def _run(self) -> None:
+        backoff = 0.5
+        attempts = 0
+        batch: List[Dict] = []
+        while True:
+            if not batch:
+                batch = self._take_batch()
+                attempts = 0
+            if not batch:
+                if self._stopping:
+                    return
+                continue
+            try:
+                self._write(batch)
+            except Exception:
+                attempts += 1
+                if attempts >= CHAT_LOG_MAX_ATTEMPTS or (self._stopping and backoff > 4):
+                    LOG_RECORDS.inc(len(batch), result="failed")
+                    logger.exception("Giving up on %d chat log records after %d attempts", len(batch), attempts)
+                else:
+                    logger.exception("Chat log flush failed; retrying in %.1fs", backoff)
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+                    continue
+            backoff = 0.5
+            batch = []
+            with self._cond:
+                self._in_flight = 0
+            LOG_PENDING.set(self.pending)
+
+    @staticmethod
+    def _insert(records: List[Dict]) -> None:
+        with SessionLocal() as db:
+            messages = [ChatMessage(**record) for record in records]
+            db.add_all(messages)
+            db.flush()
+            # Delivered to stream subscribers here and in every worker on commit
+            for message in messages:
+                broadcaster.publish(db, message_payload(message))
+            db.commit()
+
+    def _write(self, batch: List[Dict]) -> None:
+        """Write `batch`, dropping rows the database rejects; written rows leave the list"""
+        started, size = time.perf_counter(), len(batch)
+        try:
+            self._insert(batch)
+            LOG_RECORDS.inc(len(batch), result="written")
+            batch.clear()
+        except Exception as exc:
+            if not is_record_error(exc):
+                raise
+            # One bad row fails the whole statement; keep the good ones
+            while batch:
+                try:
+                    self._insert(batch[:1])
+                    LOG_RECORDS.inc(result="written")
+                except Exception as row_exc:
+                    # An outage mid-way: the rest is retried, without the rows already written
+                    if not is_record_error(row_exc):
+                        raise
+                    LOG_RECORDS.inc(result="failed")
+                    logger.warning("Dropping chat log record: %s", getattr(row_exc, "orig", None) or row_exc)
+                batch.pop(0)
+        LOG_FLUSH_DURATION.observe(time.perf_counter() - started)
+        LOG_BATCH_SIZE.observe(size)
+
+
+chat_log = WriteBehindLog()
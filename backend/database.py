@@ -1,24 +1,152 @@
 # database.py
 from __future__ import annotations  # optional: enables modern typing
+import contextvars
+import itertools
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import create_engine, event, make_url, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.pool import QueuePool
 
 load_dotenv()
 
 DATABASE_URL: str | None = os.getenv("DATABASE_URL")
 
-if not DATABASE_URL:
-    raise RuntimeError(
-        "DATABASE_URL env var not set. "
-        "Create a .env file or `export DATABASE_URL=...` before starting the app."
-    )
+# Per-worker pool; start_server.py derives these from DB_CONNECTION_BUDGET in production mode
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
 
-engine = create_engine(DATABASE_URL, echo=False, future=True)
+# Optional read replicas (comma-separated URLs) for get_read_db sessions
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# After a client commits, its reads stay on the primary this long (covers replica lag)
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+# Carries that deadline: set on responses to a commit, echoed back by the client
+STICKY_HEADER = "X-Primary-Until"
+_STICKY_HEADER_KEY = STICKY_HEADER.lower().encode("latin-1")
 
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+_engine: Engine | None = None
+_replicas: list[Engine] | None = None
+_replica_turn = itertools.count()
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """The process-wide engine, created on first use rather than at import"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                if not DATABASE_URL:
+                    raise RuntimeError(
+                        "DATABASE_URL env var not set. "
+                        "Create a .env file or `export DATABASE_URL=...` before starting the app."
+                    )
+                _engine = create_engine(DATABASE_URL, echo=False, future=True, **pool_options(DATABASE_URL))
+    return _engine
+
+
+def pool_options(url: str) -> dict:
+    # SQLite picks its own pool class, which does not take QueuePool sizing
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def get_replica_engines() -> list[Engine]:
+    global _replicas
+    if _replicas is None:
+        with _engine_lock:
+            if _replicas is None:
+                _replicas = [
+                    create_engine(url, echo=False, future=True, **pool_options(url)) for url in DATABASE_REPLICA_URLS
+                ]
+    return _replicas
+
+
+def dispose_engine() -> None:
+    global _engine, _replicas
+    with _engine_lock:
+        for engine in [_engine] + (_replicas or []):
+            if engine is not None:
+                engine.dispose()
+        _engine, _replicas = None, None
+
+
+def __getattr__(name):
+    # `from database import engine` keeps working; the engine is built on first access
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# ── Read/write routing ────────────────────────────────────────────────────
+@dataclass
+class ReplicaRouting:
+    """Per-request routing state, shared by reference with threadpool threads"""
+    sticky: bool = False
+    committed: bool = False
+
+
+_routing: contextvars.ContextVar[ReplicaRouting | None] = contextvars.ContextVar("replica_routing", default=None)
+
+
+def choose_replica() -> Engine | None:
+    """Next replica round-robin, or None when reads must go to the primary"""
+    replicas = get_replica_engines()
+    routing = _routing.get()
+    if not replicas or (routing is not None and (routing.sticky or routing.committed)):
+        return None
+    return replicas[next(_replica_turn) % len(replicas)]
+
+
+class LazySession(Session):
+    """Binds to the process engine when a session is opened, not at import.
+
+    Sessions opened with info={"read_only": True} read from a replica, if
+    any are configured; flushes always go to the primary.
+    """
+
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=bind if bind is not None else get_engine(), **kwargs)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.info.get("read_only") and not self._flushing:
+            if "replica" not in self.info:
+                # One replica per session, so a request sees one consistent snapshot
+                self.info["replica"] = choose_replica()
+            if self.info["replica"] is not None:
+                return self.info["replica"]
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+
+@event.listens_for(LazySession, "after_flush")
+def _mark_written(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(LazySession, "after_commit")
+def _remember_commit(session):
+    if session.info.pop("wrote", False):
+        routing = _routing.get()
+        if routing is not None:
+            routing.committed = True
+
+
+SessionLocal = sessionmaker(class_=LazySession, autoflush=False, autocommit=False, future=True)
 
 Base = declarative_base()
 
@@ -28,3 +156,95 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_read_db():
+    """Session for read-only handlers; served by a replica when one is configured"""
+    db = SessionLocal(info={"read_only": True})
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def call_in_session(fn, *args, read_only: bool = False):
+    """fn(db, *args) with a session opened and closed by the calling thread.
+
+    For work handed to asyncio.to_thread: a cancelled await leaves the thread
+    running, and it must not share a session with anyone else meanwhile.
+    """
+    with SessionLocal(info={"read_only": True} if read_only else None) as db:
+        return fn(db, *args)
+
+
+class ReadYourWritesMiddleware:
+    """Keeps a client's reads on the primary for a while after it commits.
+
+    A response to a request that committed carries an X-Primary-Until
+    header (a Unix time). The client sends it back on its requests, which
+    skip the replicas until then. A header rather than a cookie, since the
+    dashboard calls the API cross-origin without credentials. Values
+    further ahead than the sticky window are ignored, so a client cannot
+    pin itself to the primary. Only installed when DATABASE_REPLICA_URLS is set.
+    """
+
+    def __init__(self, app, sticky_seconds: float = REPLICA_STICKY_SECONDS):
+        self.app = app
+        self.sticky_seconds = sticky_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        now = time.time()
+        routing = ReplicaRouting(sticky=now < _primary_until(scope) <= now + self.sticky_seconds + 1)
+        token = _routing.set(routing)
+
+        async def send_with_deadline(message):
+            if message["type"] == "http.response.start" and routing.committed:
+                until = str(int(time.time() + self.sticky_seconds) + 1).encode("latin-1")
+                message = {**message, "headers": list(message.get("headers", [])) + [(_STICKY_HEADER_KEY, until)]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_deadline)
+        finally:
+            _routing.reset(token)
+
+
+def _primary_until(scope) -> float:
+    for name, value in scope.get("headers", []):
+        if name == _STICKY_HEADER_KEY:
+            try:
+                return float(value.decode("latin-1"))
+            except ValueError:
+                return 0.0
+    return 0.0
+
+
+def warm_pool(connections: int, engine: Engine | None = None) -> int:
+    """Open up to `connections` pooled connections concurrently; returns how many opened"""
+    engine = engine or get_engine()
+    # Only a QueuePool keeps a set of idle connections worth pre-opening
+    if not isinstance(engine.pool, QueuePool):
+        return 0
+    connections = min(connections, engine.pool.size())
+    if connections <= 0:
+        return 0
+    barrier = threading.Barrier(connections)
+
+    def open_one():
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+                # Hold every connection until all are open, so the pool has to create new ones
+                barrier.wait(timeout=30)
+        except threading.BrokenBarrierError:
+            pass
+        except Exception:
+            barrier.abort()
+            raise
+
+    with ThreadPoolExecutor(max_workers=connections, thread_name_prefix="pool-warm") as executor:
+        list(executor.map(lambda _: open_one(), range(connections)))
+    return connections
@@ -0,0 +1,75 @@
+# deadline.py
+"""Per-request deadlines, carried through the assistant pipeline in a contextvar.
+
+The webhook sets one deadline per tool call (see `deadline_scope`). Tasks
+created inside the scope inherit it, and every stage asks `remaining()`
+for the time it may spend. `enforce()` cancels whatever is still awaiting
+when the deadline passes, which aborts in-flight HTTP calls made through
+the async OpenAI and Qdrant clients.
+"""
+import asyncio
+import contextvars
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Optional
+
+from observability import registry
+
+DEADLINE_EXCEEDED = registry.counter(
+    "assistant_deadline_exceeded_total", "Pipeline stages cut short by the request deadline", ("stage",)
+)
+
+
+@dataclass(frozen=True)
+class Deadline:
+    expires_at: float
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        return cls(time.monotonic() + seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+_current: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+def remaining(reserve: float = 0.0) -> Optional[float]:
+    """Seconds left before the deadline minus `reserve`; None without a deadline"""
+    deadline = _current.get()
+    return None if deadline is None else max(0.0, deadline.remaining() - reserve)
+
+
+@contextmanager
+def deadline_scope(deadline: Deadline):
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+@asynccontextmanager
+async def enforce(stage: str):
+    """Cancel the block when the current deadline passes (raises TimeoutError)"""
+    deadline = _current.get()
+    if deadline is None:
+        yield
+        return
+    try:
+        # Translated onto the loop's clock, which need not be time.monotonic()
+        async with asyncio.timeout_at(asyncio.get_running_loop().time() + deadline.remaining()):
+            yield
+    except TimeoutError:
+        DEADLINE_EXCEEDED.inc(stage=stage)
+        raise
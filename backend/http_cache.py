@@ -0,0 +1,95 @@
+# http_cache.py
+"""Conditional GET helpers (ETag / Last-Modified) for the read endpoints."""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+# Clients must revalidate, but may keep the body and replay it on a 304
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    """Build a strong ETag from the given validator parts"""
+    raw = "|".join(
+        "" if part is None else part.isoformat() if isinstance(part, datetime) else str(part)
+        for part in parts
+    )
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; everything is stored as UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def http_date(value: Optional[datetime]) -> Optional[str]:
+    """Format a datetime as an RFC 9110 HTTP-date"""
+    if value is None:
+        return None
+    return format_datetime(_as_utc(value), usegmt=True)
+
+
+def has_conditional_headers(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since against the current validators"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence and uses weak comparison (RFC 9110 13.1.2)
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP dates have one second resolution
+        return _as_utc(last_modified).replace(microsecond=0) <= since
+    return False
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime] = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, last_modified))
+
+
+def resource_etag(kind: str, obj_id: int, updated_at: Optional[datetime]) -> str:
+    """ETag for a single row, derived from (id, updated_at)"""
+    return make_etag(kind, obj_id, updated_at)
+
+
+def collection_state(db: Session, model, *criteria) -> Tuple[Optional[datetime], int]:
+    """Return (max(updated_at), count) for the rows matching the criteria.
+
+    This is a single aggregate over indexed columns, so it is much cheaper
+    than loading and serialising the collection itself.
+    """
+    query = db.query(func.max(model.updated_at), func.count(model.id))
+    if criteria:
+        query = query.filter(*criteria)
+    max_updated_at, count = query.one()
+    return max_updated_at, count
+
+
+def collection_etag(kind: str, max_updated_at: Optional[datetime], count: int, *extra) -> str:
+    """ETag for a collection, derived from max(updated_at), count and the page window"""
+    return make_etag(kind, max_updated_at, count, *extra)
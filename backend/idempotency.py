@@ -0,0 +1,85 @@
+# idempotency.py
+"""Idempotent execution keyed by a client-supplied id (Vapi's toolCallId).
+
+When Vapi gives up on a slow tool call it retries with the same
+toolCallId. `webhook_results.run(key, compute)` runs `compute` once per
+key: a retry that arrives while the first attempt is still working awaits
+that same attempt, and one that arrives later gets the stored result until
+WEBHOOK_IDEMPOTENCY_TTL expires. Failures are not stored, so the next
+retry computes afresh.
+
+The work runs in its own task, so it finishes (and serves the retry) even
+if the attempt that started it is cancelled by a client disconnect. The
+store is per worker process; a retry routed to another worker recomputes.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, Tuple, TypeVar
+
+from observability import registry
+
+WEBHOOK_IDEMPOTENCY_TTL = float(os.getenv("WEBHOOK_IDEMPOTENCY_TTL", "300"))
+WEBHOOK_IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("WEBHOOK_IDEMPOTENCY_MAX_ENTRIES", "10000"))
+
+COMPUTED = "computed"
+IN_FLIGHT = "in_flight"
+STORED = "stored"
+
+IDEMPOTENCY_REQUESTS = registry.counter(
+    "webhook_idempotency_total", "Webhook tool calls by idempotency outcome", ("outcome",)
+)
+
+T = TypeVar("T")
+
+
+class IdempotencyStore:
+    def __init__(self, ttl: float = WEBHOOK_IDEMPOTENCY_TTL, max_entries: int = WEBHOOK_IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (task, finished_at or None while running)
+        self._entries: "OrderedDict[Hashable, list]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> Tuple[T, str]:
+        """Result of `compute()` for `key` and whether it was computed, joined in flight or stored.
+
+        Only call from the event loop thread; the store is not locked.
+        """
+        self._expire()
+        entry = self._entries.get(key)
+        if entry is not None:
+            outcome = IN_FLIGHT if entry[1] is None else STORED
+            IDEMPOTENCY_REQUESTS.inc(outcome=outcome)
+            return await asyncio.shield(entry[0]), outcome
+
+        task = asyncio.create_task(compute())
+        entry = [task, None]
+        self._entries[key] = entry
+        task.add_done_callback(lambda done: self._finished(key, entry, done))
+        IDEMPOTENCY_REQUESTS.inc(outcome=COMPUTED)
+        return await asyncio.shield(task), COMPUTED
+
+    def _finished(self, key: Hashable, entry: list, task: asyncio.Task) -> None:
+        if task.cancelled() or task.exception() is not None:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+            return
+        entry[1] = time.monotonic()
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        # Oldest first: drop expired results, and finished ones while over the cap
+        while self._entries:
+            key, (_, finished_at) = next(iter(self._entries.items()))
+            expired = finished_at is not None and now - finished_at > self.ttl
+            # Never drop work a retry could still join
+            if not expired and (finished_at is None or len(self._entries) <= self.max_entries):
+                break
+            del self._entries[key]
+
+
+webhook_results = IdempotencyStore()
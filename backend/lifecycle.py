@@ -0,0 +1,252 @@
+# lifecycle.py
+"""Application startup / shutdown (FastAPI lifespan) and readiness state.
+
+Nothing touches the database, Qdrant or OpenAI at import time. On startup
+the worker:
+  1. creates the schema with `create_all` only when alembic does not manage it
+  2. warms the DB pool, the Qdrant client and the LLM provider in parallel
+  3. starts the LISTEN/NOTIFY thread used for cross-worker invalidation,
+     the write-behind chat log and the vector outbox worker
+  4. pre-warms the assistant caches from recent call logs (prewarm.py)
+and only then starts serving (uvicorn accepts traffic after the lifespan
+startup completes). Failed warm-ups are retried in the background with
+backoff; a database that comes up late also starts step 3 and 4 then.
+
+/health/ready needs the required components warmed up and, on each probe,
+a live check of them (SELECT 1 for the database). The check is cached for
+READINESS_CHECK_TTL seconds and gives up after READINESS_CHECK_TIMEOUT, so
+a worker turns unready while its database is away and ready again after.
+
+DB_CREATE_ALL:
+  auto    – run create_all unless an `alembic_version` table exists (default)
+  always  – always run it
+  never   – leave the schema to `alembic upgrade head`
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from sqlalchemy import inspect, text
+
+import prewarm
+import vector_store
+from chat_log import chat_log
+from vector_sync import vector_sync
+from database import dispose_engine, get_engine, get_replica_engines, warm_pool
+from llm import get_provider
+from pg_notify import listener
+from models import Base
+
+logger = logging.getLogger(__name__)
+
+DB_CREATE_ALL = os.getenv("DB_CREATE_ALL", "auto").lower()
+DB_WARM_CONNECTIONS = int(os.getenv("DB_WARM_CONNECTIONS", "5"))
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "30"))
+# First retry of a failed warm-up; doubles up to WARMUP_RETRY_MAX_SECONDS
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+WARMUP_RETRY_MAX_SECONDS = float(os.getenv("WARMUP_RETRY_MAX_SECONDS", "60"))
+READINESS_CHECK_TTL = float(os.getenv("READINESS_CHECK_TTL", "2"))
+READINESS_CHECK_TIMEOUT = float(os.getenv("READINESS_CHECK_TIMEOUT", "1"))
+# Components a worker cannot serve without; the rest only degrade the webhook
+REQUIRED_COMPONENTS = ("database",)
+
+
+def _ok(status: Optional[str]) -> bool:
+    return bool(status) and status.startswith("ok")
+
+
+@dataclass
+class Readiness:
+    ready: bool = False
+    started: bool = False
+    stopping: bool = False
+    started_at: float = field(default_factory=time.time)
+    warm_seconds: Optional[float] = None
+    # Warm-up outcome per component, and the latest live check of the required ones
+    components: Dict[str, str] = field(default_factory=dict)
+    checks: Dict[str, str] = field(default_factory=dict)
+    checked_at: float = 0.0
+    _probe: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    @property
+    def warmed(self) -> bool:
+        return all(_ok(self.components.get(name)) for name in REQUIRED_COMPONENTS)
+
+    async def check(self) -> bool:
+        """Whether the worker can serve right now; updates `ready`"""
+        if self.stopping or not self.started or not self.warmed:
+            self.ready = False
+            return False
+        if time.monotonic() - self.checked_at > READINESS_CHECK_TTL:
+            # Concurrent probes share one round of checks
+            if self._probe is None or self._probe.done():
+                self._probe = asyncio.ensure_future(self._run_checks())
+            await asyncio.shield(self._probe)
+        self.ready = all(_ok(self.checks.get(name)) for name in REQUIRED_COMPONENTS)
+        return self.ready
+
+    async def _run_checks(self) -> None:
+        for name, check in CHECKS.items():
+            try:
+                self.checks[name] = await asyncio.wait_for(asyncio.to_thread(check), READINESS_CHECK_TIMEOUT)
+            except Exception as exc:
+                self.checks[name] = f"error: {exc.__class__.__name__}: {exc}"
+        self.checked_at = time.monotonic()
+
+    def as_dict(self) -> dict:
+        if self.stopping:
+            status = "stopping"
+        elif not self.started:
+            status = "starting"
+        else:
+            status = "ready" if self.ready else "unavailable"
+        return {
+            "status": status,
+            "warmSeconds": self.warm_seconds,
+            "components": self.components,
+            "checks": self.checks,
+        }
+
+
+readiness = Readiness()
+_background: List[asyncio.Task] = []
+
+
+def ensure_schema() -> str:
+    engine = get_engine()
+    if DB_CREATE_ALL == "never":
+        return "skipped"
+    if DB_CREATE_ALL == "auto":
+        with engine.connect() as conn:
+            if inspect(conn).has_table("alembic_version"):
+                return "managed by alembic"
+    Base.metadata.create_all(bind=engine)
+    return "created"
+
+
+def warm_database() -> str:
+    schema = ensure_schema()
+    opened = warm_pool(DB_WARM_CONNECTIONS)
+    replicas = [warm_pool(DB_WARM_CONNECTIONS, replica) for replica in get_replica_engines()]
+    status = f"ok (schema {schema}, {opened} connections"
+    if replicas:
+        status += f", {len(replicas)} replicas with {sum(replicas)} connections"
+    return status + ")"
+
+
+def warm_vector_store() -> str:
+    vector_store.warm()
+    return "ok"
+
+
+def warm_llm() -> str:
+    provider = get_provider()
+    provider.warm()
+    return f"ok ({provider.name})"
+
+
+WARMUPS = {
+    "database": warm_database,
+    "qdrant": warm_vector_store,
+    "llm": warm_llm,
+}
+
+
+def ping_database() -> str:
+    with get_engine().connect() as conn:
+        conn.execute(text("SELECT 1"))
+    return "ok"
+
+
+# Live checks of the REQUIRED_COMPONENTS, run by /health/ready
+CHECKS = {
+    "database": ping_database,
+}
+
+
+async def _run_warmup(name: str, warm) -> None:
+    try:
+        status = await asyncio.wait_for(asyncio.to_thread(warm), WARMUP_TIMEOUT)
+    except Exception as exc:
+        status = f"error: {exc.__class__.__name__}: {exc}"
+        logger.warning("Warm-up of %s failed: %s", name, status)
+    readiness.components[name] = status
+
+
+async def _prewarm_assistant() -> None:
+    # Needs the database, Qdrant and the LLM; a failure only means cold caches
+    try:
+        status = await asyncio.wait_for(prewarm.warm_caches(), prewarm.ASSISTANT_PREWARM_TIMEOUT)
+    except Exception as exc:
+        status = f"error: {exc.__class__.__name__}: {exc}"
+        logger.warning("Assistant cache pre-warm failed: %s", status)
+    readiness.components["assistant_cache"] = status
+    if prewarm.ASSISTANT_PREWARM_INTERVAL > 0:
+        _background.append(asyncio.create_task(prewarm.run_periodically()))
+
+
+async def _start_dependents() -> None:
+    """Everything that needs the database, once it is reachable"""
+    # Cross-worker cache invalidation (Postgres LISTEN/NOTIFY)
+    readiness.components["notify"] = "listening" if listener.start(get_engine()) else "not used"
+    readiness.components["chat_log"] = "running" if chat_log.start() else "disabled"
+    readiness.components["vector_sync"] = "running" if vector_sync.start() else "disabled"
+    await _prewarm_assistant()
+
+
+async def _retry_warmups() -> None:
+    delay = WARMUP_RETRY_SECONDS
+    while True:
+        failed = {name: warm for name, warm in WARMUPS.items() if not _ok(readiness.components.get(name))}
+        if not failed:
+            return
+        await asyncio.sleep(delay)
+        await asyncio.gather(*(_run_warmup(name, warm) for name, warm in failed.items()))
+        if "database" in failed and _ok(readiness.components.get("database")):
+            await _start_dependents()
+            logger.info("Database reachable after a failed warm-up; worker ready")
+        delay = min(WARMUP_RETRY_MAX_SECONDS, delay * 2)
+
+
+async def startup() -> None:
+    started = time.perf_counter()
+    await asyncio.gather(*(_run_warmup(name, warm) for name, warm in WARMUPS.items()))
+    if _ok(readiness.components.get("database")):
+        await _start_dependents()
+    readiness.warm_seconds = round(time.perf_counter() - started, 3)
+    readiness.started = True
+    readiness.ready = readiness.warmed
+    if not all(_ok(readiness.components.get(name)) for name in WARMUPS):
+        _background.append(asyncio.create_task(_retry_warmups()))
+    logger.info("Worker %s after %.2fs: %s", "ready" if readiness.ready else "NOT ready", readiness.warm_seconds, readiness.components)
+
+
+async def shutdown() -> None:
+    readiness.ready = False
+    readiness.stopping = True
+    for task in _background:
+        task.cancel()
+    await asyncio.gather(*_background, return_exceptions=True)
+    _background.clear()
+    await asyncio.to_thread(listener.stop)
+    # Uses the engine and the Qdrant client, so it stops before either closes
+    await asyncio.to_thread(vector_sync.stop)
+    # Before the engine goes: buffered Q/A records still need it
+    await asyncio.to_thread(chat_log.stop)
+    await vector_store.close_async_client()
+    await get_provider().aclose()
+    await asyncio.to_thread(vector_store.close_client)
+    await asyncio.to_thread(dispose_engine)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
@@ -0,0 +1,284 @@
+# llm.py
+"""Embedding / completion providers used by the assistant.
+
+LLM_PROVIDER selects the backend:
+  openai  – OpenAI embeddings + chat completions (default)
+  local   – deterministic offline stand-in: a feature-hashing embedder and an
+            extractive answerer, for load tests and benchmarks with no network
+
+LLM_LATENCY_MS / LLM_JITTER_MS add simulated upstream latency to any
+provider, so framework overhead can be measured separately from it.
+
+`aembed` / `acomplete` are the async variants used on the request path:
+they accept a timeout and can be cancelled (the OpenAI provider uses
+AsyncOpenAI, so cancelling aborts the HTTP request). The base versions
+run the sync call in a thread, which stops the wait but not the work.
+"""
+import asyncio
+import hashlib
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import List, Optional
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
+LLM_LATENCY_MS = float(os.getenv("LLM_LATENCY_MS", "0"))
+LLM_JITTER_MS = float(os.getenv("LLM_JITTER_MS", "0"))
+LLM_LATENCY_SEED = os.getenv("LLM_LATENCY_SEED")
+
+EMBEDDING_MODEL = os.getenv("ASSISTANT_EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIM = int(os.getenv("ASSISTANT_EMBEDDING_DIM", "1536"))
+CHAT_MODEL = os.getenv("ASSISTANT_CHAT_MODEL", "gpt-4o")
+
+_WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+_SENTENCE_RE = re.compile(r"(?<=[.!?։])\s+|\n+")
+
+
+class LLMProvider:
+    """Interface shared by all backends"""
+
+    name = "base"
+
+    def embed(self, text: str) -> List[float]:
+        raise NotImplementedError
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embeddings for several texts; backends override it with one round trip"""
+        return [self.embed(text) for text in texts]
+
+    def complete(self, prompt: str, max_tokens: int = 150, temperature: float = 0.2) -> str:
+        raise NotImplementedError
+
+    async def aembed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        return await asyncio.wait_for(asyncio.to_thread(self.embed, text), timeout)
+
+    async def acomplete(
+        self, prompt: str, max_tokens: int = 150, temperature: float = 0.2, timeout: Optional[float] = None
+    ) -> str:
+        return await asyncio.wait_for(asyncio.to_thread(self.complete, prompt, max_tokens, temperature), timeout)
+
+    def warm(self) -> None:
+        """Pay one-off setup (imports, clients) before the first request"""
+
+    async def aclose(self) -> None:
+        """Release async clients (lifespan shutdown)"""
+
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Created on first use so importing the app never touches the network
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from openai import OpenAI
+
+                    self._client = OpenAI(api_key=self.api_key)
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    from openai import AsyncOpenAI
+
+                    self._async_client = AsyncOpenAI(api_key=self.api_key)
+        return self._async_client
+
+    def warm(self) -> None:
+        self.client
+        self.async_client
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+
+    def embed(self, text: str) -> List[float]:
+        response = self.client.embeddings.create(model=EMBEDDING_MODEL, input=text)
+        return response.data[0].embedding
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        response = self.client.embeddings.create(model=EMBEDDING_MODEL, input=texts)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    async def aembed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        # No retries once a deadline applies: a retry could never finish in time
+        client = self.async_client if timeout is None else self.async_client.with_options(max_retries=0)
+        response = await client.embeddings.create(model=EMBEDDING_MODEL, input=text, timeout=timeout)
+        return response.data[0].embedding
+
+    def complete(self, prompt: str, max_tokens: int = 150, temperature: float = 0.2) -> str:
+        response = self.client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+        return response.choices[0].message.content
+
+    async def acomplete(
+        self, prompt: str, max_tokens: int = 150, temperature: float = 0.2, timeout: Optional[float] = None
+    ) -> str:
+        client = self.async_client if timeout is None else self.async_client.with_options(max_retries=0)
+        response = await client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=temperature,
+            timeout=timeout,
+        )
+        return response.choices[0].message.content
+
+
+class LocalProvider(LLMProvider):
+    """Offline, deterministic stand-in for OpenAI"""
+
+    name = "local"
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def _features(self, text: str):
+        words = _WORD_RE.findall(text.lower())
+        yield from words
+        # Character trigrams give some robustness to inflection and typos
+        for word in words:
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3]
+
+    def embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def complete(self, prompt: str, max_tokens: int = 150, temperature: float = 0.2) -> str:
+        # The question is the last paragraph of the prompt, the context the rest
+        context, _, question = prompt.strip().rpartition("\n\n")
+        question_words = {word for word in _WORD_RE.findall(question.lower()) if len(word) > 2}
+        sentences = [sentence.strip() for sentence in _SENTENCE_RE.split(context) if sentence.strip()]
+        if not sentences:
+            return "Sorry, I don't have that information."
+
+        def overlap(sentence: str) -> int:
+            return len(question_words & set(_WORD_RE.findall(sentence.lower())))
+
+        best = max(sentences, key=overlap)
+        words = best.split()
+        # Roughly honour max_tokens (~0.75 words per token)
+        return " ".join(words[: max(1, int(max_tokens * 0.75))])
+
+
+class SimulatedLatency(LLMProvider):
+    """Wraps a provider and sleeps latency ± jitter before every call"""
+
+    def __init__(self, inner: LLMProvider, latency_ms: float, jitter_ms: float = 0.0, seed=None):
+        self.inner = inner
+        self.name = f"{inner.name}+latency"
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def warm(self) -> None:
+        self.inner.warm()
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+    def _delay(self) -> float:
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + jitter) / 1000.0
+
+    def _sleep(self):
+        time.sleep(self._delay())
+
+    def embed(self, text: str) -> List[float]:
+        self._sleep()
+        return self.inner.embed(text)
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        self._sleep()
+        return self.inner.embed_batch(texts)
+
+    def complete(self, prompt: str, max_tokens: int = 150, temperature: float = 0.2) -> str:
+        self._sleep()
+        return self.inner.complete(prompt, max_tokens=max_tokens, temperature=temperature)
+
+    # Async variants sleep on the event loop, so they cancel like a real HTTP call
+    async def aembed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        async def call():
+            await asyncio.sleep(self._delay())
+            return await self.inner.aembed(text)
+
+        return await asyncio.wait_for(call(), timeout)
+
+    async def acomplete(
+        self, prompt: str, max_tokens: int = 150, temperature: float = 0.2, timeout: Optional[float] = None
+    ) -> str:
+        async def call():
+            await asyncio.sleep(self._delay())
+            return await self.inner.acomplete(prompt, max_tokens=max_tokens, temperature=temperature)
+
+        return await asyncio.wait_for(call(), timeout)
+
+
+PROVIDERS = {
+    "openai": OpenAIProvider,
+    "local": LocalProvider,
+}
+
+_provider: Optional[LLMProvider] = None
+_provider_lock = threading.Lock()
+
+
+def create_provider(
+    name: str = LLM_PROVIDER,
+    latency_ms: float = LLM_LATENCY_MS,
+    jitter_ms: float = LLM_JITTER_MS,
+    seed=LLM_LATENCY_SEED,
+) -> LLMProvider:
+    try:
+        provider = PROVIDERS[name]()
+    except KeyError:
+        raise RuntimeError(f"Unknown LLM_PROVIDER {name!r}; expected one of {', '.join(PROVIDERS)}")
+    if latency_ms or jitter_ms:
+        provider = SimulatedLatency(provider, latency_ms, jitter_ms, seed)
+    return provider
+
+
+def get_provider() -> LLMProvider:
+    """Process-wide provider configured from the environment"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = create_provider()
+    return _provider
+
+
+def set_provider(provider: LLMProvider) -> None:
+    """Swap the process-wide provider (benchmarks, tests)"""
+    global _provider
+    with _provider_lock:
+        _provider = provider
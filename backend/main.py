@@ -5,26 +5,51 @@ from routes.assistant import router as assistant_router
 from routes.dashboard import router as dashboard_router
 from routes.auth import router as auth_router
 from routes.products import router as products_router
-from database import engine
-from models import Base
+from routes.search import router as search_router
+from routes.chat import router as chat_router
+from routes.metrics import router as metrics_router
+from routes.profiler import router as profiler_router
+from routes.health import router as health_router
+from database import DATABASE_REPLICA_URLS, STICKY_HEADER, ReadYourWritesMiddleware
+import admission
+from lifecycle import lifespan
+from observability import TimingMiddleware
+import query_guard
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Schema creation and connection warm-up happen in the lifespan, not at import
+app = FastAPI(title="Company Admin API", version="1.0.0", lifespan=lifespan)
 
-app = FastAPI(title="Company Admin API", version="1.0.0")
-
-# Configure CORS
+# Per-class concurrency limits and bounded queues (ADMISSION_CONTROL=off disables)
+if admission.ADMISSION_CONTROL:
+    app.add_middleware(admission.AdmissionMiddleware)
+# Per-route latency histograms (queue wait included), DB query accounting and Server-Timing headers
+app.add_middleware(TimingMiddleware)
+# Opt-in (QUERY_GUARD=log|raise): N+1, slow-query and per-endpoint query budget checks
+if query_guard.enabled():
+    app.add_middleware(query_guard.QueryGuardMiddleware)
+# Reads stay on the primary briefly after a client's own commit
+if DATABASE_REPLICA_URLS:
+    app.add_middleware(ReadYourWritesMiddleware)
+# Configure CORS. Added last so it is outermost: admission rejections (429/503)
+# and preflights must carry CORS headers too, or the browser hides them
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # ToDo: secure origins
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Read-your-writes deadline, echoed back by the dashboard (see database.py)
+    expose_headers=[STICKY_HEADER],
 )
 
 # Include routes
 app.include_router(auth_router, prefix="/api/auth")
 app.include_router(companies_router, prefix="/api/companies")
 app.include_router(products_router, prefix="/api")
+app.include_router(search_router, prefix="/api")
+app.include_router(chat_router, prefix="/api")
 app.include_router(assistant_router, prefix="/api")
 app.include_router(dashboard_router, prefix="/api/dashboard")
+app.include_router(metrics_router)
+app.include_router(health_router, prefix="/health")
+app.include_router(profiler_router, prefix="/api/admin")
@@ -1,5 +1,7 @@
 # app/models.py  ────────────────────────────────────────────────────────────
 from sqlalchemy import (
+    DDL,
+    BigInteger,
     Column,
     Integer,
     String,
@@ -9,10 +11,14 @@ from sqlalchemy import (
     ForeignKey,
     Enum,
     Numeric,
+    Index,
+    text,
 )
+from sqlalchemy import event
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
+from datetime import datetime, timezone
 
 from database import Base   # ← adjust if your Base lives elsewhere
 
@@ -48,9 +54,30 @@ class ChatMessage(Base):
     __tablename__ = "chat_messages"
 
     id      = Column(Integer, primary_key=True, index=True)
+    company_id = Column(
+        Integer,
+        ForeignKey("companies.id", ondelete="CASCADE"),
+        nullable=True,
+    )
+    conversation_id = Column(String(64), nullable=False, server_default="default")
     message = Column(Text, nullable=False)
     sender  = Column(String(255), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Assistant turns logged from the webhook: tool call id and stage timings
+    meta    = Column(JSON(none_as_null=True))
+    # Set client-side so every row carries sub-second precision (SQLite's
+    # CURRENT_TIMESTAMP has whole seconds) and sorts consistently with cursors
+    created_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+    )
+
+    # Keyset pagination reads walk (created_at, id) within a conversation or a tenant
+    __table_args__ = (
+        Index("ix_chat_messages_conversation_created", "company_id", "conversation_id", "created_at", "id"),
+        Index("ix_chat_messages_company_created", "company_id", "created_at", "id"),
+    )
 
 # ── User ───────────────────────────────────────────────────────────────────
 class User(Base):
@@ -136,3 +163,72 @@ class Offering(Base):
     )
 
     company = relationship("Company", back_populates="offerings", lazy="joined")
+
+# ── Vector outbox ──────────────────────────────────────────────────────────
+# Company changes waiting to reach the Qdrant index. Write routes add a row
+# in the same transaction as the change; vector_sync.py applies and deletes them.
+# Events that keep failing are dead-lettered: kept, with their last error, but
+# never claimed again. Clearing dead_lettered_at replays one.
+class VectorOutbox(Base):
+    __tablename__ = "vector_outbox"
+
+    id         = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    # No foreign key: a delete event outlives its company
+    company_id = Column(Integer, nullable=False)
+    op         = Column(String(16), nullable=False)
+    attempts   = Column(Integer, nullable=False, default=0, server_default="0")
+    last_error = Column(Text)
+    created_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+    )
+    # Pushed back after a failed attempt, and to the lease's end while claimed
+    available_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+    )
+    # Set while a worker is applying the event; also identifies that claim
+    leased_until = Column(DateTime(timezone=True))
+    dead_lettered_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index(
+            "ix_vector_outbox_available", "available_at", "id",
+            postgresql_where=text("dead_lettered_at IS NULL"),
+            sqlite_where=text("dead_lettered_at IS NULL"),
+        ),
+        Index("ix_vector_outbox_company", "company_id"),
+    )
+
+# ── Full-text search (Postgres only) ───────────────────────────────────────
+# `search_vector` is a generated tsvector column kept up to date by Postgres.
+# It is deliberately not mapped, so ORM loads never drag it along. Alembic
+# revision 7c2e4f1a9b3d creates it; these hooks keep `create_all` databases
+# in line with the migrated schema.
+SEARCH_TEXT_COLUMNS = {
+    Company:  "details",
+    Product:  "description",
+    Offering: "description",
+}
+
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
+for _model, _body in SEARCH_TEXT_COLUMNS.items():
+    _table = _model.__tablename__
+    for _stmt in (
+        f"""ALTER TABLE {_table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce({_body}, '')), 'B')
+            ) STORED""",
+        f"CREATE INDEX ix_{_table}_search_vector ON {_table} USING gin (search_vector)",
+        f"CREATE INDEX ix_{_table}_name_trgm ON {_table} USING gin (name gin_trgm_ops)",
+    ):
+        event.listen(_model.__table__, "after_create", DDL(_stmt).execute_if(dialect="postgresql"))
@@ -0,0 +1,299 @@
+# observability.py
+"""Per-request timing, DB query accounting and Prometheus metrics.
+
+* `TimingMiddleware` records a latency histogram per route and adds a
+  `Server-Timing` header (total, db, and any stages recorded with `stage()`).
+* SQLAlchemy `before/after_cursor_execute` listeners count statements and
+  DB time for the request in flight.
+* `registry.render()` produces the Prometheus text format served at /metrics.
+
+Metrics are per process; with several workers each one is scraped separately.
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# ── Metric types ──────────────────────────────────────────────────────────
+def _label_text(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_label_text(self.labelnames, key)} {value}"
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = 'le="%s"' % bound
+                yield f"{self.name}_bucket{_label_text(self.labelnames, key, le)} {cumulative}"
+            cumulative += state[len(self.buckets)]
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_label_text(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_label_text(self.labelnames, key)} {state[-1]}"
+            yield f"{self.name}_count{_label_text(self.labelnames, key)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, documentation, labelnames=(), **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+REQUEST_DB_QUERIES = registry.histogram(
+    "http_request_db_queries", "SQL statements executed per request", ("route",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+DB_QUERY_DURATION = registry.histogram(
+    "db_query_duration_seconds", "SQL statement execution time",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+STAGE_DURATION = registry.histogram(
+    "request_stage_duration_seconds", "Time spent in named request stages (embed, search, llm, ...)", ("stage",)
+)
+
+
+# ── Request context ───────────────────────────────────────────────────────
+@dataclass
+class RequestTimings:
+    started: float = field(default_factory=time.perf_counter)
+    db_queries: int = 0
+    db_seconds: float = 0.0
+    stages: Dict[str, float] = field(default_factory=dict)
+    # Set for one part of a request (see `sub_timings`); totals roll up into it
+    parent: Optional["RequestTimings"] = None
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        if self.parent is not None:
+            self.parent.add_stage(name, seconds)
+
+    def add_query(self, seconds: float) -> None:
+        self.db_queries += 1
+        self.db_seconds += seconds
+        if self.parent is not None:
+            self.parent.add_query(seconds)
+
+    def server_timing(self, total: float) -> str:
+        entries = [f"app;dur={total * 1000:.1f}", f'db;dur={self.db_seconds * 1000:.1f};desc="{self.db_queries} queries"']
+        entries += [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        return ", ".join(entries)
+
+
+# The object is shared by reference, so work in threadpool threads (sync
+# endpoints, asyncio.to_thread) records into the same request.
+_current: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar("request_timings", default=None)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+def record_stage(name: str, seconds: float) -> None:
+    STAGE_DURATION.observe(seconds, stage=name)
+    timings = _current.get()
+    if timings is not None:
+        timings.add_stage(name, seconds)
+
+
+@contextmanager
+def sub_timings():
+    """Separate timings for one part of the request (e.g. one of several
+    concurrent tool calls), still counted in the request's own totals"""
+    timings = RequestTimings(parent=_current.get())
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as a named stage of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+@asynccontextmanager
+async def astage(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+# ── SQLAlchemy instrumentation (every engine) ─────────────────────────────
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get("query_started")
+    if not stack:
+        # Listener attached while this statement was already running
+        return
+    _account_query(time.perf_counter() - stack.pop())
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # Failed statements never reach after_cursor_execute; still count them
+    conn = exception_context.connection
+    stack = conn.info.get("query_started") if conn is not None else None
+    if stack:
+        _account_query(time.perf_counter() - stack.pop())
+
+
+def _account_query(elapsed: float) -> None:
+    DB_QUERY_DURATION.observe(elapsed)
+    timings = _current.get()
+    if timings is not None:
+        timings.add_query(elapsed)
+
+
+# ── ASGI middleware ───────────────────────────────────────────────────────
+def route_label(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class TimingMiddleware:
+    """Pure ASGI middleware, so streaming responses pass through untouched"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        status = {"code": 500}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                headers = list(message.get("headers", []))
+                total = time.perf_counter() - timings.started
+                headers.append((b"server-timing", timings.server_timing(total).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = route_label(scope)
+            REQUEST_DURATION.observe(
+                time.perf_counter() - timings.started, method=scope["method"], route=route, status=status["code"]
+            )
+            REQUEST_DB_QUERIES.observe(timings.db_queries, route=route)
@@ -0,0 +1,122 @@
+# pg_notify.py
+"""Postgres LISTEN/NOTIFY plumbing shared by the in-process caches and workers.
+
+`notify(db, channel, payload)` queues a notification inside the session's
+transaction, so it is only delivered if (and when) the transaction commits.
+
+`listener` is a per-process background thread holding one dedicated
+connection (outside the pool) that LISTENs on every subscribed channel and
+dispatches payloads to callbacks. After a dropped connection it reconnects
+and calls the `on_reconnect` hooks, since notifications sent meanwhile are
+lost.
+"""
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+def supports_notify(bind) -> bool:
+    return bind is not None and bind.dialect.name == "postgresql"
+
+
+def notify(db: Session, channel: str, payload: str) -> None:
+    """NOTIFY `channel` when the session's transaction commits (no-op off Postgres)"""
+    if supports_notify(db.get_bind()):
+        db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": payload})
+
+
+class PgListener:
+    def __init__(self):
+        self._callbacks: Dict[str, List[Callable[[str], None]]] = defaultdict(list)
+        self._reconnect_hooks: List[Callable[[], None]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._engine: Optional[Engine] = None
+        self.connected = threading.Event()
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> None:
+        self._callbacks[channel].append(callback)
+
+    def on_reconnect(self, hook: Callable[[], None]) -> None:
+        self._reconnect_hooks.append(hook)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, engine: Engine) -> bool:
+        """Start listening (Postgres only); returns False when not applicable"""
+        if not supports_notify(engine) or not self._callbacks or self.running:
+            return False
+        self._engine = engine
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="pg-listener", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.connected.clear()
+
+    def _connect(self):
+        # A dedicated DBAPI connection: it is held for the life of the process
+        dialect = self._engine.dialect
+        cargs, cparams = dialect.create_connect_args(self._engine.url)
+        conn = dialect.connect(*cargs, **cparams)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            for channel in self._callbacks:
+                cursor.execute(f'LISTEN "{channel}"')
+        return conn
+
+    def _run(self) -> None:
+        backoff, first = 0.5, True
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                self.connected.set()
+                if not first:
+                    for hook in self._reconnect_hooks:
+                        hook()
+                first, backoff = False, 0.5
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._dispatch(conn.notifies.pop(0))
+            except Exception:
+                self.connected.clear()
+                first = False
+                logger.exception("LISTEN connection lost; reconnecting in %.1fs", backoff)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def _dispatch(self, notification) -> None:
+        for callback in self._callbacks.get(notification.channel, ()):
+            try:
+                callback(notification.payload)
+            except Exception:
+                logger.exception("NOTIFY handler for %s failed", notification.channel)
+
+
+listener = PgListener()
@@ -0,0 +1,95 @@
+# prewarm.py
+"""Fill the assistant caches from recent call logs.
+
+The questions callers asked most often over the last ASSISTANT_PREWARM_DAYS
+(per company, from the `caller` rows chat_log writes to chat_messages)
+are run through the normal answer pipeline, ASSISTANT_PREWARM_CONCURRENCY
+at a time. That loads their embeddings and answers into assistant_cache.
+The lifespan does this before the worker reports ready. With
+ASSISTANT_PREWARM_INTERVAL set, it repeats on that schedule, so answers
+invalidated by catalog edits are rebuilt before callers ask again.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from assistant_cache import answer_cache
+from database import SessionLocal
+from models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+ASSISTANT_PREWARM_QUESTIONS = int(os.getenv("ASSISTANT_PREWARM_QUESTIONS", "20"))
+ASSISTANT_PREWARM_DAYS = float(os.getenv("ASSISTANT_PREWARM_DAYS", "7"))
+ASSISTANT_PREWARM_CONCURRENCY = int(os.getenv("ASSISTANT_PREWARM_CONCURRENCY", "8"))
+ASSISTANT_PREWARM_TIMEOUT = float(os.getenv("ASSISTANT_PREWARM_TIMEOUT", "60"))
+# Seconds between background re-warms; 0 warms at startup only
+ASSISTANT_PREWARM_INTERVAL = float(os.getenv("ASSISTANT_PREWARM_INTERVAL", "0"))
+
+
+def frequent_questions(
+    per_company: int = ASSISTANT_PREWARM_QUESTIONS,
+    days: float = ASSISTANT_PREWARM_DAYS,
+) -> List[Tuple[Optional[int], str]]:
+    """(company_id, question) for the most asked recent questions, per company"""
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    question = func.lower(func.trim(ChatMessage.message))
+    asked = (
+        select(
+            ChatMessage.company_id,
+            func.min(ChatMessage.message).label("question"),
+            func.row_number()
+            .over(partition_by=ChatMessage.company_id, order_by=func.count().desc())
+            .label("position"),
+        )
+        .where(ChatMessage.sender == "caller", ChatMessage.created_at >= since)
+        .group_by(ChatMessage.company_id, question)
+        .subquery()
+    )
+    with SessionLocal(info={"read_only": True}) as db:
+        rows = db.execute(
+            select(asked.c.company_id, asked.c.question)
+            .where(asked.c.position <= per_company)
+            .order_by(asked.c.position)
+        ).all()
+    return [(row.company_id, row.question) for row in rows]
+
+
+async def _warm_one(semaphore: asyncio.Semaphore, company_id: Optional[int], question: str) -> bool:
+    # Imported here: routes.assistant pulls in the whole request stack
+    from routes.assistant import answer_within_deadline
+
+    async with semaphore:
+        if answer_cache.get(company_id, question) is not None:
+            return False
+        try:
+            await answer_within_deadline(question, company_id, read_only=True)
+            return True
+        except Exception as exc:
+            logger.warning("Pre-warming %r for company %s failed: %s", question, company_id, exc)
+            return False
+
+
+async def warm_caches(concurrency: int = ASSISTANT_PREWARM_CONCURRENCY) -> str:
+    """Answer the frequent questions in parallel; returns a readiness status"""
+    started = time.perf_counter()
+    questions = await asyncio.to_thread(frequent_questions)
+    semaphore = asyncio.Semaphore(concurrency)
+    warmed = await asyncio.gather(*(_warm_one(semaphore, cid, question) for cid, question in questions))
+    return f"ok ({sum(warmed)}/{len(questions)} questions in {time.perf_counter() - started:.1f}s)"
+
+
+async def run_periodically(interval: float = ASSISTANT_PREWARM_INTERVAL) -> None:
+    """Background task for the lifespan; re-warms every `interval` seconds until cancelled"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            status = await asyncio.wait_for(warm_caches(), ASSISTANT_PREWARM_TIMEOUT)
+            logger.info("Assistant caches re-warmed: %s", status)
+        except Exception as exc:
+            logger.warning("Scheduled cache warm-up failed: %s: %s", exc.__class__.__name__, exc)
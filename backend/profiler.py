@@ -0,0 +1,165 @@
+# profiler.py
+"""On-demand sampling profiler for a live worker.
+
+A background thread wakes every `interval` seconds, snapshots the Python
+stack of every other thread (`sys._current_frames()`) and counts identical
+stacks. Nothing runs, and nothing is hooked, unless a profile is in
+progress, so an idle worker pays nothing for it.
+
+Output is either collapsed stacks (flamegraph.pl / speedscope / inferno
+input) or the speedscope JSON format.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "5"))
+MAX_STACK_DEPTH = 128
+
+# Leaf frames of threads that are parked rather than doing work
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("base_events.py", "_run_once"),
+}
+
+Frame = Tuple[str, str, int]  # (function, file, first line)
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+class Profile:
+    def __init__(self, interval: float, include_idle: bool):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.samples: Dict[str, Counter] = {}
+        self.sample_count = 0
+        self.started = time.time()
+        self.duration = 0.0
+
+    def collapsed(self) -> str:
+        """One `thread;outer;...;leaf count` line per distinct stack"""
+        lines = []
+        for thread_name, stacks in self.samples.items():
+            for stack, count in stacks.most_common():
+                names = [thread_name] + [_frame_label(frame) for frame in stack]
+                lines.append(f"{';'.join(names)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name: str = "profile") -> dict:
+        frames: List[dict] = []
+        index: Dict[Frame, int] = {}
+        profiles = []
+        for thread_name, stacks in self.samples.items():
+            samples, weights = [], []
+            for stack, count in stacks.items():
+                ids = []
+                for frame in stack:
+                    if frame not in index:
+                        index[frame] = len(frames)
+                        frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                    ids.append(index[frame])
+                samples.append(ids)
+                weights.append(count * self.interval)
+            profiles.append({
+                "type": "sampled",
+                "name": thread_name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            })
+        profiles.sort(key=lambda profile: -profile["endValue"])
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+            "name": name,
+            "activeProfileIndex": 0,
+            "exporter": "devhacks-profiler",
+        }
+
+
+def _frame_label(frame: Frame) -> str:
+    function, filename, line = frame
+    return f"{function} ({os.path.basename(filename)}:{line})".replace(";", ",")
+
+
+def _stack(frame) -> Tuple[Frame, ...]:
+    """Root-first stack of (function, file, line) for a frame"""
+    stack = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+def _is_idle(stack: Tuple[Frame, ...]) -> bool:
+    function, filename, _ = stack[-1]
+    return (os.path.basename(filename), function) in _IDLE_LEAVES
+
+
+class Sampler:
+    """Single-flight sampler; only one profile runs per process at a time"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @property
+    def active(self) -> bool:
+        return self._lock.locked()
+
+    def start(self, interval: float = PROFILER_INTERVAL_MS / 1000, include_idle: bool = False) -> Profile:
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already being collected in this worker")
+        self._stop.clear()
+        self._profile = Profile(max(interval, 0.001), include_idle)
+        self._thread = threading.Thread(target=self._run, args=(self._profile,), name="profiler", daemon=True)
+        self._thread.start()
+        return self._profile
+
+    def stop(self) -> Profile:
+        self._stop.set()
+        self._thread.join()
+        self._lock.release()
+        return self._profile
+
+    def _run(self, profile: Profile) -> None:
+        own_id = threading.get_ident()
+        started = time.perf_counter()
+        while not self._stop.wait(profile.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = _stack(frame)
+                if not stack or (not profile.include_idle and _is_idle(stack)):
+                    continue
+                thread_name = names.get(thread_id, f"thread-{thread_id}")
+                profile.samples.setdefault(thread_name, Counter())[stack] += 1
+            profile.sample_count += 1
+        profile.duration = time.perf_counter() - started
+
+    def profile(self, seconds: float, interval: Optional[float] = None, include_idle: bool = False) -> Profile:
+        """Blocking helper: sample for `seconds` and return the profile"""
+        self.start(interval or PROFILER_INTERVAL_MS / 1000, include_idle)
+        try:
+            time.sleep(min(seconds, PROFILER_MAX_SECONDS))
+        finally:
+            profile = self.stop()
+        return profile
+
+
+sampler = Sampler()
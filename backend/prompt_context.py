@@ -0,0 +1,244 @@
+# prompt_context.py
+"""Token-budgeted prompt context for gpt_answer.
+
+Company `details` can run to many kilobytes. Instead of pasting all of it
+into the prompt, each company gets a precomputed facts block and a short
+extractive summary (rebuilt whenever its `details` change), and the rest of
+the budget is filled with the excerpts that best match the question.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+try:  # optional: exact counts for OpenAI models
+    import tiktoken
+except ImportError:  # pragma: no cover - depends on the deployment
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("ASSISTANT_PROMPT_TOKENS", "1500"))
+FACTS_TOKEN_BUDGET = int(os.getenv("ASSISTANT_FACTS_TOKENS", "300"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("ASSISTANT_SUMMARY_TOKENS", "200"))
+QUESTION_TOKEN_BUDGET = int(os.getenv("ASSISTANT_QUESTION_TOKENS", "150"))
+CHUNK_TOKENS = int(os.getenv("ASSISTANT_CHUNK_TOKENS", "120"))
+CONTEXT_CACHE_SIZE = int(os.getenv("ASSISTANT_CONTEXT_CACHE_SIZE", "1024"))
+
+PROMPT_TEMPLATE = """Company Details:
+{context}
+
+Answer the question based only on the above:
+{question}"""
+
+_WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+# Lines worth keeping verbatim: numbers (prices, hours, phones, addresses), e-mails, links
+_FACT_RE = re.compile(r"\d|@|https?://|www\.", re.IGNORECASE)
+_SENTENCE_RE = re.compile(r"(?<=[.!?։])\s+")
+
+
+class TokenCounter:
+    """Counts tokens with tiktoken when installed, otherwise estimates them.
+
+    The encoding is loaded on first use, not at import: tiktoken downloads
+    its BPE files the first time, and offline that must not break imports.
+    If it cannot be loaded the counter falls back to the estimate for good.
+    """
+
+    def __init__(self, model: str = "gpt-4o"):
+        self.model = model
+        self._encoding = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _get_encoding(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._encoding = self._load_encoding()
+                    self._loaded = True
+        return self._encoding
+
+    def _load_encoding(self):
+        if tiktoken is None:
+            return None
+        try:
+            return tiktoken.encoding_for_model(self.model)
+        except Exception:
+            pass
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception:
+            logger.warning("tiktoken encoding unavailable, estimating token counts", exc_info=True)
+            return None
+
+    def count(self, text: str) -> int:
+        encoding = self._get_encoding()
+        if encoding is not None:
+            return len(encoding.encode(text))
+        # ~4 bytes per token for English; non-Latin scripts are 2+ bytes per
+        # character in UTF-8, so this stays on the safe side for Armenian too.
+        return (len(text.encode("utf-8")) + 2) // 3
+
+    def truncate(self, text: str, budget: int) -> str:
+        if budget <= 0:
+            return ""
+        if self.count(text) <= budget:
+            return text
+        encoding = self._get_encoding()
+        if encoding is not None:
+            return encoding.decode(encoding.encode(text)[:budget])
+        # Binary search on characters against the estimate
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.count(text[:mid]) <= budget:
+                low = mid
+            else:
+                high = mid - 1
+        return text[:low]
+
+
+counter = TokenCounter(os.getenv("ASSISTANT_CHAT_MODEL", "gpt-4o"))
+
+
+def _stems(text: str) -> set:
+    # Cheap stemming: the first five letters survive most English and
+    # Armenian inflection ("թերապիա" / "թերապիայի").
+    return {word[:5] for word in _WORD_RE.findall(text.lower()) if len(word) > 2}
+
+
+@dataclass
+class Chunk:
+    text: str
+    tokens: int
+    stems: set
+
+
+@dataclass
+class CompanyContext:
+    details_hash: str
+    facts: str
+    summary: str
+    chunks: List[Chunk]
+
+
+def _take(lines: List[str], budget: int) -> Tuple[str, set]:
+    """Greedily keep whole lines within the token budget"""
+    kept, used, taken = [], 0, set()
+    for index, line in enumerate(lines):
+        tokens = counter.count(line) + 1
+        if used + tokens > budget:
+            continue
+        kept.append(line)
+        taken.add(index)
+        used += tokens
+    return "\n".join(kept), taken
+
+
+def _chunk(lines: List[str]) -> List[Chunk]:
+    chunks, current, current_tokens = [], [], 0
+    for line in lines:
+        for piece in _SENTENCE_RE.split(line) if counter.count(line) > CHUNK_TOKENS else [line]:
+            tokens = counter.count(piece) + 1
+            if current and current_tokens + tokens > CHUNK_TOKENS:
+                text = "\n".join(current)
+                chunks.append(Chunk(text, current_tokens, _stems(text)))
+                current, current_tokens = [], 0
+            current.append(counter.truncate(piece, CHUNK_TOKENS))
+            current_tokens += min(tokens, CHUNK_TOKENS)
+    if current:
+        text = "\n".join(current)
+        chunks.append(Chunk(text, current_tokens, _stems(text)))
+    return chunks
+
+
+def compile_context(details: str) -> CompanyContext:
+    """Precompute the facts block, summary and excerpt chunks for a company"""
+    # Drop blank and repeated lines (pasted details often repeat addresses)
+    lines = list(dict.fromkeys(line.strip() for line in (details or "").splitlines() if line.strip()))
+
+    fact_indexes = [index for index, line in enumerate(lines) if _FACT_RE.search(line)]
+    facts, taken = _take([lines[index] for index in fact_indexes], FACTS_TOKEN_BUDGET)
+    used = {fact_indexes[index] for index in taken}
+
+    # Lead-first extractive summary: the opening lines usually describe the company
+    fact_set = set(fact_indexes)
+    prose_indexes = [index for index in range(len(lines)) if index not in fact_set]
+    summary, taken = _take([lines[index] for index in prose_indexes], SUMMARY_TOKEN_BUDGET)
+    used |= {prose_indexes[index] for index in taken}
+
+    # Whatever did not make it into the facts/summary is available as excerpts
+    remaining = [line for index, line in enumerate(lines) if index not in used]
+    details_hash = hashlib.sha1((details or "").encode("utf-8")).hexdigest()
+    return CompanyContext(details_hash, facts, summary, _chunk(remaining))
+
+
+class ContextStore:
+    """Per-company compiled contexts, rebuilt when `details` change (LRU bounded)"""
+
+    def __init__(self, max_entries: int = CONTEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[object, CompanyContext]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, company_id: Optional[int], details: str) -> CompanyContext:
+        details_hash = hashlib.sha1((details or "").encode("utf-8")).hexdigest()
+        key = company_id if company_id is not None else details_hash
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.details_hash == details_hash:
+                self._entries.move_to_end(key)
+                return entry
+
+        entry = compile_context(details)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+
+context_store = ContextStore()
+
+
+def build_prompt(
+    details: str,
+    question: str,
+    company_id: Optional[int] = None,
+    budget: int = PROMPT_TOKEN_BUDGET,
+) -> str:
+    """Render the gpt_answer prompt within `budget` tokens"""
+    question = counter.truncate(question, QUESTION_TOKEN_BUDGET)
+    compiled = context_store.get(company_id, details)
+
+    sections = [section for section in (compiled.facts, compiled.summary) if section]
+    remaining = budget - counter.count(PROMPT_TEMPLATE.format(context="\n\n".join(sections), question=question))
+
+    # Fill what is left with the excerpts that share the most terms with the question
+    question_stems = _stems(question)
+    ranked = sorted(
+        enumerate(compiled.chunks),
+        key=lambda item: (-len(item[1].stems & question_stems), item[0]),
+    )
+    picked = []
+    for index, chunk in ranked:
+        if not chunk.stems & question_stems:
+            break
+        if chunk.tokens + 2 <= remaining:
+            picked.append(index)
+            remaining -= chunk.tokens + 2
+    excerpts = [compiled.chunks[index].text for index in sorted(picked)]
+
+    context = "\n\n".join(sections + excerpts)
+    prompt = PROMPT_TEMPLATE.format(context=context, question=question)
+    if counter.count(prompt) > budget:
+        # Facts/summary budgets larger than the total: trim the context itself
+        overhead = counter.count(PROMPT_TEMPLATE.format(context="", question=question))
+        prompt = PROMPT_TEMPLATE.format(context=counter.truncate(context, budget - overhead), question=question)
+    return prompt
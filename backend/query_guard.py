@@ -0,0 +1,227 @@
+# query_guard.py
+"""Opt-in N+1 and slow-query detector for development and CI.
+
+QUERY_GUARD selects the mode (default off, nothing is installed):
+  log    – warn about repeated statement shapes, slow queries (with their
+           EXPLAIN plan) and endpoints over their declared query budget
+  raise  – same, but a request over budget raises QueryBudgetExceeded, so
+           TestClient-based tests fail
+
+Endpoints declare a budget with `@query_budget(n)` below the route decorator.
+Tests can also count statements directly with `capture_queries()` /
+`assert_max_queries(n)`.
+"""
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("query_guard")
+
+QUERY_GUARD = os.getenv("QUERY_GUARD", "off").lower()
+SLOW_QUERY_MS = float(os.getenv("QUERY_GUARD_SLOW_MS", "100"))
+REPEAT_THRESHOLD = int(os.getenv("QUERY_GUARD_REPEAT", "5"))
+EXPLAIN_SLOW = os.getenv("QUERY_GUARD_EXPLAIN", "1") == "1"
+
+_BUDGET_ATTR = "__query_budget__"
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+# Expanded IN lists: "IN (?, ?, ?)" / "IN (%(id_1_1)s, %(id_1_2)s)" -> "IN (?)"
+_IN_LIST_RE = re.compile(r"\bIN \((?:[^()]*?,\s*)*[^()]*?\)", re.IGNORECASE)
+_PARAM_RE = re.compile(r"%\(\w+\)s|:\w+|\$\d+|\?")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def statement_shape(statement: str) -> str:
+    """Normalise a statement so the same query with different values compares equal"""
+    shape = _WHITESPACE_RE.sub(" ", statement).strip()
+    shape = _STRING_RE.sub("?", shape)
+    shape = _PARAM_RE.sub("?", shape)
+    shape = _NUMBER_RE.sub("?", shape)
+    return _IN_LIST_RE.sub("IN (?)", shape)
+
+
+@dataclass
+class QueryLog:
+    statements: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+    slow: int = 0
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def shapes(self) -> Counter:
+        return Counter(statement_shape(statement) for statement in self.statements)
+
+    def repeated(self, threshold: int = REPEAT_THRESHOLD):
+        """Statement shapes executed at least `threshold` times (likely N+1)"""
+        return [(shape, n) for shape, n in self.shapes().most_common() if n >= threshold]
+
+    def report(self) -> str:
+        lines = [f"{self.count} queries in {self.seconds * 1000:.1f} ms"]
+        lines += [f"  {n}x {shape[:300]}" for shape, n in self.shapes().most_common()]
+        return "\n".join(lines)
+
+
+def query_budget(max_queries: int):
+    """Declare the most SQL statements an endpoint may run per request"""
+
+    def decorator(endpoint):
+        setattr(endpoint, _BUDGET_ATTR, max_queries)
+        return endpoint
+
+    return decorator
+
+
+# ── Collection ────────────────────────────────────────────────────────────
+_request_log: contextvars.ContextVar[Optional[QueryLog]] = contextvars.ContextVar("query_guard_log", default=None)
+# Logs opened by capture_queries(); they see statements from every thread,
+# since TestClient runs the app in a worker thread of its own.
+_captures: List[QueryLog] = []
+_captures_lock = threading.Lock()
+_installed = False
+_install_lock = threading.Lock()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_guard_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_guard_started")
+    if not started:
+        # Listeners installed while this statement was already running
+        return
+    elapsed = time.perf_counter() - started.pop()
+    targets = list(_captures)
+    request_log = _request_log.get()
+    if request_log is not None:
+        targets.append(request_log)
+    for log in targets:
+        log.statements.append(statement)
+        log.seconds += elapsed
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        for log in targets:
+            log.slow += 1
+        plan = _explain(conn, cursor, statement, parameters) if EXPLAIN_SLOW and not executemany else None
+        logger.warning(
+            "Slow query (%.1f ms): %s%s",
+            elapsed * 1000,
+            _WHITESPACE_RE.sub(" ", statement)[:1000],
+            f"\nPlan:\n{plan}" if plan else "",
+        )
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    stack = conn.info.get("query_guard_started") if conn is not None else None
+    if stack:
+        stack.pop()
+
+
+def _explain(conn, cursor, statement, parameters) -> Optional[str]:
+    if statement.lstrip()[:6].upper() not in ("SELECT", "WITH"):
+        return None
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    try:
+        # Straight through the DBAPI so the plan query is not itself counted
+        explain_cursor = cursor.connection.cursor()
+        try:
+            explain_cursor.execute(prefix + statement, parameters)
+            return "\n".join(" ".join(str(col) for col in row) for row in explain_cursor.fetchall())
+        finally:
+            explain_cursor.close()
+    except Exception as exc:  # never break the request over a diagnostic
+        return f"(EXPLAIN failed: {exc})"
+
+
+def install() -> None:
+    """Attach the statement listeners to every engine (idempotent)"""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+        _installed = True
+
+
+@contextmanager
+def capture_queries():
+    """Collect every statement executed while the block runs"""
+    install()
+    log = QueryLog()
+    with _captures_lock:
+        _captures.append(log)
+    try:
+        yield log
+    finally:
+        with _captures_lock:
+            _captures.remove(log)
+
+
+@contextmanager
+def assert_max_queries(max_queries: int):
+    """Fail (QueryBudgetExceeded) if the block runs more than `max_queries` statements"""
+    with capture_queries() as log:
+        yield log
+    if log.count > max_queries:
+        raise QueryBudgetExceeded(f"Expected at most {max_queries} queries, got {log.report()}")
+
+
+# ── ASGI middleware ───────────────────────────────────────────────────────
+class QueryGuardMiddleware:
+    """Per-request statement log; checks repeats and the endpoint's budget"""
+
+    def __init__(self, app, mode: str = QUERY_GUARD, repeat_threshold: int = REPEAT_THRESHOLD):
+        self.app = app
+        self.mode = mode
+        self.repeat_threshold = repeat_threshold
+        install()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        log = QueryLog()
+        token = _request_log.set(log)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_log.reset(token)
+        self.check(scope, log)
+
+    def check(self, scope, log: QueryLog) -> None:
+        route = scope.get("route")
+        label = f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+        for shape, n in log.repeated(self.repeat_threshold):
+            logger.warning("Possible N+1 in %s: %dx %s", label, n, shape[:500])
+
+        budget = getattr(getattr(route, "endpoint", None), _BUDGET_ATTR, None)
+        if budget is not None and log.count > budget:
+            message = f"{label} ran {log.count} queries, budget is {budget}\n{log.report()}"
+            if self.mode == "raise":
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+
+def enabled() -> bool:
+    return QUERY_GUARD in ("log", "raise")
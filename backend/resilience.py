@@ -0,0 +1,254 @@
+# resilience.py
+"""Hedged requests and circuit breaking for upstream calls (OpenAI, Qdrant).
+
+`Upstream.call(attempt)` runs `attempt()` (a coroutine factory) and, when
+it has not answered within that upstream's recent p95 latency, starts a
+second identical attempt and takes whichever answers first. Hedges draw on
+a token bucket refilled by UPSTREAM_HEDGE_RATIO per call, so a slow
+upstream never sees more than that share of extra load.
+
+Each upstream has its own `CircuitBreaker`. After
+CIRCUIT_FAILURE_THRESHOLD consecutive failures the circuit opens and calls
+fail fast with `CircuitOpenError` for CIRCUIT_RESET_SECONDS, after which a
+single probe call decides whether it closes again. Callers catch
+`CircuitOpenError` to serve a degraded answer instead of waiting.
+
+State is per worker process and is only touched from the event loop.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from deadline import remaining
+from observability import registry
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+# Upstreams whose calls may be duplicated (comma separated names, "" for none)
+UPSTREAM_HEDGED = {
+    name.strip()
+    for name in os.getenv("UPSTREAM_HEDGED", "openai_embed,openai_chat,qdrant_search").split(",")
+    if name.strip()
+}
+UPSTREAM_HEDGE_QUANTILE = float(os.getenv("UPSTREAM_HEDGE_QUANTILE", "0.95"))
+# Never hedge sooner than this, however fast the upstream usually is
+UPSTREAM_HEDGE_MIN_DELAY = float(os.getenv("UPSTREAM_HEDGE_MIN_DELAY", "0.05"))
+# Extra load allowed: hedges per call, with a small burst allowance
+UPSTREAM_HEDGE_RATIO = float(os.getenv("UPSTREAM_HEDGE_RATIO", "0.1"))
+UPSTREAM_HEDGE_BURST = float(os.getenv("UPSTREAM_HEDGE_BURST", "5"))
+# Latency samples kept per upstream, and how many before hedging starts
+UPSTREAM_LATENCY_WINDOW = int(os.getenv("UPSTREAM_LATENCY_WINDOW", "500"))
+UPSTREAM_LATENCY_MIN_SAMPLES = int(os.getenv("UPSTREAM_LATENCY_MIN_SAMPLES", "20"))
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+UPSTREAM_CALLS = registry.counter(
+    "upstream_calls_total", "Upstream calls by outcome (ok, error, timeout, rejected)", ("upstream", "outcome")
+)
+UPSTREAM_DURATION = registry.histogram(
+    "upstream_call_duration_seconds", "Upstream call latency as seen by the caller, hedging included", ("upstream",)
+)
+UPSTREAM_HEDGES = registry.counter(
+    "upstream_hedges_total", "Hedged duplicate requests (sent, won)", ("upstream", "result")
+)
+UPSTREAM_HEDGE_DELAY = registry.gauge(
+    "upstream_hedge_delay_seconds", "Current hedge delay (recent latency quantile)", ("upstream",)
+)
+CIRCUIT_STATE = registry.gauge(
+    "upstream_circuit_state", "Circuit breaker state: 0 closed, 1 half-open, 2 open", ("circuit",)
+)
+CIRCUIT_TRANSITIONS = registry.counter(
+    "upstream_circuit_transitions_total", "Circuit breaker state changes", ("circuit", "state")
+)
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, circuit: str, retry_after: float):
+        super().__init__(f"circuit {circuit!r} is open; retrying in {retry_after:.1f}s")
+        self.circuit = circuit
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(
+        self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        CIRCUIT_STATE.set(0, circuit=name)
+
+    def _transition(self, state: str) -> None:
+        if state != self.state:
+            logger.warning("Circuit %s: %s -> %s", self.name, self.state, state)
+            self.state = state
+            CIRCUIT_STATE.set(_STATE_VALUES[state], circuit=self.name)
+            CIRCUIT_TRANSITIONS.inc(circuit=self.name, state=state)
+
+    def acquire(self) -> None:
+        """Admit a call or raise CircuitOpenError; pair with success/failure/release"""
+        if self.state == OPEN:
+            waited = time.monotonic() - self._opened_at
+            if waited < self.reset_seconds:
+                raise CircuitOpenError(self.name, self.reset_seconds - waited)
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            # One probe at a time; everyone else keeps failing fast
+            if self._probing:
+                raise CircuitOpenError(self.name, 0.0)
+            self._probing = True
+
+    def success(self) -> None:
+        self.failures = 0
+        self._probing = False
+        self._transition(CLOSED)
+
+    def failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._transition(OPEN)
+
+    def release(self) -> None:
+        """The call was abandoned (cancelled) without telling us anything"""
+        self._probing = False
+
+
+class LatencyWindow:
+    """The last `size` latencies of an upstream, for quantile estimates"""
+
+    def __init__(self, size: int = UPSTREAM_LATENCY_WINDOW):
+        self._samples: deque = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+class Upstream:
+    """One kind of upstream call: its latency history, hedging policy and circuit"""
+
+    def __init__(self, name: str, breaker: Optional[CircuitBreaker] = None, hedge: Optional[bool] = None):
+        self.name = name
+        self.breaker = breaker or CircuitBreaker(name)
+        self.hedge = name in UPSTREAM_HEDGED if hedge is None else hedge
+        self.latencies = LatencyWindow()
+        self._hedge_tokens = UPSTREAM_HEDGE_BURST
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None when this call should not be hedged"""
+        if not self.hedge or len(self.latencies) < UPSTREAM_LATENCY_MIN_SAMPLES:
+            return None
+        delay = max(UPSTREAM_HEDGE_MIN_DELAY, self.latencies.quantile(UPSTREAM_HEDGE_QUANTILE))
+        UPSTREAM_HEDGE_DELAY.set(delay, upstream=self.name)
+        # A hedge that could not finish before the deadline only adds load
+        left = remaining()
+        return None if left is not None and left <= delay else delay
+
+    async def call(self, attempt: Callable[[], Awaitable[T]]) -> T:
+        try:
+            self.breaker.acquire()
+        except CircuitOpenError:
+            UPSTREAM_CALLS.inc(upstream=self.name, outcome="rejected")
+            raise
+        self._hedge_tokens = min(UPSTREAM_HEDGE_BURST, self._hedge_tokens + UPSTREAM_HEDGE_RATIO)
+        started = time.perf_counter()
+        try:
+            result = await self._hedged(attempt)
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except asyncio.TimeoutError:
+            # Cut short by a tight deadline, not slowness: says nothing about the upstream
+            usual = self.latencies.quantile(UPSTREAM_HEDGE_QUANTILE)
+            if usual is not None and time.perf_counter() - started < usual:
+                self.breaker.release()
+            else:
+                self.breaker.failure()
+            UPSTREAM_CALLS.inc(upstream=self.name, outcome="timeout")
+            raise
+        except Exception:
+            self.breaker.failure()
+            UPSTREAM_CALLS.inc(upstream=self.name, outcome="error")
+            raise
+        self.breaker.success()
+        UPSTREAM_CALLS.inc(upstream=self.name, outcome="ok")
+        UPSTREAM_DURATION.observe(time.perf_counter() - started, upstream=self.name)
+        return result
+
+    async def _timed(self, attempt: Callable[[], Awaitable[T]]) -> T:
+        started = time.perf_counter()
+        try:
+            result = await attempt()
+        except asyncio.CancelledError:
+            # Cut short (often the hedge that lost): its time says nothing about the upstream
+            raise
+        except Exception:
+            # Timeouts and failures are the slowest calls; leaving them out would bias p95 low
+            self.latencies.add(time.perf_counter() - started)
+            raise
+        self.latencies.add(time.perf_counter() - started)
+        return result
+
+    async def _hedged(self, attempt: Callable[[], Awaitable[T]]) -> T:
+        primary = asyncio.ensure_future(self._timed(attempt))
+        # A half-open circuit gets exactly one probe request
+        delay = self.hedge_delay() if self.breaker.state == CLOSED else None
+        if delay is None:
+            return await primary
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+            if self._hedge_tokens < 1:
+                return await primary
+            self._hedge_tokens -= 1
+            hedge = asyncio.ensure_future(self._timed(attempt))
+            UPSTREAM_HEDGES.inc(upstream=self.name, result="sent")
+            pending = {primary, hedge}
+            first_error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            UPSTREAM_HEDGES.inc(upstream=self.name, result="won")
+                        return task.result()
+                    first_error = first_error or task.exception()
+            raise first_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+# A circuit each: embedding successes must not mask a failing chat endpoint
+openai_embed = Upstream("openai_embed")
+openai_chat = Upstream("openai_chat")
+qdrant_search = Upstream("qdrant_search")
@@ -0,0 +1,179 @@
+# retrieval.py
+"""Hybrid lexical + vector retrieval of company context for the assistant.
+
+Postgres full-text hits (see search.py) and Qdrant vector hits are merged
+with reciprocal-rank fusion. When the question names a company, product or
+offering outright, the lexical side alone answers it and the embedding
+round trip is skipped. While the OpenAI or Qdrant circuit is open the
+lexical ranking is used on its own.
+
+A call whose tenant is known is answered from that company alone: Qdrant
+holds one point per company, so there is nothing to rank and no search
+may reach another tenant's data. The ranking only runs for calls with no
+resolvable tenant.
+"""
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from database import call_in_session
+from models import Company
+from observability import stage
+from resilience import CircuitOpenError
+from search import mentions, search_catalog, search_tokens
+
+logger = logging.getLogger(__name__)
+
+_lexical_warning_logged = False
+
+RRF_K = int(os.getenv("RETRIEVAL_RRF_K", "60"))
+LEXICAL_CANDIDATES = int(os.getenv("RETRIEVAL_LEXICAL_CANDIDATES", "20"))
+VECTOR_CANDIDATES = int(os.getenv("RETRIEVAL_VECTOR_CANDIDATES", "5"))
+
+
+@dataclass
+class RetrievedCompany:
+    id: int
+    name: str
+    details: str
+    score: float
+    sources: Tuple[str, ...] = field(default_factory=tuple)
+
+
+@dataclass
+class LexicalHit:
+    company_id: int
+    # Whether the hit's name appears verbatim (as whole words) in the question
+    exact: bool
+
+
+def reciprocal_rank_fusion(*rankings: Sequence[int], k: int = RRF_K) -> List[Tuple[int, float]]:
+    """Merge ranked id lists: score(id) = sum(1 / (k + rank))"""
+    scores: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for position, key in enumerate(ranking):
+            scores[key] += 1.0 / (k + position + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def lexical_company_hits(
+    db: Session, question: str, limit: int = LEXICAL_CANDIDATES, company_id: Optional[int] = None
+) -> List[LexicalHit]:
+    """Rank companies by full-text hits on their name/details and catalog items.
+
+    Product and offering hits count for the company that sells them; with
+    `company_id` only that company's rows are searched. Returns an empty
+    list when full-text search is unavailable (e.g. SQLite).
+    """
+    try:
+        with stage("lexical"):
+            rows, _ = search_catalog(db, question, company_id=company_id, limit=limit, match_any=True)
+    except SQLAlchemyError:
+        global _lexical_warning_logged
+        if not _lexical_warning_logged:
+            logger.warning("Lexical retrieval unavailable, using vector search only", exc_info=True)
+            _lexical_warning_logged = True
+        db.rollback()
+        return []
+
+    question_tokens = search_tokens(question)
+    hits: Dict[int, LexicalHit] = {}
+    for row in rows:
+        exact = mentions(question_tokens, row.name)
+        hit = hits.get(row.company_id)
+        if hit is None:
+            hits[row.company_id] = LexicalHit(row.company_id, exact)
+        elif exact:
+            hit.exact = True
+    return list(hits.values())
+
+
+def load_companies(db: Session, company_ids: Sequence[int]) -> Dict[int, Tuple[str, str]]:
+    rows = db.query(Company.id, Company.name, Company.details).filter(Company.id.in_(company_ids)).all()
+    return {row.id: (row.name, row.details or "") for row in rows}
+
+
+class HybridRetriever:
+    """Retrieve the companies most relevant to a caller's question.
+
+    `embed` and `vector_search` are async callables so the retriever stays
+    independent of the embedding provider and vector store clients;
+    `vector_search(vector, limit)` returns Qdrant scored points. Each
+    database step runs in a worker thread with a session of its own, so a
+    cancelled retrieval never leaves a thread using a session that is
+    being closed.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[str], Awaitable[List[float]]],
+        vector_search: Callable[[List[float], int], Awaitable[list]],
+    ):
+        self.embed = embed
+        self.vector_search = vector_search
+
+    async def retrieve(
+        self, question: str, limit: int = 1, company_id: Optional[int] = None, read_only: bool = False
+    ) -> List[RetrievedCompany]:
+        def in_session(fn, *args):
+            return asyncio.to_thread(call_in_session, fn, *args, read_only=read_only)
+
+        if company_id is not None:
+            companies = await in_session(load_companies, [company_id])
+            if company_id not in companies:
+                return []
+            return [RetrievedCompany(company_id, *companies[company_id], score=1.0, sources=("tenant",))]
+
+        lexical = await in_session(lexical_company_hits, question)
+
+        # Exact-match fast path: the question names something in the catalog
+        exact = [hit.company_id for hit in lexical if hit.exact]
+        if exact:
+            companies = await in_session(load_companies, exact[:limit])
+            return [
+                RetrievedCompany(cid, *companies[cid], score=1.0, sources=("lexical",))
+                for cid in exact[:limit]
+                if cid in companies
+            ]
+
+        try:
+            question_vector = await self.embed(question)
+            points = await self.vector_search(question_vector, VECTOR_CANDIDATES)
+        except CircuitOpenError:
+            # Degrade to the lexical ranking while OpenAI or Qdrant is failing
+            if not lexical:
+                raise
+            points = []
+
+        lexical_ranking = [hit.company_id for hit in lexical]
+        vector_ranking = [int(point.id) for point in points]
+        fused = reciprocal_rank_fusion(lexical_ranking, vector_ranking)[:limit]
+        if not fused:
+            return []
+
+        payloads = {int(point.id): point.payload or {} for point in points}
+        missing = [cid for cid, _ in fused if "details" not in payloads.get(cid, {})]
+        companies = await in_session(load_companies, missing) if missing else {}
+
+        results = []
+        for cid, score in fused:
+            if cid in payloads and "details" in payloads[cid]:
+                name, details = payloads[cid].get("name", ""), payloads[cid]["details"] or ""
+            elif cid in companies:
+                name, details = companies[cid]
+            else:
+                # Stale vector for a deleted company
+                continue
+            sources = tuple(
+                source
+                for source, ranking in (("lexical", lexical_ranking), ("vector", vector_ranking))
+                if cid in ranking
+            )
+            results.append(RetrievedCompany(cid, name, details, score, sources))
+        return results
@@ -1,106 +1,283 @@
 import logging
-from fastapi import APIRouter, Request, Depends, HTTPException
+from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
 import asyncio
-import openai
+import functools
+import hashlib
+import json
 import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import List, Optional
 
-from qdrant_client import QdrantClient
-from qdrant_client.http import models as rest
-
-from database import get_db  # your sync DB session dependency
+from assistant_cache import answer_cache, embedding_cache
+from database import call_in_session
+from catalog_facts import answer_catalog_question
+from chat_log import chat_log
+from idempotency import COMPUTED, webhook_results
+import vector_store
+from deadline import Deadline, deadline_scope, enforce, remaining
+from llm import LocalProvider, get_provider
+from observability import astage, registry, sub_timings
+from prompt_context import build_prompt
+from resilience import CircuitOpenError, openai_chat, openai_embed, qdrant_search
+from retrieval import HybridRetriever
+from vector_store import COLLECTION_NAME
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["assistant"])
 
-# Setup OpenAI key
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Deadline for each tool call of a webhook turn, unless the payload sets timeoutSeconds
+TOOL_CALL_TIMEOUT = float(os.getenv("WEBHOOK_TOOL_CALL_TIMEOUT", "20"))
+# Taken off a payload timeout for the trip back to Vapi
+DEADLINE_MARGIN = float(os.getenv("WEBHOOK_DEADLINE_MARGIN", "0.5"))
+# Kept back from every upstream call so a fallback can still go out in time
+FALLBACK_RESERVE = float(os.getenv("ASSISTANT_FALLBACK_RESERVE", "0.25"))
+# With less budget than this left, skip GPT and answer extractively
+LLM_MIN_SECONDS = float(os.getenv("ASSISTANT_LLM_MIN_SECONDS", "1.5"))
+
+TOOL_CALLS = registry.counter("webhook_tool_calls_total", "Webhook tool calls by outcome", ("outcome",))
+FALLBACK_ANSWERS = registry.counter(
+    "assistant_fallback_answers_total", "Extractive answers given instead of GPT", ("reason",)
+)
 
-# Qdrant client setup
-QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
-QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
-COLLECTION_NAME = "companies"
+# Upstream calls get what is left of the deadline (None: no deadline, no limit),
+# are hedged when slow and fail fast while their circuit is open
+async def timed_embed(text: str):
+    async with astage("embed"):
+        vector = embedding_cache.get(text)
+        if vector is None:
+            vector = await openai_embed.call(
+                lambda: get_provider().aembed(text, timeout=remaining(FALLBACK_RESERVE))
+            )
+            embedding_cache.put(text, vector)
+        return vector
 
-client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+async def timed_vector_search(question_vector, limit: int):
+    async with astage("search"):
+        return await qdrant_search.call(
+            lambda: vector_store.search(COLLECTION_NAME, question_vector, limit, timeout=remaining(FALLBACK_RESERVE))
+        )
 
-def embed(text: str):
-    response = openai.Embedding.create(
-        input=text,
-        model="text-embedding-3-small"
+retriever = HybridRetriever(embed=timed_embed, vector_search=timed_vector_search)
+
+async def gpt_answer(details: str, question: str, company_id: int = None):
+    prompt = build_prompt(details, question, company_id)
+    # Each attempt (a hedge starts later) gets what is left of the deadline
+    return await openai_chat.call(
+        lambda: get_provider().acomplete(prompt, max_tokens=150, temperature=0.2, timeout=remaining(FALLBACK_RESERVE))
     )
-    return response['data'][0]['embedding']
 
-def gpt_answer(details: str, question: str):
-    prompt = f"""Company Details:
-{details}
+_extractive = LocalProvider()
 
-Answer the question based only on the above:
-{question}"""
+def fallback_answer(details: str, question: str, company_id: int, reason: str) -> str:
+    """The best-matching sentence of the company context: no upstream call, no waiting"""
+    FALLBACK_ANSWERS.inc(reason=reason)
+    # The extractive answerer reads the question from the last paragraph
+    return _extractive.complete(f"{details}\n\n{question}")
 
-    response = openai.ChatCompletion.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=150,
-        temperature=0.2
-    )
-    return response['choices'][0]['message']['content']
+NOT_FOUND_ANSWER = "Sorry, I couldn't find information related to your question."
+DEGRADED_ANSWER = "Sorry, I can't look that up right now. Please ask me again in a minute."
 
-@router.post("/webhook")
-async def vapi_webhook(request: Request, db: Session = Depends(get_db)):
-    data = await request.json()
+async def answer_question(question: str, company_id: int = None, read_only: bool = False) -> str:
+    """Catalog fast path, else hybrid retrieval (SQL full-text + Qdrant) and GPT, off the event loop.
 
-    # Extract toolCallId safely, fallback to "no-id"
-    tool_call_id = "no-id"
-    try:
-        message = data.get("message", {})
-        tool_calls = message.get("toolCalls", [])
-        if tool_calls:
-            tool_call = tool_calls[0]
-            tool_call_id = tool_call.get("toolCallId") or tool_call.get("id") or "no-id"
-    except Exception:
-        pass
-
-    # Extract user question from payload (adjust this depending on actual payload)
-    user_question = (
-        data.get("message", {}).get("text") or
-        data.get("question") or
-        "Tell me about the company"
-    )
+    Every database step opens its own session in its worker thread: once the
+    deadline cancels the await, that thread may still be running its query.
+    """
+    cached = answer_cache.get(company_id, question)
+    if cached is not None:
+        return cached
+    generation = answer_cache.begin()
 
-    # Run embedding + Qdrant search + GPT in thread pool to avoid blocking event loop
-    async def process_question(question: str):
-        question_vector = await asyncio.to_thread(embed, question)
+    # Price / stock lookups are answered from the catalog tables directly
+    async with astage("catalog"):
+        answer = await asyncio.to_thread(
+            call_in_session, answer_catalog_question, question, company_id, read_only=read_only
+        )
 
-        search_result = await asyncio.to_thread(
-            lambda: client.search(
-                collection_name=COLLECTION_NAME,
-                query_vector=question_vector,
-                limit=1,
-                with_payload=True,
-            )
+    if answer is None:
+        try:
+            companies = await retriever.retrieve(question, limit=1, company_id=company_id, read_only=read_only)
+        except CircuitOpenError:
+            # Vector search is unavailable and the lexical side found nothing
+            FALLBACK_ANSWERS.inc(reason="circuit_open")
+            return answer_cache.get_stale(company_id, question) or DEGRADED_ANSWER
+        if not companies:
+            # Not cached: the index may just be empty or mid-rebuild
+            return NOT_FOUND_ANSWER
+
+        top_hit = companies[0]
+        budget = remaining(FALLBACK_RESERVE)
+        # Fallbacks are not cached: the next caller may have time for GPT
+        if budget is not None and budget < LLM_MIN_SECONDS:
+            return fallback_answer(top_hit.details, question, top_hit.id, "budget")
+        try:
+            async with astage("llm"):
+                answer = await gpt_answer(top_hit.details, question, top_hit.id)
+        except asyncio.TimeoutError:
+            return fallback_answer(top_hit.details, question, top_hit.id, "timeout")
+        except CircuitOpenError:
+            # A GPT answer from before the last catalog edit beats an extractive one
+            stale = answer_cache.get_stale(company_id, question)
+            if stale is not None:
+                FALLBACK_ANSWERS.inc(reason="circuit_open")
+                return stale
+            return fallback_answer(top_hit.details, question, top_hit.id, "circuit_open")
+        except Exception as exc:
+            logger.warning("Completion failed, answering extractively: %s: %s", exc.__class__.__name__, exc)
+            return fallback_answer(top_hit.details, question, top_hit.id, "error")
+
+    answer_cache.put(company_id, question, answer, generation)
+    return answer
+
+async def answer_within_deadline(question: str, company_id: int = None, read_only: bool = False) -> str:
+    """answer_question, cancelled once the current deadline (if any) passes"""
+    # Cancels in-flight upstream calls once the deadline passes
+    async with enforce("pipeline"):
+        return await answer_question(question, company_id, read_only)
+
+DEFAULT_QUESTION = "Tell me about the company"
+TIMEOUT_ANSWER = "Sorry, that is taking longer than expected. Please ask me again in a moment."
+ERROR_ANSWER = "Sorry, something went wrong while looking that up."
+
+@dataclass
+class ToolCall:
+    id: str
+    question: str
+    # Seconds this call may take (payload timeoutSeconds less the margin, or TOOL_CALL_TIMEOUT)
+    budget: float = TOOL_CALL_TIMEOUT
+
+async def answer_tool_call(data: dict, call: ToolCall, company_id: Optional[int], asked_at: datetime) -> dict:
+    """Answer one tool call before its deadline; returns its `results` entry"""
+    started = time.perf_counter()
+    # Inherited by the pipeline task, which is cancelled when it passes
+    with sub_timings() as timings, deadline_scope(Deadline.after(call.budget)):
+        # A Vapi retry of the same tool call joins (or reuses) the first attempt
+        compute = functools.partial(answer_within_deadline, call.question, company_id)
+        try:
+            async with enforce("tool_call"):
+                if call.id == "no-id":
+                    result, outcome = await compute(), COMPUTED
+                else:
+                    result, outcome = await webhook_results.run(idempotency_key(company_id, call), compute)
+        except asyncio.TimeoutError:
+            TOOL_CALLS.inc(outcome="timeout")
+            return {"toolCallId": call.id, "result": TIMEOUT_ANSWER}
+        except Exception:
+            logger.exception("Tool call %s failed", call.id)
+            TOOL_CALLS.inc(outcome="error")
+            return {"toolCallId": call.id, "result": ERROR_ANSWER}
+    TOOL_CALLS.inc(outcome="ok")
+
+    # Persisted by the write-behind log, off the response path; retries are not logged again
+    if outcome == COMPUTED:
+        chat_log.log_exchange(
+            conversation_id=extract_conversation_id(data, call.id),
+            company_id=company_id,
+            question=call.question,
+            answer=result,
+            asked_at=asked_at,
+            answered_at=datetime.now(timezone.utc),
+            meta={
+                "toolCallId": call.id,
+                "totalMs": round((time.perf_counter() - started) * 1000, 1),
+                "stagesMs": {name: round(seconds * 1000, 1) for name, seconds in timings.stages.items()},
+            },
         )
+    return {"toolCallId": call.id, "result": result}
+
+def idempotency_key(company_id: Optional[int], call: ToolCall) -> tuple:
+    """A toolCallId only replays an answer to the same question for the same tenant"""
+    # The id is the caller's to choose: on its own it would hand one tenant's answer to another
+    return company_id, call.id, hashlib.sha256(call.question.encode("utf-8")).hexdigest()
 
-        if not search_result:
-            return "Sorry, I couldn't find information related to your question."
+def extract_conversation_id(data: dict, tool_call_id: str) -> str:
+    """The Vapi call id groups a call's questions; else the tool call itself"""
+    message = data.get("message") or {}
+    call_id = (message.get("call") or {}).get("id") or (data.get("call") or {}).get("id")
+    return str(call_id or tool_call_id)
 
-        top_hit = search_result[0]
-        details = top_hit.payload.get("details", "")
+def extract_tool_calls(data: dict) -> List[ToolCall]:
+    """One ToolCall per entry of message.toolCalls (one "no-id" call when there are none)"""
+    message = data.get("message") or {}
+    default_question = message.get("text") or data.get("question") or DEFAULT_QUESTION
+    calls = []
+    for tool_call in message.get("toolCalls") or []:
+        if not isinstance(tool_call, dict):
+            continue
+        function = tool_call.get("function") or {}
+        arguments = function.get("arguments", tool_call.get("arguments")) or {}
+        if isinstance(arguments, str):
+            # OpenAI-style tool calls carry arguments as a JSON string
+            try:
+                arguments = json.loads(arguments)
+            except ValueError:
+                arguments = {"question": arguments}
+        if not isinstance(arguments, dict):
+            arguments = {}
+        call_id = str(tool_call.get("toolCallId") or tool_call.get("id") or "no-id")
+        # Arguments are written by the voice model, which the caller can steer:
+        # a company_id among them is never trusted, see extract_company_id
+        calls.append(ToolCall(
+            id=call_id,
+            question=arguments.get("question") or arguments.get("query") or default_question,
+            budget=tool_call_budget(data, call_id),
+        ))
+    return calls or [ToolCall("no-id", default_question, budget=tool_call_budget(data, None))]
 
-        answer = await asyncio.to_thread(gpt_answer, details, question)
-        return answer
+def tool_call_budget(data: dict, call_id: Optional[str]) -> float:
+    """Deadline for a tool call: the tool's or assistant's server timeoutSeconds, else config"""
+    message = data.get("message") or {}
+    candidates = [data.get("timeoutSeconds"), message.get("timeoutSeconds")]
+    for entry in message.get("toolWithToolCallList") or []:
+        if isinstance(entry, dict) and (entry.get("toolCall") or {}).get("id") == call_id:
+            candidates.append((entry.get("server") or {}).get("timeoutSeconds"))
+    assistant = (message.get("call") or {}).get("assistant") or message.get("assistant") or {}
+    candidates.append((assistant.get("server") or {}).get("timeoutSeconds"))
+    for value in candidates:
+        try:
+            if value is not None and float(value) > 0:
+                return max(0.0, float(value) - DEADLINE_MARGIN)
+        except (TypeError, ValueError):
+            continue
+    return TOOL_CALL_TIMEOUT
 
-    result_text = await process_question(user_question)
+# companies.id is a 32-bit integer column
+_MAX_COMPANY_ID = 2 ** 31 - 1
 
-    response_content = {
-        "results": [
-            {
-                "toolCallId": tool_call_id,
-                "result": result_text,
-            }
-        ]
-    }
+def extract_company_id(request: Request, data: dict):
+    """Tenant for the call, from configuration only: ?company_id= on the server URL, or assistant metadata.
 
-    return JSONResponse(content=response_content)
+    Nothing the caller can influence (tool arguments, message text) selects the tenant.
+    """
+    message = data.get("message") or {}
+    metadata = (
+        ((message.get("call") or {}).get("assistant") or {}).get("metadata")
+        or (message.get("assistant") or {}).get("metadata")
+        or {}
+    )
+    if not isinstance(metadata, dict):
+        metadata = {}
+    raw = request.query_params.get("company_id") or metadata.get("company_id")
+    try:
+        company_id = int(raw) if raw is not None else None
+    except (TypeError, ValueError):
+        return None
+    return company_id if company_id is not None and 0 < company_id <= _MAX_COMPANY_ID else None
+
+@router.post("/webhook")
+async def vapi_webhook(request: Request):
+    asked_at = datetime.now(timezone.utc)
+    data = await request.json()
+    company_id = extract_company_id(request, data)
+
+    # Every tool call of the turn runs concurrently; the slowest one sets the latency
+    calls = extract_tool_calls(data)
+    results = await asyncio.gather(
+        *(answer_tool_call(data, call, company_id, asked_at) for call in calls)
+    )
+    return JSONResponse(content={"results": list(results)})
@@ -7,7 +7,7 @@ import jwt
 import bcrypt
 from pydantic import BaseModel, EmailStr
 
-from models import User, Company
+from models import User, Company, UserRole
 from database import get_db
 import os
 
@@ -74,6 +74,15 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         raise credentials_exception
     return user
 
+def get_current_admin(current_user: User = Depends(get_current_user)):
+    """Require an authenticated admin user"""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return current_user
+
 @router.post("/login", response_model=TokenResponse)
 def login(login_data: LoginRequest, db: Session = Depends(get_db)):
     """Authenticate user and return access token"""
@@ -0,0 +1,137 @@
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+import schemas
+from chat import create_message, decode_cursor, encode_cursor, follow, list_messages, message_payload, payload_cursor
+from database import get_db, get_read_db
+from models import Company
+from query_guard import query_budget
+
+router = APIRouter(tags=["chat"])
+
+# Seconds of silence before a stream sends a keep-alive
+HEARTBEAT_SECONDS = 15.0
+
+
+def _check_cursor(cursor: Optional[str]) -> Optional[str]:
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+    return cursor or None
+
+
+@router.get("/messages")
+@query_budget(1)
+def read_messages(
+    conversation_id: str = Query("default", min_length=1, max_length=64),
+    company_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+):
+    """A page of a conversation, oldest first.
+
+    Pass `prevCursor` back as `before` for older messages and `nextCursor`
+    as `after` (or to the stream endpoints) for newer ones.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Pass either before or after, not both")
+    rows, prev_cursor, next_cursor = list_messages(
+        db,
+        conversation_id,
+        company_id=company_id,
+        limit=limit,
+        before=_check_cursor(before),
+        after=_check_cursor(after),
+    )
+    return {
+        "messages": [message_payload(row) for row in rows],
+        "prevCursor": prev_cursor,
+        "nextCursor": next_cursor,
+    }
+
+
+@router.post("/messages", response_model=schemas.ChatMessage, status_code=201)
+def create_chat_message(message: schemas.ChatMessageCreate, db: Session = Depends(get_db)):
+    if message.company_id is not None and db.get(Company, message.company_id) is None:
+        raise HTTPException(status_code=404, detail="Company not found")
+    return create_message(db, message)
+
+
+@router.get("/messages/stream")
+async def stream_messages(
+    conversation_id: str = Query("default", min_length=1, max_length=64),
+    company_id: Optional[int] = None,
+    after: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None),
+):
+    """Server-sent events: messages after `after` (default: from now on), then live ones.
+
+    Each event's id is its cursor, so a reconnecting EventSource resumes
+    where it left off via Last-Event-ID.
+    """
+    cursor = _check_cursor(after or last_event_id)
+
+    async def events():
+        # A comment line first, so proxies and the browser see the stream open
+        yield ": connected\n\n"
+        async for payload in follow(conversation_id, company_id, cursor, heartbeat=HEARTBEAT_SECONDS):
+            if payload is None:
+                yield ": keep-alive\n\n"
+            else:
+                event_id = encode_cursor(*payload_cursor(payload))
+                yield f"id: {event_id}\nevent: message\ndata: {json.dumps(payload)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/messages/ws")
+async def messages_socket(
+    websocket: WebSocket,
+    conversation_id: str = "default",
+    company_id: Optional[int] = None,
+    after: Optional[str] = None,
+):
+    """WebSocket variant of /messages/stream: one JSON frame per message, each with its cursor"""
+    try:
+        cursor = _check_cursor(after)
+    except HTTPException as exc:
+        await websocket.close(code=1008, reason=exc.detail)
+        return
+    await websocket.accept()
+
+    async def push():
+        async for payload in follow(conversation_id, company_id, cursor, heartbeat=HEARTBEAT_SECONDS):
+            if payload is not None:
+                await websocket.send_json({"cursor": encode_cursor(*payload_cursor(payload)), "message": payload})
+
+    async def drain():
+        # Push-only: messages are posted over HTTP; this just notices the close
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    tasks = [asyncio.create_task(push()), asyncio.create_task(drain())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not task.cancelled() and task.exception() and not isinstance(task.exception(), WebSocketDisconnect):
+                raise task.exception()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
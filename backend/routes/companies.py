@@ -1,32 +1,90 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.orm import Session, raiseload
 from typing import List
 
 from models import Company
 from schemas import Company as CompanySchema, CompanyCreate, CompanyUpdate
-from database import get_db
+from database import get_db, get_read_db
+from query_guard import query_budget
+from tenant_cache import catalog_cache
+from vector_sync import DELETE, UPSERT, enqueue as enqueue_vector_sync
+from http_cache import (
+    cache_headers,
+    collection_etag,
+    collection_state,
+    has_conditional_headers,
+    is_not_modified,
+    not_modified,
+    resource_etag,
+)
 
 router = APIRouter(tags=["companies"])
 
+# Responses carry no relationships; without this every company read would
+# also selectin-load its users, products and offerings
+NO_RELATIONSHIPS = raiseload("*")
+
 @router.get("/", response_model=List[CompanySchema])
+@query_budget(2)
 def read_companies(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
-    return db.query(Company).offset(skip).limit(limit).all()
+    # Collections only carry an ETag: a delete does not move max(updated_at),
+    # so If-Modified-Since alone could not detect it.
+    max_updated_at, count = collection_state(db, Company)
+    etag = collection_etag("companies", max_updated_at, count, skip, limit)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    response.headers.update(cache_headers(etag))
+    return db.query(Company).options(NO_RELATIONSHIPS).offset(skip).limit(limit).all()
 
 @router.get("/{company_id}", response_model=CompanySchema)
-def read_company(company_id: int, db: Session = Depends(get_db)):
-    db_company = db.get(Company, company_id)
+@query_budget(2)
+def read_company(
+    company_id: int,
+    request: Request,
+    db: Session = Depends(get_read_db),
+):
+    key = ("company", company_id)
+    entry = catalog_cache.get(key)
+    if entry is not None:
+        return entry.respond(request)
+    token = catalog_cache.begin()
+
+    if has_conditional_headers(request):
+        # Revalidate against (id, updated_at) before loading the full row
+        meta = db.query(Company.id, Company.updated_at).filter(Company.id == company_id).first()
+        if meta is None:
+            raise HTTPException(status_code=404, detail="Company not found")
+        etag = resource_etag("company", meta.id, meta.updated_at)
+        if is_not_modified(request, etag, meta.updated_at):
+            return not_modified(etag, meta.updated_at)
+
+    db_company = db.get(Company, company_id, options=[NO_RELATIONSHIPS])
     if db_company is None:
         raise HTTPException(status_code=404, detail="Company not found")
-    return db_company
+    entry = catalog_cache.put(
+        key,
+        company_id,
+        token,
+        resource_etag("company", db_company.id, db_company.updated_at),
+        db_company.updated_at,
+        CompanySchema.model_validate(db_company).model_dump_json().encode(),
+    )
+    return entry.respond(request)
 
 @router.post("/", response_model=CompanySchema, status_code=201)
 def create_company(company: CompanyCreate, db: Session = Depends(get_db)):
     obj = Company(**company.dict())
     db.add(obj)
+    # The id is needed for the outbox event, which commits with the company
+    db.flush()
+    enqueue_vector_sync(db, obj.id, UPSERT)
     db.commit()
     db.refresh(obj)
     return obj
@@ -40,8 +98,13 @@ def update_company(
     obj = db.get(Company, company_id)
     if obj is None:
         raise HTTPException(status_code=404, detail="Company not found")
-    for field, value in company.dict(exclude_unset=True).items():
+    changes = company.dict(exclude_unset=True)
+    for field, value in changes.items():
         setattr(obj, field, value)
+    catalog_cache.invalidate(db, company_id)
+    # Only the name and details are indexed
+    if changes.keys() & {"name", "details"}:
+        enqueue_vector_sync(db, company_id, UPSERT)
     db.commit()
     db.refresh(obj)
     return obj
@@ -51,5 +114,7 @@ def delete_company(company_id: int, db: Session = Depends(get_db)):
     obj = db.get(Company, company_id)
     if obj is None:
         raise HTTPException(status_code=404, detail="Company not found")
+    catalog_cache.invalidate(db, company_id)
+    enqueue_vector_sync(db, company_id, DELETE)
     db.delete(obj)
     db.commit()
@@ -5,14 +5,15 @@ from typing import Optional
 from datetime import datetime, timedelta
 
 from models import Company, User, Product, Offering
-from database import get_db
+from database import get_read_db
+from query_guard import query_budget
 
 router = APIRouter(tags=["dashboard"])
 
 @router.get("/admin")
 def get_admin_dashboard_stats(
     period: str = Query("30d", regex="^(7d|30d|90d|1y)$"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """Get comprehensive admin dashboard statistics"""
     
@@ -99,10 +100,11 @@ def get_admin_dashboard_stats(
     }
 
 @router.get("/company/{company_id}")
+@query_budget(15)
 def get_company_dashboard_stats(
     company_id: int,
     period: str = Query("30d", regex="^(7d|30d|90d)$"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """Get company-specific dashboard statistics"""
     
@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from lifecycle import readiness
+
+router = APIRouter(tags=["health"])
+
+@router.get("/live")
+def liveness():
+    """The process is up and serving the event loop"""
+    return {"status": "alive"}
+
+@router.get("/ready")
+async def readiness_check():
+    """200 while warmed up and the database answers (checked at most every few seconds), else 503"""
+    ready = await readiness.check()
+    return JSONResponse(readiness.as_dict(), status_code=200 if ready else 503)
@@ -1,14 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.orm import Session, raiseload
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
+from datetime import datetime
 from decimal import Decimal
 
 from models import Product, Offering, OfferingType
-from database import get_db
+from database import get_db, get_read_db
+from query_guard import query_budget
+from tenant_cache import catalog_cache
+from http_cache import (
+    cache_headers,
+    collection_etag,
+    collection_state,
+    has_conditional_headers,
+    is_not_modified,
+    not_modified,
+    resource_etag,
+)
 
 router = APIRouter(tags=["products"])
 
+# Responses carry no relationships; without this every item would also join
+# its company and selectin-load that company's whole catalog
+NO_RELATIONSHIPS = raiseload("*")
+
 # Pydantic schemas
 class ProductBase(BaseModel):
     name: str
@@ -25,8 +41,8 @@ class ProductUpdate(ProductBase):
 class ProductResponse(ProductBase):
     id: int
     company_id: int
-    created_at: str
-    updated_at: str
+    created_at: datetime
+    updated_at: datetime
 
     class Config:
         from_attributes = True
@@ -47,37 +63,82 @@ class OfferingUpdate(OfferingBase):
 class OfferingResponse(OfferingBase):
     id: int
     company_id: int
-    created_at: str
-    updated_at: str
+    created_at: datetime
+    updated_at: datetime
 
     class Config:
         from_attributes = True
 
+ProductList = TypeAdapter(List[ProductResponse])
+OfferingList = TypeAdapter(List[OfferingResponse])
+
 # Product routes
 @router.get("/products", response_model=List[ProductResponse])
+@query_budget(2)
 def get_company_products(
     company_id: int,
+    request: Request,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """Get all products for a specific company"""
-    products = db.query(Product).filter(
+    key = ("products", company_id, skip, limit)
+    entry = catalog_cache.get(key)
+    if entry is not None:
+        return entry.respond(request)
+    token = catalog_cache.begin()
+
+    max_updated_at, count = collection_state(db, Product, Product.company_id == company_id)
+    etag = collection_etag("products", max_updated_at, count, company_id, skip, limit)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    products = db.query(Product).options(NO_RELATIONSHIPS).filter(
         Product.company_id == company_id
     ).offset(skip).limit(limit).all()
-    return products
+    body = ProductList.dump_json(ProductList.validate_python(products, from_attributes=True))
+    return catalog_cache.put(key, company_id, token, etag, None, body).respond(request)
 
 @router.get("/products/{product_id}", response_model=ProductResponse)
-def get_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.get(Product, product_id)
+@query_budget(2)
+def get_product(
+    product_id: int,
+    request: Request,
+    db: Session = Depends(get_read_db),
+):
+    key = ("product", product_id)
+    entry = catalog_cache.get(key)
+    if entry is not None:
+        return entry.respond(request)
+    token = catalog_cache.begin()
+
+    if has_conditional_headers(request):
+        meta = db.query(Product.id, Product.updated_at).filter(Product.id == product_id).first()
+        if meta is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        etag = resource_etag("product", meta.id, meta.updated_at)
+        if is_not_modified(request, etag, meta.updated_at):
+            return not_modified(etag, meta.updated_at)
+
+    product = db.get(Product, product_id, options=[NO_RELATIONSHIPS])
     if product is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    entry = catalog_cache.put(
+        key,
+        product.company_id,
+        token,
+        resource_etag("product", product.id, product.updated_at),
+        product.updated_at,
+        ProductResponse.model_validate(product).model_dump_json().encode(),
+    )
+    return entry.respond(request)
 
 @router.post("/products", response_model=ProductResponse, status_code=201)
 def create_product(product: ProductCreate, db: Session = Depends(get_db)):
     db_product = Product(**product.dict())
     db.add(db_product)
+    catalog_cache.invalidate(db, db_product.company_id)
     db.commit()
     db.refresh(db_product)
     return db_product
@@ -88,51 +149,95 @@ def update_product(
     product: ProductUpdate,
     db: Session = Depends(get_db),
 ):
-    db_product = db.get(Product, product_id)
+    db_product = db.get(Product, product_id, options=[NO_RELATIONSHIPS])
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
     
     for field, value in product.dict(exclude_unset=True).items():
         setattr(db_product, field, value)
     
+    catalog_cache.invalidate(db, db_product.company_id)
     db.commit()
     db.refresh(db_product)
     return db_product
 
 @router.delete("/products/{product_id}", status_code=204)
 def delete_product(product_id: int, db: Session = Depends(get_db)):
-    db_product = db.get(Product, product_id)
+    db_product = db.get(Product, product_id, options=[NO_RELATIONSHIPS])
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    catalog_cache.invalidate(db, db_product.company_id)
     db.delete(db_product)
     db.commit()
 
 # Offering routes
 @router.get("/offerings", response_model=List[OfferingResponse])
+@query_budget(2)
 def get_company_offerings(
     company_id: int,
+    request: Request,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """Get all offerings for a specific company"""
-    offerings = db.query(Offering).filter(
+    key = ("offerings", company_id, skip, limit)
+    entry = catalog_cache.get(key)
+    if entry is not None:
+        return entry.respond(request)
+    token = catalog_cache.begin()
+
+    max_updated_at, count = collection_state(db, Offering, Offering.company_id == company_id)
+    etag = collection_etag("offerings", max_updated_at, count, company_id, skip, limit)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    offerings = db.query(Offering).options(NO_RELATIONSHIPS).filter(
         Offering.company_id == company_id
     ).offset(skip).limit(limit).all()
-    return offerings
+    body = OfferingList.dump_json(OfferingList.validate_python(offerings, from_attributes=True))
+    return catalog_cache.put(key, company_id, token, etag, None, body).respond(request)
 
 @router.get("/offerings/{offering_id}", response_model=OfferingResponse)
-def get_offering(offering_id: int, db: Session = Depends(get_db)):
-    offering = db.get(Offering, offering_id)
+@query_budget(2)
+def get_offering(
+    offering_id: int,
+    request: Request,
+    db: Session = Depends(get_read_db),
+):
+    key = ("offering", offering_id)
+    entry = catalog_cache.get(key)
+    if entry is not None:
+        return entry.respond(request)
+    token = catalog_cache.begin()
+
+    if has_conditional_headers(request):
+        meta = db.query(Offering.id, Offering.updated_at).filter(Offering.id == offering_id).first()
+        if meta is None:
+            raise HTTPException(status_code=404, detail="Offering not found")
+        etag = resource_etag("offering", meta.id, meta.updated_at)
+        if is_not_modified(request, etag, meta.updated_at):
+            return not_modified(etag, meta.updated_at)
+
+    offering = db.get(Offering, offering_id, options=[NO_RELATIONSHIPS])
     if offering is None:
         raise HTTPException(status_code=404, detail="Offering not found")
-    return offering
+    entry = catalog_cache.put(
+        key,
+        offering.company_id,
+        token,
+        resource_etag("offering", offering.id, offering.updated_at),
+        offering.updated_at,
+        OfferingResponse.model_validate(offering).model_dump_json().encode(),
+    )
+    return entry.respond(request)
 
 @router.post("/offerings", response_model=OfferingResponse, status_code=201)
 def create_offering(offering: OfferingCreate, db: Session = Depends(get_db)):
     db_offering = Offering(**offering.dict())
     db.add(db_offering)
+    catalog_cache.invalidate(db, db_offering.company_id)
     db.commit()
     db.refresh(db_offering)
     return db_offering
@@ -143,32 +248,47 @@ def update_offering(
     offering: OfferingUpdate,
     db: Session = Depends(get_db),
 ):
-    db_offering = db.get(Offering, offering_id)
+    db_offering = db.get(Offering, offering_id, options=[NO_RELATIONSHIPS])
     if db_offering is None:
         raise HTTPException(status_code=404, detail="Offering not found")
     
     for field, value in offering.dict(exclude_unset=True).items():
         setattr(db_offering, field, value)
     
+    catalog_cache.invalidate(db, db_offering.company_id)
     db.commit()
     db.refresh(db_offering)
     return db_offering
 
 @router.delete("/offerings/{offering_id}", status_code=204)
 def delete_offering(offering_id: int, db: Session = Depends(get_db)):
-    db_offering = db.get(Offering, offering_id)
+    db_offering = db.get(Offering, offering_id, options=[NO_RELATIONSHIPS])
     if db_offering is None:
         raise HTTPException(status_code=404, detail="Offering not found")
     
+    catalog_cache.invalidate(db, db_offering.company_id)
     db.delete(db_offering)
     db.commit()
 
 # Combined endpoint for all products and offerings
 @router.get("/company/{company_id}/all-items")
-def get_all_company_items(company_id: int, db: Session = Depends(get_db)):
+@query_budget(4)
+def get_all_company_items(
+    company_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
+):
     """Get all products and offerings for a company in a combined format"""
-    products = db.query(Product).filter(Product.company_id == company_id).all()
-    offerings = db.query(Offering).filter(Offering.company_id == company_id).all()
+    products_state = collection_state(db, Product, Product.company_id == company_id)
+    offerings_state = collection_state(db, Offering, Offering.company_id == company_id)
+    etag = collection_etag("all-items", *products_state, *offerings_state, company_id)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers.update(cache_headers(etag))
+
+    products = db.query(Product).options(NO_RELATIONSHIPS).filter(Product.company_id == company_id).all()
+    offerings = db.query(Offering).options(NO_RELATIONSHIPS).filter(Offering.company_id == company_id).all()
     
     # Format products
     formatted_products = []
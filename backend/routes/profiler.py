@@ -0,0 +1,40 @@
+import asyncio
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from models import User
+from profiler import PROFILER_INTERVAL_MS, PROFILER_MAX_SECONDS, ProfilerBusy, sampler
+from routes.auth import get_current_admin
+
+router = APIRouter(tags=["admin"])
+
+@router.get("/profile")
+async def profile_worker(
+    seconds: float = Query(10, gt=0, le=PROFILER_MAX_SECONDS),
+    format: str = Query("collapsed", regex="^(collapsed|speedscope)$"),
+    interval_ms: float = Query(PROFILER_INTERVAL_MS, ge=1, le=1000),
+    include_idle: bool = False,
+    admin: User = Depends(get_current_admin),
+):
+    """Sample the Python stacks of the worker serving this request for `seconds`"""
+    try:
+        sampler.start(interval_ms / 1000, include_idle)
+    except ProfilerBusy as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    try:
+        # Sleeping on the event loop keeps it free, so the handlers being
+        # profiled keep running in this worker meanwhile
+        await asyncio.sleep(seconds)
+    finally:
+        profile = await asyncio.to_thread(sampler.stop)
+
+    headers = {
+        "X-Profile-Pid": str(os.getpid()),
+        "X-Profile-Samples": str(profile.sample_count),
+        "Cache-Control": "no-store",
+    }
+    if format == "speedscope":
+        return JSONResponse(profile.speedscope(name=f"worker {os.getpid()}"), headers=headers)
+    return PlainTextResponse(profile.collapsed(), headers=headers)
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from database import get_db
+from search import SEARCH_KINDS, search_catalog
+
+router = APIRouter(tags=["search"])
+
+@router.get("/search")
+def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    company_id: Optional[int] = None,
+    type: List[str] = Query(list(SEARCH_KINDS)),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Ranked search over company details, products and offerings"""
+    unknown = set(type) - set(SEARCH_KINDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown search type: {', '.join(sorted(unknown))}")
+
+    try:
+        rows, next_cursor = search_catalog(
+            db, q, company_id=company_id, kinds=type, limit=limit, cursor=cursor
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    return {
+        "results": [
+            {
+                "type": row.kind,
+                "id": row.id,
+                "companyId": row.company_id,
+                "name": row.name,
+                "rank": row.rank,
+            }
+            for row in rows
+        ],
+        "nextCursor": next_cursor,
+    }
@@ -36,8 +36,10 @@ class Company(CompanyBase):
         from_attributes = True
 
 class ChatMessageBase(BaseModel):
-    message: str
-    sender: str
+    message: str = Field(..., min_length=1)
+    sender: str = Field(..., min_length=1, max_length=255)
+    conversation_id: str = Field("default", min_length=1, max_length=64)
+    company_id: Optional[int] = None
 
 class ChatMessageCreate(ChatMessageBase):
     pass
@@ -45,6 +47,7 @@ class ChatMessageCreate(ChatMessageBase):
 class ChatMessage(ChatMessageBase):
     id: int
     created_at: datetime
+    meta: Optional[Dict[str, Any]] = None
 
     class Config:
         from_attributes = True
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Bulk-load a production-shaped synthetic dataset for scale testing.
+
+Companies, users, products and offerings are generated deterministically
+from --seed, with heavy-tailed (Pareto) per-tenant sizes so a few tenants
+own most of the catalog, as in production. Rows are streamed in blocks of
+companies and loaded with COPY on Postgres, or multi-row INSERTs elsewhere.
+
+    python scripts/generate_synthetic_data.py --companies 1000000 --products 40 --offerings 15 --users 4
+
+Every user's password is user_password(company_id, n); n=0 always exists,
+e.g. u42.0@t42.example.com / synthetic-2.
+"""
+import argparse
+import csv
+import io
+import math
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+# Add the parent directory to the path to import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bcrypt
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.engine import Connection
+
+PASSWORD_POOL_SIZE = 8
+# Keep well under SQLite's bound-parameter limit for multi-row INSERTs
+MAX_INSERT_PARAMS = 30000
+# Timestamps are spread over the years before this, so --seed alone fixes the dataset
+DEFAULT_NOW = datetime(2025, 7, 1, tzinfo=timezone.utc)
+
+INDUSTRIES = ("Healthcare", "Retail", "Software", "Manufacturing", "Education", "Hospitality", "Logistics", "Finance")
+CITIES = ("Yerevan", "Gyumri", "Vanadzor", "Tbilisi", "Berlin", "Toronto", "Austin", "Lyon")
+STREETS = ("Vardanants", "Abovyan", "Tumanyan", "Main", "Oak", "Market", "Station", "Harbor")
+NOUNS = ("consultation", "therapy", "scan", "repair", "subscription", "kit", "plan", "course", "check-up", "delivery")
+ADJECTIVES = ("premium", "basic", "express", "family", "pro", "standard", "deluxe", "mini", "annual", "extended")
+CURRENCIES = ("AMD", "AMD", "AMD", "USD", "EUR")
+
+
+@dataclass
+class GeneratorConfig:
+    companies: int
+    users: float
+    products: float
+    offerings: float
+    skew: float
+    seed: int
+    bcrypt_rounds: int
+    block_size: int
+    now: datetime = DEFAULT_NOW
+
+
+def user_email(company_id: int, n: int) -> str:
+    return f"u{company_id}.{n}@t{company_id}.example.com"
+
+
+def user_password(company_id: int, n: int) -> str:
+    return f"synthetic-{(company_id + n) % PASSWORD_POOL_SIZE}"
+
+
+def password_hashes(rounds: int):
+    """bcrypt is deliberately slow, so hash the small password pool once"""
+    salt_rng = random.Random("bcrypt-salts")
+    hashes = []
+    for k in range(PASSWORD_POOL_SIZE):
+        # Deterministic salt keeps the whole dataset reproducible from --seed
+        raw = bytes(salt_rng.getrandbits(8) for _ in range(16))
+        salt = f"$2b${rounds:02d}$".encode() + bcrypt_base64(raw)
+        hashes.append(bcrypt.hashpw(f"synthetic-{k}".encode("utf-8"), salt).decode("utf-8"))
+    return hashes
+
+
+def bcrypt_base64(raw: bytes) -> bytes:
+    # bcrypt's own base64 alphabet, 22 characters for a 16 byte salt
+    alphabet = b"./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+    bits = int.from_bytes(raw, "big") << 4  # pad 128 bits to 132 (22 * 6)
+    return bytes(alphabet[(bits >> (6 * (21 - i))) & 0x3F] for i in range(22))
+
+
+def tenant_size(rng: random.Random, mean: float, skew: float) -> int:
+    """Heavy-tailed count with the requested mean (Pareto, shape = skew)"""
+    if mean <= 0:
+        return 0
+    pareto_mean = skew / (skew - 1)
+    value = mean * rng.paretovariate(skew) / pareto_mean
+    return min(int(round(value)), int(math.ceil(mean * 100)))
+
+
+def generate_block(config: GeneratorConfig, first_id: int, count: int, hashes, now: datetime):
+    """Rows for companies first_id .. first_id + count - 1, keyed by table name"""
+    rows = {"companies": [], "users": [], "products": [], "offerings": []}
+    for company_id in range(first_id, first_id + count):
+        # Per-company RNG: any block can be regenerated identically on its own
+        rng = random.Random(f"{config.seed}:{company_id}")
+        created = now - timedelta(days=rng.uniform(0, 3 * 365))
+        city, street = rng.choice(CITIES), rng.choice(STREETS)
+        name = f"{rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS).title()} {company_id}"
+
+        paragraphs = [
+            f"{name} is a {rng.choice(INDUSTRIES).lower()} company based in {city}.",
+            f"Address: {rng.randint(1, 120)} {street} street, {city}.",
+            f"Phone: +374 {rng.randint(10, 99)} {rng.randint(100000, 999999)}",
+            f"Opening hours: {rng.randint(7, 10)}:00-{rng.randint(17, 22)}:00, Monday to {rng.choice(('Friday', 'Saturday', 'Sunday'))}.",
+        ]
+        paragraphs += [
+            f"We offer {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} services for {rng.choice(('families', 'businesses', 'students', 'patients'))}."
+            for _ in range(tenant_size(rng, 8, config.skew))
+        ]
+        rows["companies"].append({
+            "id": company_id, "name": name, "details": "\n".join(paragraphs),
+            "created_at": created, "updated_at": created,
+        })
+
+        for n in range(max(1, tenant_size(rng, config.users, config.skew))):
+            rows["users"].append({
+                "company_id": company_id, "email": user_email(company_id, n),
+                "password_hash": hashes[(company_id + n) % PASSWORD_POOL_SIZE],
+                "role": "user", "created_at": created, "updated_at": created,
+            })
+
+        for n in range(tenant_size(rng, config.products, config.skew)):
+            stamp = created + (now - created) * rng.random()
+            rows["products"].append({
+                "company_id": company_id,
+                "name": f"{rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS)} {n}",
+                "description": f"{rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS)} from {name}.",
+                "price": Decimal(f"{rng.lognormvariate(3.5, 1.2):.2f}"),
+                "stock_qty": rng.choice((0, rng.randint(1, 500))),
+                "created_at": stamp, "updated_at": stamp,
+            })
+
+        for n in range(tenant_size(rng, config.offerings, config.skew)):
+            stamp = created + (now - created) * rng.random()
+            rows["offerings"].append({
+                "company_id": company_id,
+                "name": f"{rng.choice(NOUNS).title()} {rng.choice(ADJECTIVES)} {n}",
+                "type": rng.choice(("service", "service", "product")),
+                "description": f"{rng.choice(NOUNS).title()} offered by {name}.",
+                "price": Decimal(f"{rng.lognormvariate(9, 1.0):.2f}"),
+                "currency": rng.choice(CURRENCIES),
+                "created_at": stamp, "updated_at": stamp,
+            })
+    return rows
+
+
+def copy_rows(conn: Connection, table: str, rows) -> None:
+    """Postgres COPY ... FROM STDIN through the raw psycopg2 cursor"""
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["\\N" if row[c] is None else row[c] for c in columns])
+    buffer.seek(0)
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer
+        )
+    finally:
+        cursor.close()
+
+
+def insert_rows(conn: Connection, table, rows) -> None:
+    """Multi-row INSERT ... VALUES (...), (...) in parameter-bounded chunks.
+
+    The statement text is built directly: compiling a many-row `.values()`
+    construct through SQLAlchemy costs more than executing it.
+    """
+    dialect = conn.dialect
+    placeholder = {"qmark": "?", "format": "%s", "pyformat": "%s"}.get(dialect.paramstyle)
+    if placeholder is None:
+        conn.execute(table.insert(), rows)
+        return
+
+    columns = list(rows[0])
+    processors = [
+        (index, processor)
+        for index, column in enumerate(columns)
+        for processor in [table.c[column].type.bind_processor(dialect)]
+        if processor is not None
+    ]
+    row_sql = "(" + ", ".join([placeholder] * len(columns)) + ")"
+    chunk = max(1, MAX_INSERT_PARAMS // len(columns))
+    for start in range(0, len(rows), chunk):
+        batch = rows[start:start + chunk]
+        params = []
+        for row in batch:
+            values = [row[column] for column in columns]
+            for index, processor in processors:
+                values[index] = processor(values[index])
+            params.extend(values)
+        conn.exec_driver_sql(
+            f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES " + ", ".join([row_sql] * len(batch)),
+            tuple(params),
+        )
+
+
+def generate(engine, config: GeneratorConfig, log=print) -> dict:
+    """Append a synthetic dataset to the database behind `engine`; returns row counts"""
+    from models import Company, Offering, Product, User
+
+    tables = {
+        "companies": Company.__table__,
+        "users": User.__table__,
+        "products": Product.__table__,
+        "offerings": Offering.__table__,
+    }
+    use_copy = engine.dialect.name == "postgresql"
+    hashes = password_hashes(config.bcrypt_rounds)
+    now = config.now
+    totals = dict.fromkeys(tables, 0)
+
+    with engine.connect() as conn:
+        first_id = (conn.execute(select(func.max(Company.id))).scalar() or 0) + 1
+
+    started = time.monotonic()
+    for block_start in range(0, config.companies, config.block_size):
+        count = min(config.block_size, config.companies - block_start)
+        rows = generate_block(config, first_id + block_start, count, hashes, now)
+        with engine.begin() as conn:
+            for name, table in tables.items():
+                if not rows[name]:
+                    continue
+                if use_copy:
+                    copy_rows(conn, name, rows[name])
+                else:
+                    insert_rows(conn, table, rows[name])
+                totals[name] += len(rows[name])
+        elapsed = time.monotonic() - started
+        log(f"  {block_start + count:>10,} companies  "
+            f"{sum(totals.values()) / max(elapsed, 1e-9):>10,.0f} rows/s")
+
+    if use_copy:
+        with engine.begin() as conn:
+            # Explicit ids bypassed the serial sequences; move them past the new rows
+            for name in tables:
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), "
+                    f"(SELECT COALESCE(MAX(id), 1) FROM {name}))"
+                ))
+            conn.execute(text("ANALYZE companies, users, products, offerings"))
+    return totals
+
+
+def _timestamp(value: str) -> datetime:
+    stamp = datetime.fromisoformat(value)
+    return stamp if stamp.tzinfo is not None else stamp.replace(tzinfo=timezone.utc)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--companies", type=int, default=10000)
+    parser.add_argument("--users", type=float, default=4, help="mean users per company")
+    parser.add_argument("--products", type=float, default=40, help="mean products per company")
+    parser.add_argument("--offerings", type=float, default=15, help="mean offerings per company")
+    parser.add_argument("--skew", type=float, default=1.5,
+                        help="Pareto shape of per-tenant sizes (> 1; lower = more skewed)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--block-size", type=int, default=1000, help="companies generated per transaction")
+    parser.add_argument("--now", type=_timestamp, default=DEFAULT_NOW,
+                        help="ISO timestamp generated dates lead up to (default %(default)s)")
+    parser.add_argument("--create-schema", action="store_true", help="run create_all before loading")
+    args = parser.parse_args(argv)
+    if not args.database_url:
+        parser.error("--database-url or DATABASE_URL is required")
+    if args.skew <= 1:
+        parser.error("--skew must be greater than 1")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ.setdefault("DATABASE_URL", args.database_url)
+    engine = create_engine(args.database_url, future=True)
+    if args.create_schema:
+        from models import Base
+        Base.metadata.create_all(engine)
+
+    config = GeneratorConfig(
+        companies=args.companies, users=args.users, products=args.products, offerings=args.offerings,
+        skew=args.skew, seed=args.seed, bcrypt_rounds=args.bcrypt_rounds, block_size=args.block_size,
+        now=args.now,
+    )
+    print(f"🌱 Generating {args.companies:,} companies (seed {args.seed}, skew {args.skew}) ...")
+    started = time.monotonic()
+    totals = generate(engine, config)
+    elapsed = time.monotonic() - started
+    print("✅ Loaded " + ", ".join(f"{count:,} {name}" for name, count in totals.items())
+          + f" in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,308 @@
+#!/usr/bin/env python3
+"""
+Index company details into Qdrant for the assistant webhook.
+
+The webhook searches the `companies` alias, never a collection directly.
+A full reindex (the default) is blue/green, so search keeps working
+throughout:
+  1. embed every company into a new versioned collection, companies_v<UTC timestamp>
+  2. validate it: the point count must match the companies indexed, and at
+     least --min-recall of a random sample must be found in the top
+     --recall-k results when their text is embedded afresh through the
+     provider. The same probes run against the version being served, and
+     the new one may not recall more than --max-regression worse
+  3. repoint the alias at it in a single atomic alias update
+  4. re-apply companies written while it was being built: until the swap the
+     outbox worker (vector_sync.py) kept updating the previous version
+  5. delete older versions, keeping the --keep most recent ones for rollback
+
+A failed validation leaves the alias where it was and drops the new
+collection. The embedding model and dimension come from the same settings
+as the webhook (LLM_PROVIDER, ASSISTANT_EMBEDDING_MODEL/_DIM), and Qdrant
+from QDRANT_LOCATION or QDRANT_HOST/QDRANT_PORT.
+
+    python scripts/sync_companies_to_qdrant.py                   # blue/green rebuild
+    python scripts/sync_companies_to_qdrant.py --upsert          # refresh points in place
+    python scripts/sync_companies_to_qdrant.py --rollback        # alias back to the previous version
+
+Deployments from before aliases have a plain `companies` collection. The
+first rebuild deletes it just before creating the alias, so search misses
+only for the moment in between. Every rebuild after that is gapless.
+"""
+import argparse
 import os
-from database import SessionLocal
-from models import Company  # your SQLAlchemy ORM model for companies
-from qdrant_client import QdrantClient
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+# Add the parent directory to the path to import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from qdrant_client.http import models as rest
-from openai import OpenAI
+from sqlalchemy import select
+
+import vector_store
+from database import SessionLocal
+from llm import EMBEDDING_DIM, get_provider
+from models import Company
+from vector_sync import company_points, company_text, sync_companies
+
+ALIAS = vector_store.COLLECTION_NAME
+VERSION_PREFIX = f"{ALIAS}_v"
+# Indexing threshold restored after the bulk load (Qdrant's default)
+INDEXING_THRESHOLD = 20000
+# Catch-up looks this far back past the build start, for transactions in flight then
+CATCH_UP_MARGIN = timedelta(minutes=1)
+
+
+class ValidationError(Exception):
+    pass
+
+
+def company_batches(batch_size: int) -> Iterator[List[Tuple[int, str, str]]]:
+    """(id, name, details) in id order, batch_size rows at a time"""
+    with SessionLocal(info={"read_only": True}) as db:
+        result = db.execute(
+            select(Company.id, Company.name, Company.details)
+            .order_by(Company.id)
+            .execution_options(yield_per=batch_size)
+        )
+        for rows in result.partitions():
+            yield [(row.id, row.name, row.details or "") for row in rows]
+
+
+def alias_target(client, alias: str = ALIAS) -> Optional[str]:
+    for description in client.get_aliases().aliases:
+        if description.alias_name == alias:
+            return description.collection_name
+    return None
+
+
+def versions(client) -> List[str]:
+    """Versioned collections, oldest first (the timestamps sort lexically)"""
+    return sorted(c.name for c in client.get_collections().collections if c.name.startswith(VERSION_PREFIX))
+
+
+def load(client, collection: str, batch_size: int) -> int:
+    indexed = 0
+    for rows in company_batches(batch_size):
+        client.upsert(collection_name=collection, points=company_points(rows), wait=True)
+        indexed += len(rows)
+        print(f"  {indexed} companies embedded", end="\r", flush=True)
+    print()
+    return indexed
+
+
+def wait_until_indexed(client, collection: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while client.get_collection(collection).status != rest.CollectionStatus.GREEN:
+        if time.monotonic() > deadline:
+            raise ValidationError(f"{collection} still optimizing after {timeout:.0f}s")
+        time.sleep(1)
+
+
+def point_ids(client, collection: str) -> List[int]:
+    ids, offset = [], None
+    while True:
+        records, offset = client.scroll(collection, limit=1000, offset=offset, with_payload=False)
+        ids.extend(record.id for record in records)
+        if offset is None:
+            return ids
+
+
+def serving_collection(client) -> Optional[str]:
+    """The collection search hits now: the alias target, or a pre-alias collection"""
+    target = alias_target(client)
+    if target is None and client.collection_exists(ALIAS):
+        return ALIAS
+    return target
 
-# Initialize OpenAI client with your API key
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-client = QdrantClient(host="localhost", port=6333)
-COLLECTION_NAME = "companies"
+def probes(client, collection: str, sample: int) -> List[Tuple[int, List[float]]]:
+    """(company id, query vector) for a random sample of the collection's points"""
+    # Draw ids from the collection itself: company ids need not be contiguous
+    ids = point_ids(client, collection)
+    chosen = random.sample(ids, min(sample, len(ids)))
+    with SessionLocal(info={"read_only": True}) as db:
+        rows = db.execute(select(Company.id, Company.name, Company.details).where(Company.id.in_(chosen))).all()
+    # Embedded afresh, the way the webhook embeds questions. Searching with the
+    # stored vectors would find every point by construction; this misses when
+    # the model, dimension or point ids are wrong.
+    vectors = get_provider().embed_batch([company_text(row.name, row.details or "") for row in rows])
+    return [(row.id, vector) for row, vector in zip(rows, vectors)]
 
-def embed(text: str):
-    response = openai_client.embeddings.create(
-        model="text-embedding-3-small",
-        input=text
+
+def recall(client, collection: str, queries: Sequence[Tuple[int, List[float]]], recall_k: int) -> float:
+    """Share of the queries whose company is in the top recall_k hits"""
+    if not queries:
+        return 1.0
+    found = sum(
+        company_id in {hit.id for hit in client.search(collection, query_vector=vector, limit=recall_k)}
+        for company_id, vector in queries
     )
-    return response.data[0].embedding
+    return found / len(queries)
+
+
+def validate(
+    client, collection: str, expected: int, sample: int, recall_k: int, min_recall: float, max_regression: float
+) -> float:
+    """Check the point count, sample recall and recall against the live version; returns the recall"""
+    count = client.count(collection_name=collection, exact=True).count
+    if count != expected:
+        raise ValidationError(f"{collection} holds {count} points, expected {expected}")
+    if not expected:
+        return 1.0
+
+    queries = probes(client, collection, sample)
+    new_recall = recall(client, collection, queries, recall_k)
+    if new_recall < min_recall:
+        raise ValidationError(f"sample recall@{recall_k} is {new_recall:.2%}, below {min_recall:.0%}")
 
-def sync_companies():
+    live = serving_collection(client)
+    if live is None:
+        return new_recall
+    live_dim = getattr(client.get_collection(live).config.params.vectors, "size", None)
+    if live_dim != EMBEDDING_DIM:
+        # A deliberate model change: the old vectors cannot answer these queries
+        print(f"Not comparing with {live}: it holds {live_dim}-d vectors, this build {EMBEDDING_DIM}-d")
+        return new_recall
+    live_recall = recall(client, live, queries, recall_k)
+    if new_recall < live_recall - max_regression:
+        raise ValidationError(
+            f"sample recall@{recall_k} is {new_recall:.2%}, against {live_recall:.2%} for the live {live}"
+        )
+    return new_recall
+
+
+def swap_alias(client, collection: str) -> Optional[str]:
+    """Point the alias at `collection` atomically; returns the previous target"""
+    previous = alias_target(client)
+    operations = []
+    if previous is not None:
+        operations.append(rest.DeleteAliasOperation(delete_alias=rest.DeleteAlias(alias_name=ALIAS)))
+    elif client.collection_exists(ALIAS):
+        # Pre-alias deployment: a collection holds the name the alias needs
+        print(f"Replacing the legacy {ALIAS!r} collection with an alias")
+        client.delete_collection(ALIAS)
+    operations.append(
+        rest.CreateAliasOperation(create_alias=rest.CreateAlias(collection_name=collection, alias_name=ALIAS))
+    )
+    client.update_collection_aliases(change_aliases_operations=operations)
+    return previous
+
+
+def catch_up(client, collection: str, since: datetime) -> Tuple[int, int]:
+    """Apply company writes made since `since` to `collection`; returns (upserted, deleted)"""
+    # The primary: a lagging replica could miss the very writes being caught up
     with SessionLocal() as db:
-        companies = db.query(Company).all()
-        points = []
-        for company in companies:
-            vector = embed(company.details)
-            points.append(
-                rest.PointStruct(
-                    id=company.id,
-                    vector=vector,
-                    payload={
-                        "name": company.name,
-                        "details": company.details
-                    }
-                )
-            )
-
-        if points:
-            # (Re)create collection — careful, this deletes existing data!
-            client.recreate_collection(
-                collection_name=COLLECTION_NAME,
-                vectors_config=rest.VectorParams(size=1536, distance=rest.Distance.COSINE)
-            )
-            client.upsert(collection_name=COLLECTION_NAME, points=points)
-            print(f"Synced {len(points)} companies to Qdrant.")
+        changed = db.scalars(select(Company.id).where(Company.updated_at >= since - CATCH_UP_MARGIN)).all()
+        existing = set(db.scalars(select(Company.id)).all())
+        removed = [cid for cid in point_ids(client, collection) if cid not in existing]
+        if not changed and not removed:
+            return 0, 0
+        return sync_companies(db, [*changed, *removed], collection=collection)
+
+
+def collect_garbage(client, keep: int) -> List[str]:
+    """Delete all but the newest `keep` versions besides the live one"""
+    live = alias_target(client)
+    older = [name for name in versions(client) if name != live]
+    doomed = older[: max(0, len(older) - keep)]
+    for name in doomed:
+        client.delete_collection(name)
+    return doomed
+
+
+def rebuild(client, args) -> None:
+    build_started = datetime.now(timezone.utc)
+    collection = f"{VERSION_PREFIX}{build_started:%Y%m%d%H%M%S}"
+    started = time.perf_counter()
+    print(f"Building {collection} (currently serving: {alias_target(client) or 'nothing'})")
+    client.create_collection(
+        collection_name=collection,
+        vectors_config=rest.VectorParams(size=EMBEDDING_DIM, distance=rest.Distance.COSINE),
+        # No HNSW building while points stream in; done once at the end
+        optimizers_config=rest.OptimizersConfigDiff(indexing_threshold=0),
+    )
+    try:
+        indexed = load(client, collection, args.batch_size)
+        client.update_collection(
+            collection_name=collection,
+            optimizer_config=rest.OptimizersConfigDiff(indexing_threshold=INDEXING_THRESHOLD),
+        )
+        wait_until_indexed(client, collection, args.index_timeout)
+        sample_recall = validate(
+            client, collection, indexed, args.sample, args.recall_k, args.min_recall, args.max_regression
+        )
+    except Exception:
+        if not args.keep_failed:
+            client.delete_collection(collection)
+        raise
+    print(f"Validated {collection}: {indexed} points, sample recall@{args.recall_k} {sample_recall:.2%}")
+
+    previous = swap_alias(client, collection)
+    print(f"Alias {ALIAS!r} -> {collection} (was {previous or 'unset'})")
+    upserted, deleted = catch_up(client, collection, build_started)
+    if upserted or deleted:
+        print(f"Caught up with writes during the build: {upserted} upserted, {deleted} deleted")
+    removed = collect_garbage(client, args.keep)
+    if removed:
+        print(f"Deleted old versions: {', '.join(removed)}")
+    print(f"Reindexed {indexed} companies in {time.perf_counter() - started:.1f}s")
+
+
+def upsert_in_place(client, args) -> None:
+    """Refresh every point in whatever the alias serves, without a rebuild"""
+    if alias_target(client) is None and not client.collection_exists(ALIAS):
+        sys.exit(f"Nothing to update: no {ALIAS!r} alias yet; run a full reindex first")
+    indexed = load(client, ALIAS, args.batch_size)
+    print(f"Upserted {indexed} companies into {ALIAS!r}")
+
+
+def rollback(client) -> None:
+    live = alias_target(client)
+    older = [name for name in versions(client) if name < (live or "")]
+    if not older:
+        sys.exit("No previous version to roll back to")
+    swap_alias(client, older[-1])
+    print(f"Alias {ALIAS!r} -> {older[-1]} (was {live})")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--upsert", action="store_true", help="update points in the live collection instead of rebuilding")
+    mode.add_argument("--rollback", action="store_true", help="point the alias back at the previous version")
+    parser.add_argument("--batch-size", type=int, default=100, help="companies embedded per request")
+    parser.add_argument("--keep", type=int, default=1, help="previous versions kept for rollback")
+    parser.add_argument("--sample", type=int, default=100, help="companies probed for the recall check")
+    parser.add_argument("--recall-k", type=int, default=5)
+    parser.add_argument("--min-recall", type=float, default=0.95)
+    parser.add_argument(
+        "--max-regression", type=float, default=0.02, help="recall the new version may lose against the live one"
+    )
+    parser.add_argument("--index-timeout", type=float, default=600, help="seconds to wait for HNSW indexing")
+    parser.add_argument("--keep-failed", action="store_true", help="keep a collection that fails validation")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    client = vector_store.get_client()
+    try:
+        if args.rollback:
+            rollback(client)
+        elif args.upsert:
+            upsert_in_place(client, args)
         else:
-            print("No companies found to sync.")
+            rebuild(client, args)
+    except ValidationError as exc:
+        sys.exit(f"Validation failed, alias unchanged: {exc}")
+    finally:
+        vector_store.close_client()
+
 
 if __name__ == "__main__":
-    sync_companies()
+    main()
@@ -0,0 +1,128 @@
+# search.py
+"""Ranked full-text + trigram search over companies, products and offerings.
+
+Backed by the generated `search_vector` columns (GIN) and the `pg_trgm`
+indexes on `name`, see models.SEARCH_TEXT_COLUMNS. Postgres only.
+"""
+import base64
+import json
+import re
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import Float, and_, bindparam, cast, func, literal, literal_column, or_, select, union_all
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from models import Company, Offering, Product
+
+SEARCH_CONFIG = "simple"
+SEARCH_KINDS = ("company", "product", "offering")
+
+_SOURCES = {
+    "company":  Company,
+    "product":  Product,
+    "offering": Offering,
+}
+
+# Letters and digits in any script (the seed data is largely Armenian)
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def search_tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def mentions(text_tokens: List[str], name: str) -> bool:
+    """Whether `name` appears as a run of whole words in the tokenized text"""
+    name_tokens = search_tokens(name)
+    width = len(name_tokens)
+    return width > 0 and any(
+        text_tokens[i:i + width] == name_tokens for i in range(len(text_tokens) - width + 1)
+    )
+
+
+def prefix_tsquery(text: str, match_any: bool = False) -> Optional[str]:
+    """Turn free text into a prefix tsquery string, e.g. "knee:* & mri:*".
+
+    With `match_any` the terms are OR-ed instead, which suits whole spoken
+    questions where most words are not in the catalog; single letters are
+    dropped there since they would match nearly every row.
+    """
+    tokens = search_tokens(text)
+    if match_any:
+        tokens = [token for token in tokens if len(token) > 1]
+    if not tokens:
+        return None
+    return (" | " if match_any else " & ").join(f"{token}:*" for token in tokens)
+
+
+def encode_cursor(row: Row) -> str:
+    raw = json.dumps([row.rank, row.kind, row.id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str, int]:
+    """Decode a keyset cursor; raises ValueError if it is malformed"""
+    try:
+        rank, kind, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(rank), str(kind), int(row_id)
+    except Exception as exc:
+        raise ValueError("Invalid search cursor") from exc
+
+
+def _ranked_select(kind: str, company_id: Optional[int]):
+    table = _SOURCES[kind].__table__
+    vector = literal_column(f"{table.name}.search_vector")
+    query = func.to_tsquery(SEARCH_CONFIG, bindparam("tsq"))
+    text = bindparam("q")
+    owner = table.c.id if kind == "company" else table.c.company_id
+
+    # Full-text relevance plus trigram word similarity, so typos and partial
+    # words still rank. Cast to double so the keyset cursor round-trips exactly.
+    rank = cast(func.ts_rank_cd(vector, query) + func.word_similarity(text, table.c.name), Float)
+
+    stmt = select(
+        literal(kind).label("kind"),
+        table.c.id.label("id"),
+        owner.label("company_id"),
+        table.c.name.label("name"),
+        rank.label("rank"),
+    ).where(or_(vector.op("@@")(query), text.op("<%")(table.c.name)))
+    if company_id is not None:
+        stmt = stmt.where(owner == company_id)
+    return stmt
+
+
+def search_catalog(
+    db: Session,
+    text: str,
+    *,
+    company_id: Optional[int] = None,
+    kinds: Sequence[str] = SEARCH_KINDS,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    match_any: bool = False,
+) -> Tuple[List[Row], Optional[str]]:
+    """Return one page of ranked hits and the cursor for the next page"""
+    tsq = prefix_tsquery(text, match_any=match_any)
+    if tsq is None or not kinds:
+        return [], None
+
+    hits = union_all(*(_ranked_select(kind, company_id) for kind in kinds)).subquery("hits")
+    stmt = select(hits)
+    if cursor:
+        rank, kind, row_id = decode_cursor(cursor)
+        stmt = stmt.where(
+            or_(
+                hits.c.rank < rank,
+                and_(
+                    hits.c.rank == rank,
+                    or_(hits.c.kind > kind, and_(hits.c.kind == kind, hits.c.id > row_id)),
+                ),
+            )
+        )
+    stmt = stmt.order_by(hits.c.rank.desc(), hits.c.kind, hits.c.id).limit(limit + 1)
+
+    rows = db.execute(stmt, {"q": text, "tsq": tsq}).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
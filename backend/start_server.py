@@ -1,17 +1,121 @@
 #!/usr/bin/env python3
-import uvicorn
-import sys
+"""Run the API with uvicorn.
+
+  python start_server.py          development: one process with auto-reload
+  python start_server.py --prod   production: N workers, uvloop/httptools,
+                                  no reloader (or SERVER_MODE=production)
+
+Production settings come from the environment (flags override them):
+  WEB_CONCURRENCY          worker processes (default: CPU count)
+  DB_CONNECTION_BUDGET     Postgres connections this host may hold in total.
+                           Each worker's share, less its LISTEN connection,
+                           becomes its pool. The chat log and vector sync
+                           threads draw on that pool, so it must hold at least
+                           one more connection than them. If the share is too
+                           small, fewer workers are started.
+  KEEPALIVE_TIMEOUT        seconds an idle keep-alive connection is kept (75,
+                           above the usual 60s load-balancer idle timeout)
+  BACKLOG                  listen() backlog (2048)
+  GRACEFUL_SHUTDOWN_TIMEOUT seconds to drain in-flight requests on SIGTERM (30)
+"""
+import argparse
+import importlib.util
 import os
+import sys
+from typing import Tuple
+
+import uvicorn
+
+
+def _has(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def worker_extras() -> Tuple[int, int]:
+    """Per-worker connections besides request handlers: (outside the pool, background threads in it)"""
+    # pg_notify's LISTEN connection is opened directly, not from the pool
+    outside = 1
+    background = (os.getenv("CHAT_LOG_ENABLED", "1") != "0") + (os.getenv("VECTOR_SYNC_ENABLED", "1") != "0")
+    return outside, background
+
+
+def max_workers(total_connections: int, outside: int, background: int) -> int:
+    """Most workers the budget fits, each with a pool one connection larger than its background threads"""
+    return total_connections // (outside + background + 1)
+
+
+def pool_budget(total_connections: int, workers: int, outside: int = 1, background: int = 2) -> dict:
+    """Per-worker DB_POOL_SIZE / DB_MAX_OVERFLOW so all workers stay within the budget"""
+    pool = total_connections // workers - outside
+    if pool < background + 1:
+        raise ValueError(
+            f"DB_CONNECTION_BUDGET {total_connections} is too small for {workers} workers: each needs "
+            f"{outside + background + 1} connections (LISTEN, {background} background, 1 for requests)"
+        )
+    # Keep a quarter of each worker's pool as burst overflow
+    overflow = pool // 4
+    return {"DB_POOL_SIZE": str(pool - overflow), "DB_MAX_OVERFLOW": str(overflow)}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prod", action="store_true", default=os.getenv("SERVER_MODE") == "production")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1)
+    parser.add_argument("--db-connection-budget", type=int, default=int(os.getenv("DB_CONNECTION_BUDGET", "0")))
+    parser.add_argument("--keepalive", type=int, default=int(os.getenv("KEEPALIVE_TIMEOUT", "75")))
+    parser.add_argument("--backlog", type=int, default=int(os.getenv("BACKLOG", "2048")))
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "30")))
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
+    args = parse_args()
+
     # Change to backend directory
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
-    
-    # Start uvicorn server
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
-    )
+
+    if not args.prod:
+        # Start uvicorn server
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            reload=True,
+            log_level=args.log_level,
+        )
+    else:
+        if args.db_connection_budget:
+            outside, background = worker_extras()
+            fit = max_workers(args.db_connection_budget, outside, background)
+            if fit < 1:
+                sys.exit(
+                    f"DB_CONNECTION_BUDGET {args.db_connection_budget} cannot fit one worker "
+                    f"({outside + background + 1} connections each)"
+                )
+            if args.workers > fit:
+                print(f"Only {fit} workers fit DB_CONNECTION_BUDGET {args.db_connection_budget}; starting {fit}")
+                args.workers = fit
+            # Workers are spawned processes and inherit this environment
+            os.environ.update(pool_budget(args.db_connection_budget, args.workers, outside, background))
+        print(
+            f"Starting {args.workers} workers on {args.host}:{args.port} "
+            f"(pool {os.getenv('DB_POOL_SIZE', '5')}+{os.getenv('DB_MAX_OVERFLOW', '10')} per worker)"
+        )
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            loop="uvloop" if _has("uvloop") else "auto",
+            http="httptools" if _has("httptools") else "auto",
+            timeout_keep_alive=args.keepalive,
+            backlog=args.backlog,
+            timeout_graceful_shutdown=args.graceful_timeout,
+            proxy_headers=True,
+            forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+            access_log=os.getenv("ACCESS_LOG", "0") == "1",
+            log_level=args.log_level,
+        )
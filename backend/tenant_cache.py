@@ -0,0 +1,179 @@
+# tenant_cache.py
+"""Tenant-aware in-process read-through cache for company and catalog reads.
+
+Entries are the serialised JSON responses (plus their ETag / Last-Modified),
+held in an LRU bounded by bytes. Each entry records the version of its
+tenant (company) when it was stored; bumping the tenant's version makes all
+of its entries stale at once.
+
+Write routes call `catalog_cache.invalidate(db, company_id)` before
+committing. The local bump happens after the commit (so a concurrent read
+cannot refill the cache from the old rows), and on Postgres a NOTIFY in the
+same transaction tells every other worker to bump too.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Hashable, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database import DATABASE_REPLICA_URLS, REPLICA_STICKY_SECONDS
+from http_cache import cache_headers, is_not_modified, not_modified
+from observability import registry
+from pg_notify import listener, notify
+
+CATALOG_CACHE_MAX_BYTES = int(os.getenv("CATALOG_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "300"))
+CATALOG_CACHE_CHANNEL = "catalog_cache"
+# Rough per-entry bookkeeping cost on top of the body
+_ENTRY_OVERHEAD = 256
+
+CACHE_REQUESTS = registry.counter("catalog_cache_requests_total", "Catalog cache lookups", ("result",))
+CACHE_EVICTIONS = registry.counter("catalog_cache_evictions_total", "Entries evicted to stay within the byte budget")
+CACHE_BYTES = registry.gauge("catalog_cache_bytes", "Bytes held by the catalog cache")
+
+
+@dataclass
+class CachedResponse:
+    tenant: int
+    version: int
+    stored_at: float
+    etag: str
+    last_modified: Optional[datetime]
+    body: bytes
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + _ENTRY_OVERHEAD
+
+    def respond(self, request: Request) -> Response:
+        if is_not_modified(request, self.etag, self.last_modified):
+            return not_modified(self.etag, self.last_modified)
+        return Response(self.body, media_type="application/json", headers=cache_headers(self.etag, self.last_modified))
+
+
+class TenantCache:
+    def __init__(self, max_bytes: int = CATALOG_CACHE_MAX_BYTES, ttl: float = CATALOG_CACHE_TTL, settle_seconds: float = 0.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # With replicas, a read right after an invalidation may still see the old rows
+        self.settle_seconds = settle_seconds
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self._sequence = 0
+        # Version of tenants not bumped since the last clear()
+        self._floor = 0
+        self._versions: dict = {}
+        self._bumped_at: dict = {}
+        self._lock = threading.Lock()
+
+    # ── Versions ──
+    def begin(self) -> int:
+        """Token to take before loading from the database, passed back to put()"""
+        return self._sequence
+
+    def version(self, tenant: int) -> int:
+        return self._versions.get(tenant, self._floor)
+
+    def bump(self, tenant: int) -> None:
+        with self._lock:
+            self._sequence += 1
+            self._versions[tenant] = self._sequence
+            self._bumped_at[tenant] = time.monotonic()
+
+    def clear(self) -> None:
+        """Drop everything (e.g. after missing notifications)"""
+        with self._lock:
+            self._sequence += 1
+            self._entries.clear()
+            self._versions.clear()
+            self._bytes = 0
+            self._floor = self._sequence
+        CACHE_BYTES.set(0)
+
+    # ── Entries ──
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (
+                entry.version != self.version(entry.tenant) or time.monotonic() - entry.stored_at > self.ttl
+            ):
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        CACHE_REQUESTS.inc(result="hit" if entry is not None else "miss")
+        return entry
+
+    def put(
+        self,
+        key: Hashable,
+        tenant: int,
+        token: int,
+        etag: str,
+        last_modified: Optional[datetime],
+        body: bytes,
+    ) -> CachedResponse:
+        """Store a response loaded after `begin()` returned `token`; returns the entry"""
+        now = time.monotonic()
+        entry = CachedResponse(tenant, token, now, etag, last_modified, body)
+        if entry.size > self.max_bytes // 4:
+            return entry
+        with self._lock:
+            # The tenant changed while we were loading: the data may predate the write
+            if self.version(tenant) > token:
+                return entry
+            if now - self._bumped_at.get(tenant, float("-inf")) < self.settle_seconds:
+                return entry
+            entry.version = self.version(tenant)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                CACHE_EVICTIONS.inc()
+            CACHE_BYTES.set(self._bytes)
+        return entry
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    # ── Invalidation ──
+    def invalidate(self, db: Session, *tenants: int) -> None:
+        """Mark tenants changed once `db` commits, here and in every other worker"""
+        pending = db.info.setdefault("catalog_cache_invalidations", set())
+        for tenant in tenants:
+            if tenant is not None and tenant not in pending:
+                pending.add(tenant)
+                notify(db, CATALOG_CACHE_CHANNEL, str(tenant))
+
+    def on_notify(self, payload: str) -> None:
+        try:
+            self.bump(int(payload))
+        except ValueError:
+            self.clear()
+
+
+catalog_cache = TenantCache(settle_seconds=REPLICA_STICKY_SECONDS if DATABASE_REPLICA_URLS else 0.0)
+
+listener.subscribe(CATALOG_CACHE_CHANNEL, catalog_cache.on_notify)
+listener.on_reconnect(catalog_cache.clear)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_invalidations(session):
+    for tenant in session.info.pop("catalog_cache_invalidations", ()):
+        catalog_cache.bump(tenant)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session):
+    session.info.pop("catalog_cache_invalidations", None)
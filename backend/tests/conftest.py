@@ -0,0 +1,30 @@
+# conftest.py
+"""Shared test setup: backend modules on sys.path and a throwaway SQLite database.
+
+The environment is set before any backend module is imported, since they
+read their settings at import time.
+"""
+import os
+import sys
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+_db_dir = tempfile.mkdtemp(prefix="devhacks-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
+os.environ.setdefault("LLM_PROVIDER", "local")
+os.environ.setdefault("QDRANT_LOCATION", ":memory:")
+os.environ.setdefault("VECTOR_SYNC_ENABLED", "0")
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def engine():
+    from database import get_engine
+    from models import Base
+
+    engine = get_engine()
+    Base.metadata.create_all(engine)
+    return engine
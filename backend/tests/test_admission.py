@@ -0,0 +1,189 @@
+import asyncio
+
+import httpx
+import pytest
+from starlette.middleware.cors import CORSMiddleware
+
+from admission import (
+    DEFAULT_CLASS,
+    QUEUE_FULL,
+    QUEUE_TIMEOUT,
+    SHED,
+    AdmissionMiddleware,
+    Rejected,
+    RouteClass,
+    classify,
+)
+
+
+def route_class(name: str = DEFAULT_CLASS, priority: int = 1, concurrency: int = 1, max_queue: int = 1,
+                queue_timeout: float = 5.0) -> RouteClass:
+    return RouteClass(name, priority, concurrency, max_queue, queue_timeout)
+
+
+async def until(predicate):
+    while not predicate():
+        await asyncio.sleep(0.001)
+
+
+def test_classify():
+    assert classify("/api/webhook/vapi") == "webhook"
+    assert classify("/api/auth/login") == "auth"
+    assert classify("/api/companies/") == DEFAULT_CLASS
+    assert classify("/health/ready") is None
+    assert classify("/api/messages/stream") is None
+    # Preflights are answered by CORSMiddleware and never queue
+    assert classify("/api/webhook/vapi", "OPTIONS") is None
+
+
+def test_queue_full_is_rejected_with_429():
+    limited = route_class(concurrency=1, max_queue=0)
+
+    async def main():
+        await limited.acquire()
+        with pytest.raises(Rejected) as excinfo:
+            await limited.acquire()
+        return excinfo.value
+
+    rejected = asyncio.run(main())
+    assert rejected.reason == QUEUE_FULL
+    assert rejected.status_code == 429
+    assert limited.active == 1
+
+
+def test_queue_timeout_is_rejected_with_503():
+    limited = route_class(concurrency=1, max_queue=1, queue_timeout=0.05)
+
+    async def main():
+        await limited.acquire()
+        with pytest.raises(Rejected) as excinfo:
+            await limited.acquire()
+        return excinfo.value
+
+    rejected = asyncio.run(main())
+    assert rejected.reason == QUEUE_TIMEOUT
+    assert rejected.status_code == 503
+    assert limited.queued == 0
+    assert limited.active == 1
+
+
+def test_release_hands_the_slot_to_the_oldest_waiter():
+    limited = route_class(concurrency=1, max_queue=2)
+
+    async def main():
+        await limited.acquire()
+        admitted = []
+
+        async def wait(label):
+            await limited.acquire()
+            admitted.append(label)
+
+        waiters = [asyncio.ensure_future(wait(label)) for label in ("first", "second")]
+        await asyncio.sleep(0)
+        assert limited.queued == 2
+
+        limited.release()
+        await until(lambda: admitted)
+        assert admitted == ["first"]
+        assert limited.active == 1
+
+        limited.release()
+        await until(lambda: len(admitted) == 2)
+        assert admitted == ["first", "second"]
+
+        limited.release()
+        await asyncio.gather(*waiters)
+
+    asyncio.run(main())
+    assert limited.active == 0
+    assert limited.queued == 0
+
+
+def test_release_skips_waiters_that_gave_up():
+    limited = route_class(concurrency=1, max_queue=1)
+
+    async def main():
+        await limited.acquire()
+        waiter = asyncio.ensure_future(limited.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limited.release()
+
+    asyncio.run(main())
+    assert limited.active == 0
+
+
+class Gated:
+    """ASGI app whose requests block until the gate opens"""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.started = 0
+
+    async def __call__(self, scope, receive, send):
+        self.started += 1
+        await self.gate.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+def run_with(classes, scenario, cors: bool = False):
+    async def main():
+        app = Gated()
+        asgi = AdmissionMiddleware(app, classes)
+        if cors:
+            asgi = CORSMiddleware(asgi, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+        transport = httpx.ASGITransport(app=asgi)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await scenario(client, app)
+
+    return asyncio.run(main())
+
+
+def test_full_queue_response_carries_retry_after_and_cors_headers():
+    classes = {DEFAULT_CLASS: route_class(concurrency=1, max_queue=0, queue_timeout=3.0)}
+
+    async def scenario(client, app):
+        running = asyncio.ensure_future(client.get("/api/companies/"))
+        await until(lambda: app.started)
+        rejected = await client.get("/api/companies/", headers={"Origin": "http://dashboard"})
+        # A preflight is not queued behind the busy slot
+        preflight = await client.options(
+            "/api/companies/",
+            headers={"Origin": "http://dashboard", "Access-Control-Request-Method": "GET"},
+        )
+        app.gate.set()
+        return rejected, preflight, await running
+
+    rejected, preflight, running = run_with(classes, scenario, cors=True)
+    assert rejected.status_code == 429
+    assert rejected.json()["reason"] == QUEUE_FULL
+    assert rejected.headers["retry-after"] == "3"
+    assert rejected.headers["access-control-allow-origin"] == "*"
+    assert preflight.status_code == 200
+    assert running.status_code == 200
+
+
+def test_less_urgent_classes_are_shed_while_urgent_ones_queue():
+    classes = {
+        "webhook": route_class("webhook", priority=0, concurrency=1, max_queue=1),
+        DEFAULT_CLASS: route_class(DEFAULT_CLASS, priority=1, concurrency=4, max_queue=4),
+    }
+
+    async def scenario(client, app):
+        running = asyncio.ensure_future(client.post("/api/webhook/vapi"))
+        await until(lambda: app.started)
+        queued = asyncio.ensure_future(client.post("/api/webhook/vapi"))
+        await until(lambda: classes["webhook"].queued)
+        shed = await client.get("/api/companies/")
+        app.gate.set()
+        return shed, await running, await queued
+
+    shed, running, queued = run_with(classes, scenario)
+    assert shed.status_code == 503
+    assert shed.json()["reason"] == SHED
+    assert running.status_code == 200
+    assert queued.status_code == 200
+    assert classes["webhook"].active == 0
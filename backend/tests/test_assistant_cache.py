@@ -0,0 +1,36 @@
+import pytest
+
+from assistant_cache import AnswerCache
+from tenant_cache import catalog_cache
+
+
+@pytest.fixture
+def answers():
+    catalog_cache.clear()
+    return AnswerCache()
+
+
+def test_a_write_only_invalidates_its_tenants_answers(answers):
+    generation = answers.begin()
+    answers.put(1, "Opening hours?", "9 to 5", generation)
+    answers.put(2, "Opening hours?", "10 to 6", generation)
+
+    catalog_cache.bump(2)
+    assert answers.get(1, "opening  hours?") == "9 to 5"
+    assert answers.get(2, "Opening hours?") is None
+    assert answers.get_stale(2, "Opening hours?") == "10 to 6"
+
+
+def test_untenanted_answers_go_stale_on_any_write(answers):
+    answers.put(None, "Opening hours?", "9 to 5", answers.begin())
+    catalog_cache.bump(7)
+    assert answers.get(None, "Opening hours?") is None
+
+
+def test_answer_computed_across_its_tenants_write_is_not_stored(answers):
+    generation = answers.begin()
+    catalog_cache.bump(3)
+    answers.put(1, "Opening hours?", "9 to 5", generation)
+    answers.put(3, "Opening hours?", "10 to 6", generation)
+    assert answers.get(1, "Opening hours?") == "9 to 5"
+    assert answers.get(3, "Opening hours?") is None
@@ -0,0 +1,53 @@
+"""Templated price answers: the currency comes from the tenant, never a default."""
+from decimal import Decimal
+
+import pytest
+
+from catalog_facts import answer_catalog_question, format_price
+from database import SessionLocal
+from models import Company, Offering, OfferingType, Product
+
+AMD_TENANT = 401
+NO_CURRENCY_TENANT = 402
+MIXED_TENANT = 403
+
+
+@pytest.fixture(scope="module")
+def catalog(engine):
+    with SessionLocal() as db:
+        for company_id, currencies in ((AMD_TENANT, ["AMD"]), (NO_CURRENCY_TENANT, []), (MIXED_TENANT, ["AMD", "EUR"])):
+            db.add(Company(id=company_id, name=f"Company {company_id}"))
+            db.flush()
+            db.add(Product(company_id=company_id, name="Knee brace", price=Decimal("15000"), stock_qty=3))
+            db.add_all(
+                Offering(company_id=company_id, name=f"Consultation {n}", type=OfferingType.service, price=5000,
+                         currency=currency)
+                for n, currency in enumerate(currencies)
+            )
+        db.commit()
+
+
+def ask(question, company_id):
+    with SessionLocal() as db:
+        return answer_catalog_question(db, question, company_id)
+
+
+def test_product_is_priced_in_the_tenants_currency(catalog):
+    assert ask("How much is the knee brace?", AMD_TENANT) == "Knee brace costs 15,000 AMD."
+
+
+def test_product_without_a_known_currency_gets_none(catalog):
+    assert ask("How much is the knee brace?", NO_CURRENCY_TENANT) == "Knee brace costs 15,000."
+
+
+def test_tenant_with_several_currencies_gets_none(catalog):
+    assert ask("How much is the knee brace?", MIXED_TENANT) == "Knee brace costs 15,000."
+
+
+def test_offering_keeps_its_own_currency(catalog):
+    assert ask("What does Consultation 1 cost?", MIXED_TENANT) == "Consultation 1 costs 5,000 EUR."
+
+
+def test_format_price():
+    assert format_price(Decimal("12.50"), "USD") == "12.5 USD"
+    assert format_price(Decimal("15000.00"), None) == "15,000"
@@ -0,0 +1,41 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import schemas
+from chat import broadcaster, create_message, follow
+from database import SessionLocal
+from models import ChatMessage
+
+
+def test_resync_delivers_rows_committed_behind_the_cursor(engine):
+    conversation = "late-commit"
+
+    async def main():
+        stream = follow(conversation, heartbeat=0.05)
+        received = []
+
+        async def next_message():
+            while True:
+                payload = await stream.__anext__()
+                if payload is not None:
+                    return payload
+
+        first = asyncio.ensure_future(next_message())
+        await asyncio.sleep(0.05)
+        with SessionLocal() as db:
+            create_message(db, schemas.ChatMessageCreate(conversation_id=conversation, message="live", sender="caller"))
+        received.append(await first)
+
+        # Stamped before the live row but committed after it, and its event was lost
+        with SessionLocal() as db:
+            db.add(ChatMessage(
+                conversation_id=conversation, message="late", sender="assistant",
+                created_at=datetime.now(timezone.utc) - timedelta(seconds=1),
+            ))
+            db.commit()
+        broadcaster.resync_all()
+        received.append(await asyncio.wait_for(next_message(), 5))
+        await stream.aclose()
+        return [payload["message"] for payload in received]
+
+    assert asyncio.run(main()) == ["live", "late"]
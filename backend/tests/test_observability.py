@@ -0,0 +1,11 @@
+from types import SimpleNamespace
+
+import observability
+
+
+def test_statement_without_a_start_time_is_ignored():
+    # The listener was attached while this statement was executing
+    conn = SimpleNamespace(info={})
+    observability._after_cursor_execute(conn, None, "SELECT 1", (), None, False)
+    conn.info["query_started"] = []
+    observability._after_cursor_execute(conn, None, "SELECT 1", (), None, False)
@@ -0,0 +1,96 @@
+"""Per-request statement counts of the catalog read endpoints.
+
+Budgets are what the endpoints should cost, not what they happen to cost:
+a relationship load sneaking back into one of these paths fails here.
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from database import SessionLocal
+from models import Company, Offering, OfferingType, Product, User
+from query_guard import assert_max_queries, capture_queries
+from routes.companies import router as companies_router
+from routes.products import router as products_router
+from tenant_cache import catalog_cache
+
+
+@pytest.fixture(scope="module")
+def client(engine):
+    app = FastAPI()
+    app.include_router(companies_router, prefix="/api/companies")
+    app.include_router(products_router, prefix="/api")
+    with SessionLocal() as db:
+        for company_id in (101, 102):
+            db.add(Company(id=company_id, name=f"Company {company_id}", details="Details"))
+            db.flush()
+            db.add_all(
+                [User(company_id=company_id, email=f"u{company_id}.{n}@example.com", password_hash="x") for n in range(3)]
+                + [Product(company_id=company_id, name=f"Product {n}", price=n) for n in range(5)]
+                + [
+                    Offering(company_id=company_id, name=f"Offering {n}", type=OfferingType.service, price=n)
+                    for n in range(5)
+                ]
+            )
+        db.commit()
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def cold_cache():
+    catalog_cache.clear()
+
+
+def test_company_list_loads_no_relationships(client):
+    with assert_max_queries(2):
+        response = client.get("/api/companies/")
+    assert response.status_code == 200
+    assert {company["id"] for company in response.json()} >= {101, 102}
+
+
+def test_company_read_loads_no_relationships(client):
+    with assert_max_queries(1):
+        response = client.get("/api/companies/101")
+    assert response.status_code == 200
+    assert response.json()["name"] == "Company 101"
+
+
+def test_company_read_cached_runs_no_queries(client):
+    client.get("/api/companies/102")
+    with capture_queries() as log:
+        response = client.get("/api/companies/102")
+    assert response.status_code == 200
+    assert log.count == 0
+
+
+@pytest.mark.parametrize("path", ["/api/products?company_id=101", "/api/offerings?company_id=101"])
+def test_catalog_list_is_state_plus_one_query(client, path):
+    with assert_max_queries(2):
+        response = client.get(path)
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+
+
+def test_all_items_is_two_states_plus_two_queries(client):
+    with capture_queries() as log:
+        response = client.get("/api/company/101/all-items")
+    assert response.status_code == 200
+    assert response.json()["total"] == 10
+    assert log.count <= 4
+    assert not log.repeated(threshold=3)
+
+
+@pytest.mark.parametrize("model, path", [(Product, "/api/products/{}"), (Offering, "/api/offerings/{}")])
+def test_catalog_item_read_loads_no_relationships(client, model, path):
+    with SessionLocal() as db:
+        item_id = db.query(model.id).filter(model.company_id == 101).first().id
+    with assert_max_queries(1):
+        response = client.get(path.format(item_id))
+    assert response.status_code == 200
+    assert response.json()["id"] == item_id
+
+    catalog_cache.clear()
+    # Conditional request with a stale validator: metadata, then the full row
+    with assert_max_queries(2):
+        response = client.get(path.format(item_id), headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
@@ -0,0 +1,18 @@
+from types import SimpleNamespace
+
+import query_guard
+from query_guard import statement_shape
+
+
+def test_statement_shape_folds_values_and_in_lists():
+    assert statement_shape("SELECT * FROM t WHERE id IN (1, 2, 3) AND name = 'x'") == (
+        "SELECT * FROM t WHERE id IN (?) AND name = ?"
+    )
+
+
+def test_statement_finishing_after_install_is_ignored():
+    # install() ran while this statement was executing: no start time recorded
+    conn = SimpleNamespace(info={})
+    query_guard._after_cursor_execute(conn, None, "SELECT 1", (), None, False)
+    conn.info["query_guard_started"] = []
+    query_guard._after_cursor_execute(conn, None, "SELECT 1", (), None, False)
@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+
+from resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    UPSTREAM_HEDGE_BURST,
+    UPSTREAM_LATENCY_MIN_SAMPLES,
+    CircuitBreaker,
+    CircuitOpenError,
+    Upstream,
+)
+
+
+def opened(breaker: CircuitBreaker) -> CircuitBreaker:
+    for _ in range(breaker.failure_threshold):
+        breaker.acquire()
+        breaker.failure()
+    return breaker
+
+
+def test_circuit_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_seconds=60)
+    for _ in range(2):
+        breaker.acquire()
+        breaker.failure()
+    assert breaker.state == CLOSED
+    breaker.acquire()
+    breaker.failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.acquire()
+    assert excinfo.value.retry_after > 0
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=60)
+    breaker.acquire()
+    breaker.failure()
+    breaker.acquire()
+    breaker.success()
+    breaker.acquire()
+    breaker.failure()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_admits_a_single_probe():
+    breaker = opened(CircuitBreaker("test", failure_threshold=2, reset_seconds=0))
+    breaker.acquire()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+    breaker.success()
+    assert breaker.state == CLOSED
+    breaker.acquire()
+
+
+def test_failed_probe_reopens():
+    breaker = opened(CircuitBreaker("test", failure_threshold=2, reset_seconds=0))
+    breaker.acquire()
+    breaker.failure()
+    assert breaker.state == OPEN
+
+
+def test_cancelled_probe_releases_the_slot():
+    breaker = opened(CircuitBreaker("test", failure_threshold=2, reset_seconds=0))
+    upstream = Upstream("test", breaker=breaker, hedge=False)
+
+    async def main():
+        probe = asyncio.ensure_future(upstream.call(lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        assert breaker.state == HALF_OPEN
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        # Cancellation says nothing about the upstream: the next call may probe
+        assert await upstream.call(lambda: asyncio.sleep(0, result="ok")) == "ok"
+
+    asyncio.run(main())
+    assert breaker.state == CLOSED
+
+
+def fast_history(upstream: Upstream, seconds: float = 0.001) -> Upstream:
+    for _ in range(UPSTREAM_LATENCY_MIN_SAMPLES):
+        upstream.latencies.add(seconds)
+    return upstream
+
+
+def test_hedge_wins_over_a_slow_primary():
+    upstream = fast_history(Upstream("test", breaker=CircuitBreaker("test"), hedge=True))
+    attempts = []
+
+    async def attempt():
+        attempts.append(len(attempts))
+        await asyncio.sleep(5 if len(attempts) == 1 else 0.01)
+        return len(attempts)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await upstream.call(attempt)
+        return result, loop.time() - started
+
+    result, elapsed = asyncio.run(main())
+    assert len(attempts) == 2
+    assert result == 2
+    assert elapsed < 1
+
+
+def test_no_hedge_without_tokens():
+    upstream = fast_history(Upstream("test", breaker=CircuitBreaker("test"), hedge=True))
+    upstream._hedge_tokens = 0
+    attempts = []
+
+    async def attempt():
+        attempts.append(1)
+        await asyncio.sleep(0.2)
+        return "primary"
+
+    assert asyncio.run(upstream.call(attempt)) == "primary"
+    assert len(attempts) == 1
+
+
+def test_hedges_are_capped_by_the_token_bucket(monkeypatch):
+    upstream = Upstream("test", breaker=CircuitBreaker("test"), hedge=True)
+    # Fixed delay: the calls' own latencies must not move it past the attempts
+    monkeypatch.setattr(upstream, "hedge_delay", lambda: 0.01)
+    attempts = []
+
+    async def attempt():
+        attempts.append(1)
+        await asyncio.sleep(0.05)
+
+    async def main():
+        for _ in range(10):
+            await upstream.call(attempt)
+
+    asyncio.run(main())
+    # Each call adds UPSTREAM_HEDGE_RATIO tokens, on top of the burst allowance
+    hedges = len(attempts) - 10
+    assert hedges == int(UPSTREAM_HEDGE_BURST)
+    assert upstream._hedge_tokens < 1
+
+
+def test_failed_attempts_count_towards_the_latency_window():
+    upstream = Upstream("test", breaker=CircuitBreaker("test"), hedge=False)
+
+    async def timing_out():
+        await asyncio.sleep(0.05)
+        raise asyncio.TimeoutError
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(upstream.call(timing_out))
+    assert asyncio.run(upstream.call(lambda: asyncio.sleep(0, result="ok"))) == "ok"
+    assert len(upstream.latencies) == 2
+    assert upstream.latencies.quantile(0.95) >= 0.05
@@ -0,0 +1,95 @@
+"""Outbox rounds against SQLite, with Qdrant and the provider replaced by a recorder."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import delete, select
+
+import vector_sync
+from database import SessionLocal
+from models import Company, VectorOutbox
+from vector_sync import UPSERT, SyncFailed, VectorSyncWorker
+
+POISON = 303
+
+
+@pytest.fixture
+def applied(engine, monkeypatch):
+    calls = []
+
+    def apply_companies(live, gone, collection=None):
+        ids = [row[0] for row in live] + list(gone)
+        calls.append(ids)
+        if POISON in ids:
+            raise ValueError("cannot embed")
+        return len(live), len(gone)
+
+    monkeypatch.setattr(vector_sync, "apply_companies", apply_companies)
+    with SessionLocal() as db:
+        db.execute(delete(VectorOutbox))
+        for company_id in (301, 302, POISON, 304):
+            if db.get(Company, company_id) is None:
+                db.add(Company(id=company_id, name=f"Company {company_id}", details="Details"))
+        db.commit()
+    return calls
+
+
+def enqueue(*company_ids, **values):
+    with SessionLocal() as db:
+        db.add_all(VectorOutbox(company_id=company_id, op=UPSERT, **values) for company_id in company_ids)
+        db.commit()
+
+
+def outbox():
+    with SessionLocal() as db:
+        return {row.company_id: row for row in db.scalars(select(VectorOutbox))}
+
+
+def test_a_failing_company_is_isolated(applied):
+    enqueue(301, 302, POISON, 304)
+    assert VectorSyncWorker().run_once() == 4
+
+    assert applied[0] == [301, 302, POISON, 304]
+    left = outbox()
+    assert list(left) == [POISON]
+    assert left[POISON].attempts == 1
+    assert left[POISON].last_error == "ValueError: cannot embed"
+    assert left[POISON].leased_until is None
+    assert left[POISON].dead_lettered_at is None
+    assert vector_sync._as_utc(left[POISON].available_at) > datetime.now(timezone.utc)
+
+
+def test_events_are_dead_lettered_after_max_attempts(applied, monkeypatch):
+    monkeypatch.setattr(vector_sync, "VECTOR_SYNC_MAX_ATTEMPTS", 2)
+    enqueue(POISON, attempts=1)
+    with pytest.raises(SyncFailed):
+        VectorSyncWorker().run_once()
+
+    dead = outbox()[POISON]
+    assert dead.attempts == 2
+    assert dead.dead_lettered_at is not None
+
+    with SessionLocal() as db:
+        db.get(VectorOutbox, dead.id).available_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+        db.commit()
+    assert VectorSyncWorker().run_once() == 0
+
+
+def test_companies_leased_by_another_worker_wait(applied):
+    enqueue(301, leased_until=datetime.now(timezone.utc) + timedelta(minutes=5),
+            available_at=datetime.now(timezone.utc) + timedelta(minutes=5))
+    enqueue(301, 302)
+    assert VectorSyncWorker().run_once() == 1
+    assert applied == [[302]]
+    assert len([row for row in outbox().values() if row.company_id == 301]) == 1
+
+
+def test_events_leased_past_their_lease_are_not_deleted(applied, monkeypatch):
+    enqueue(301)
+    worker = VectorSyncWorker()
+    claimed, lease = worker._claim()
+    # Another worker re-claimed them after the lease ran out
+    with SessionLocal() as db:
+        db.get(VectorOutbox, claimed[0].id).leased_until = lease + timedelta(seconds=1)
+        db.commit()
+    worker._settle(claimed, lease, {})
+    assert 301 in outbox()
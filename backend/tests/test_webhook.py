@@ -0,0 +1,67 @@
+"""Vapi webhook: tenant selection and tool-call replays, with the answer pipeline stubbed."""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from idempotency import webhook_results
+from routes import assistant
+
+
+@pytest.fixture
+def client(monkeypatch):
+    computed = []
+
+    async def answer_question(question, company_id=None, read_only=False):
+        computed.append((company_id, question))
+        return f"{company_id}: {question}"
+
+    monkeypatch.setattr(assistant, "answer_question", answer_question)
+    monkeypatch.setattr(webhook_results, "_entries", type(webhook_results._entries)())
+    app = FastAPI()
+    app.include_router(assistant.router, prefix="/api")
+    client = TestClient(app)
+    client.computed = computed
+    return client
+
+
+def tool_call(question, call_id="call-1"):
+    return {"message": {"toolCalls": [{"id": call_id, "function": {"arguments": {"question": question}}}]}}
+
+
+def ask(client, payload, company_id):
+    response = client.post(f"/api/webhook?company_id={company_id}", json=payload)
+    assert response.status_code == 200
+    return response.json()["results"][0]["result"]
+
+
+def test_retry_of_a_tool_call_replays_its_answer(client):
+    assert ask(client, tool_call("How much is the knee brace?"), 1) == "1: How much is the knee brace?"
+    assert ask(client, tool_call("How much is the knee brace?"), 1) == "1: How much is the knee brace?"
+    assert len(client.computed) == 1
+
+
+def test_a_reused_tool_call_id_never_replays_another_tenants_answer(client):
+    ask(client, tool_call("How much is the knee brace?"), 1)
+    assert ask(client, tool_call("How much is the knee brace?"), 2) == "2: How much is the knee brace?"
+    assert client.computed == [(1, "How much is the knee brace?"), (2, "How much is the knee brace?")]
+
+
+def test_a_reused_tool_call_id_with_another_question_is_answered_afresh(client):
+    ask(client, tool_call("How much is the knee brace?"), 1)
+    assert ask(client, tool_call("What are your opening hours?"), 1) == "1: What are your opening hours?"
+    assert len(client.computed) == 2
+
+
+@pytest.mark.parametrize("payload", [
+    {"message": None, "question": "Hello?"},
+    {"message": {"call": None, "assistant": None}, "call": None, "question": "Hello?"},
+    {"message": {"call": {"assistant": None}}, "question": "Hello?"},
+])
+def test_null_sections_of_the_payload_are_tolerated(client, payload):
+    assert ask(client, payload, 1) == "1: Hello?"
+
+
+def test_tool_arguments_never_select_the_tenant(client):
+    payload = tool_call("How much is the knee brace?")
+    payload["message"]["toolCalls"][0]["function"]["arguments"]["company_id"] = 2
+    assert ask(client, payload, 1) == "1: How much is the knee brace?"
@@ -0,0 +1,106 @@
+# vector_store.py
+"""Process-wide Qdrant client, created on first use.
+
+QDRANT_LOCATION=":memory:" (or a path) runs Qdrant embedded, for offline
+runs; otherwise QDRANT_HOST / QDRANT_PORT point at a server.
+
+`search()` is the request-path entry point: against a server it uses
+AsyncQdrantClient, so a deadline or cancellation aborts the HTTP call.
+Embedded Qdrant has no connection to abort and cannot be opened twice, so
+there the sync client runs in a thread.
+
+COLLECTION_NAME is an alias: scripts/sync_companies_to_qdrant.py rebuilds
+into a versioned collection and swaps the alias when it is ready, so
+searches never see a half-built index.
+"""
+import asyncio
+import math
+import os
+import threading
+from typing import Optional
+
+QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
+QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
+QDRANT_LOCATION = os.getenv("QDRANT_LOCATION")
+# Alias for the live companies_v<timestamp> collection (a plain collection before the first rebuild)
+COLLECTION_NAME = "companies"
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def create_client(location: Optional[str] = QDRANT_LOCATION):
+    from qdrant_client import QdrantClient
+
+    if location == ":memory:":
+        return QdrantClient(location=location)
+    if location:
+        return QdrantClient(path=location)
+    return QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = create_client()
+    return _client
+
+
+def get_async_client():
+    """AsyncQdrantClient for a Qdrant server; None when running embedded"""
+    global _async_client
+    if QDRANT_LOCATION:
+        return None
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                from qdrant_client import AsyncQdrantClient
+
+                _async_client = AsyncQdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+    return _async_client
+
+
+async def search(collection_name: str, query_vector, limit: int, timeout: Optional[float] = None):
+    """Scored points with payloads, giving up after `timeout` seconds"""
+    client = get_async_client()
+    if client is None:
+        call = asyncio.to_thread(
+            get_client().search,
+            collection_name=collection_name,
+            query_vector=query_vector,
+            limit=limit,
+            with_payload=True,
+        )
+    else:
+        call = client.search(
+            collection_name=collection_name,
+            query_vector=query_vector,
+            limit=limit,
+            with_payload=True,
+            # Server-side limit is whole seconds; the wait_for below is exact
+            timeout=max(1, math.ceil(timeout)) if timeout is not None else None,
+        )
+    return await asyncio.wait_for(call, timeout)
+
+
+def warm() -> None:
+    """Create the client and make one round trip, so the first search is not the slow one"""
+    get_client().get_collections()
+
+
+def close_client() -> None:
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+async def close_async_client() -> None:
+    global _async_client
+    client, _async_client = _async_client, None
+    if client is not None:
+        await client.close()
@@ -0,0 +1,328 @@
+# vector_sync.py
+"""Near-real-time Qdrant sync of company details through a transactional outbox.
+
+Company write routes call `enqueue(db, company_id, op)` before committing.
+It adds a `vector_outbox` row in the same transaction, so an event exists
+exactly when the change does. On Postgres it also queues a NOTIFY that
+wakes the sync worker of every process. Otherwise the worker wakes after
+the local commit, or on its VECTOR_SYNC_POLL_SECONDS poll.
+
+`vector_sync` is one background thread per process. Each round it:
+- claims up to VECTOR_SYNC_BATCH_SIZE due events with FOR UPDATE SKIP
+  LOCKED, leases them for VECTOR_SYNC_LEASE_SECONDS and commits, so no
+  lock or connection is held through the network calls that follow;
+- re-reads the affected companies, embeds the live ones in one batch and
+  upserts them into the `companies` alias, and deletes the points of
+  companies that are gone;
+- deletes the events it applied, in a second short transaction.
+Events carry no data of their own: the current row decides, so replays
+and out-of-order events are harmless. A company with events leased by
+another worker is left alone, so two workers never write one company's
+point in the wrong order; on Postgres a per-company advisory lock makes
+that check safe against concurrent claims. A worker that dies mid-round
+leaves its lease to expire, and the events become due again.
+
+A failed batch is retried in halves, down to single companies, so one
+event that cannot be applied does not hold up the rest. Failed events are
+pushed back with exponential backoff; after VECTOR_SYNC_MAX_ATTEMPTS they
+are dead-lettered (see VectorOutbox) instead of being retried forever.
+
+Answers cached from the old vectors are invalidated once the new ones are
+in, through the same catalog-generation bump a catalog write causes.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.orm import Session
+
+import vector_store
+from database import SessionLocal
+from llm import get_provider
+from models import Company, VectorOutbox
+from observability import registry
+from pg_notify import listener, notify
+from tenant_cache import catalog_cache
+
+logger = logging.getLogger(__name__)
+
+VECTOR_SYNC_ENABLED = os.getenv("VECTOR_SYNC_ENABLED", "1") != "0"
+VECTOR_SYNC_BATCH_SIZE = int(os.getenv("VECTOR_SYNC_BATCH_SIZE", "100"))
+VECTOR_SYNC_POLL_SECONDS = float(os.getenv("VECTOR_SYNC_POLL_SECONDS", "5"))
+VECTOR_SYNC_MAX_BACKOFF = float(os.getenv("VECTOR_SYNC_MAX_BACKOFF", "300"))
+VECTOR_SYNC_SHUTDOWN_SECONDS = float(os.getenv("VECTOR_SYNC_SHUTDOWN_SECONDS", "10"))
+VECTOR_SYNC_MAX_ATTEMPTS = int(os.getenv("VECTOR_SYNC_MAX_ATTEMPTS", "12"))
+# Claimed events go back to the queue after this, should their worker die
+VECTOR_SYNC_LEASE_SECONDS = float(os.getenv("VECTOR_SYNC_LEASE_SECONDS", "300"))
+VECTOR_OUTBOX_CHANNEL = "vector_outbox"
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+SYNC_EVENTS = registry.counter(
+    "vector_sync_events_total", "Outbox events by outcome (applied, retried, dead_lettered)", ("result",)
+)
+SYNC_POINTS = registry.counter("vector_sync_points_total", "Qdrant points written by the outbox worker", ("op",))
+SYNC_LAG = registry.histogram(
+    "vector_sync_lag_seconds", "Time from a company write to its vector being searchable",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+SYNC_ROUND = registry.histogram("vector_sync_round_seconds", "Time to apply one batch of outbox events")
+
+
+def enqueue(db: Session, company_id: int, op: str = UPSERT) -> None:
+    """Record that a company's vector needs refreshing, in the caller's transaction"""
+    db.add(VectorOutbox(company_id=company_id, op=op))
+    if not db.info.get("vector_outbox_pending"):
+        db.info["vector_outbox_pending"] = True
+        notify(db, VECTOR_OUTBOX_CHANNEL, "")
+
+
+def company_text(name: str, details: str) -> str:
+    """The text a company's vector is embedded from"""
+    # Companies without details are still findable by name
+    return details or name
+
+
+def company_points(rows: Sequence[Tuple[int, str, str]]) -> list:
+    """Qdrant points for (id, name, details) rows, embedded in one batch"""
+    from qdrant_client.http import models as rest
+
+    vectors = get_provider().embed_batch([company_text(name, details) for _, name, details in rows])
+    return [
+        rest.PointStruct(id=cid, vector=vector, payload={"name": name, "details": details})
+        for (cid, name, details), vector in zip(rows, vectors)
+    ]
+
+
+def company_rows(db: Session, company_ids: Iterable[int]) -> Tuple[List[Tuple[int, str, str]], List[int]]:
+    """(id, name, details) of the companies that exist, and the ids of those that do not"""
+    company_ids = sorted(set(company_ids))
+    rows = db.execute(
+        select(Company.id, Company.name, Company.details).where(Company.id.in_(company_ids))
+    ).all()
+    live = [(row.id, row.name, row.details or "") for row in rows]
+    gone = sorted(set(company_ids) - {row.id for row in rows})
+    return live, gone
+
+
+def sync_companies(db: Session, company_ids: Iterable[int], collection: str = vector_store.COLLECTION_NAME) -> Tuple[int, int]:
+    """Make the companies' points match their current rows; returns (upserted, deleted)"""
+    return apply_companies(*company_rows(db, company_ids), collection=collection)
+
+
+def apply_companies(
+    live: Sequence[Tuple[int, str, str]], gone: Sequence[int], collection: str = vector_store.COLLECTION_NAME
+) -> Tuple[int, int]:
+    """Upsert the live companies' points and delete the gone ones'; returns (upserted, deleted)"""
+    from qdrant_client.http import models as rest
+
+    client = vector_store.get_client()
+    if live:
+        client.upsert(collection_name=collection, points=company_points(live), wait=True)
+    if gone:
+        client.delete(collection_name=collection, points_selector=rest.PointIdsList(points=list(gone)), wait=True)
+    return len(live), len(gone)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands timestamps back naive
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def _backoff(attempts: int) -> float:
+    return min(VECTOR_SYNC_MAX_BACKOFF, 2.0 ** attempts)
+
+
+def _describe(exc: Exception) -> str:
+    return f"{exc.__class__.__name__}: {exc}"[:1000]
+
+
+class SyncFailed(Exception):
+    """Not one company of a round could be applied: likely Qdrant or the provider"""
+
+
+class VectorSyncWorker:
+    def __init__(self, batch_size: int = VECTOR_SYNC_BATCH_SIZE, poll_seconds: float = VECTOR_SYNC_POLL_SECONDS):
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> bool:
+        if not VECTOR_SYNC_ENABLED or self.running:
+            return False
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="vector-sync", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self, timeout: float = VECTOR_SYNC_SHUTDOWN_SECONDS) -> None:
+        """Stop after the round in progress; unapplied events stay in the outbox"""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def wake(self, payload: str = "") -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        failures = 0
+        while not self._stopping.is_set():
+            self._wake.clear()
+            try:
+                claimed = self.run_once()
+                failures = 0
+            except Exception:
+                failures += 1
+                logger.exception("Vector sync round failed; retrying in %.0fs", _backoff(failures))
+                self._stopping.wait(_backoff(failures))
+                continue
+            # A full batch means more is probably waiting
+            if claimed < self.batch_size:
+                self._wake.wait(self.poll_seconds)
+
+    def run_once(self) -> int:
+        """Apply one batch of due events; returns how many were claimed"""
+        started = time.perf_counter()
+        claimed, lease = self._claim()
+        if not claimed:
+            return 0
+        # A short read of its own: nothing stays open through embedding and Qdrant
+        with SessionLocal() as db:
+            live, gone = company_rows(db, {row.company_id for row in claimed})
+        upserted, deleted, failed = self._apply([(row[0], row) for row in live] + [(cid, None) for cid in gone])
+        self._settle(claimed, lease, failed)
+
+        applied = [row for row in claimed if row.company_id not in failed]
+        applied_at = datetime.now(timezone.utc)
+        for row in applied:
+            SYNC_LAG.observe((applied_at - _as_utc(row.created_at)).total_seconds())
+        SYNC_EVENTS.inc(len(applied), result="applied")
+        SYNC_POINTS.inc(upserted, op=UPSERT)
+        SYNC_POINTS.inc(deleted, op=DELETE)
+        SYNC_ROUND.observe(time.perf_counter() - started)
+        if not applied:
+            # Back the whole worker off, not just these events
+            raise SyncFailed(next(iter(failed.values())))
+        return len(claimed)
+
+    def _claim(self) -> Tuple[list, datetime]:
+        """Lease up to batch_size due events; returns them and the lease that marks them ours"""
+        now = datetime.now(timezone.utc)
+        lease = now + timedelta(seconds=VECTOR_SYNC_LEASE_SECONDS)
+        with SessionLocal() as db:
+            due = db.execute(
+                select(VectorOutbox.id, VectorOutbox.company_id, VectorOutbox.attempts, VectorOutbox.created_at)
+                .where(VectorOutbox.available_at <= now, VectorOutbox.dead_lettered_at.is_(None))
+                .order_by(VectorOutbox.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not due:
+                return [], lease
+            company_ids = sorted({row.company_id for row in due})
+            self._lock_companies(db, company_ids)
+            # Companies another worker is applying wait for its round to end
+            busy = set(db.scalars(
+                select(VectorOutbox.company_id)
+                .where(VectorOutbox.company_id.in_(company_ids), VectorOutbox.leased_until > now)
+            ).all())
+            claimed = [row for row in due if row.company_id not in busy]
+            if claimed:
+                db.execute(
+                    update(VectorOutbox)
+                    .where(VectorOutbox.id.in_([row.id for row in claimed]))
+                    .values(available_at=lease, leased_until=lease)
+                )
+            db.commit()
+        return claimed, lease
+
+    def _apply(self, items: List[Tuple[int, Optional[tuple]]]) -> Tuple[int, int, Dict[int, str]]:
+        """Sync (company id, row or None when gone) items, halving on failure; returns (upserted, deleted, errors)"""
+        try:
+            upserted, deleted = apply_companies(
+                [row for _, row in items if row is not None], [cid for cid, row in items if row is None]
+            )
+            return upserted, deleted, {}
+        except Exception as exc:
+            if len(items) == 1:
+                logger.warning("Vector sync of company %s failed: %s", items[0][0], _describe(exc))
+                return 0, 0, {items[0][0]: _describe(exc)}
+            logger.warning("Vector sync of %d companies failed (%s); retrying in halves", len(items), _describe(exc))
+        middle = len(items) // 2
+        first, second = self._apply(items[:middle]), self._apply(items[middle:])
+        return first[0] + second[0], first[1] + second[1], {**first[2], **second[2]}
+
+    def _settle(self, claimed: list, lease: datetime, failed: Dict[int, str]) -> None:
+        """Delete the applied events and push the failed ones back, or dead-letter them"""
+        now = datetime.now(timezone.utc)
+        ours = VectorOutbox.leased_until == lease
+        with SessionLocal() as db:
+            applied = [row.id for row in claimed if row.company_id not in failed]
+            if applied:
+                # Only while still ours: past the lease another worker owns them
+                db.execute(delete(VectorOutbox).where(VectorOutbox.id.in_(applied), ours))
+            dead = 0
+            for row in claimed:
+                if row.company_id not in failed:
+                    continue
+                attempts = row.attempts + 1
+                values = dict(
+                    attempts=attempts,
+                    last_error=failed[row.company_id],
+                    leased_until=None,
+                    available_at=now + timedelta(seconds=_backoff(attempts)),
+                )
+                if attempts >= VECTOR_SYNC_MAX_ATTEMPTS:
+                    values["dead_lettered_at"] = now
+                    dead += 1
+                db.execute(update(VectorOutbox).where(VectorOutbox.id == row.id, ours).values(**values))
+            # Answers cached from the old vectors go stale here and in every worker
+            synced = {row.company_id for row in claimed} - set(failed)
+            if synced:
+                catalog_cache.invalidate(db, *synced)
+            db.commit()
+        if dead:
+            logger.error(
+                "Dead-lettered %d vector outbox events after %d attempts", dead, VECTOR_SYNC_MAX_ATTEMPTS
+            )
+            SYNC_EVENTS.inc(dead, result="dead_lettered")
+        retried = sum(row.company_id in failed for row in claimed) - dead
+        if retried:
+            SYNC_EVENTS.inc(retried, result="retried")
+
+    @staticmethod
+    def _lock_companies(db: Session, company_ids: List[int]) -> None:
+        # Held until the claim commits, so a concurrent claim sees our leases;
+        # sorted so two workers cannot deadlock
+        if db.get_bind().dialect.name == "postgresql":
+            for company_id in company_ids:
+                db.execute(select(func.pg_advisory_xact_lock(func.hashtext(VECTOR_OUTBOX_CHANNEL), company_id)))
+
+
+vector_sync = VectorSyncWorker()
+
+listener.subscribe(VECTOR_OUTBOX_CHANNEL, vector_sync.wake)
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session):
+    if session.info.pop("vector_outbox_pending", False):
+        vector_sync.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop("vector_outbox_pending", None)
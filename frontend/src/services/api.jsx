@@ -9,19 +9,38 @@ const api = axios.create({
   },
 });
 
+// After a write the API asks for reads from the primary until this Unix time,
+// so the dashboard sees its own changes despite replica lag
+const PRIMARY_UNTIL_HEADER = "x-primary-until";
+let primaryUntil = 0;
+
+const rememberPrimaryUntil = (response) => {
+  const until = Number(response?.headers?.[PRIMARY_UNTIL_HEADER]);
+  if (until > primaryUntil) {
+    primaryUntil = until;
+  }
+};
+
 // Add token to requests if available
 api.interceptors.request.use((config) => {
   const token = localStorage.getItem("auth_token");
   if (token) {
     config.headers.Authorization = `Bearer ${token}`;
   }
+  if (primaryUntil > Date.now() / 1000) {
+    config.headers[PRIMARY_UNTIL_HEADER] = String(primaryUntil);
+  }
   return config;
 });
 
 // Handle token expiration
 api.interceptors.response.use(
-  (response) => response,
+  (response) => {
+    rememberPrimaryUntil(response);
+    return response;
+  },
   (error) => {
+    rememberPrimaryUntil(error.response);
     if (error.response?.status === 401) {
       localStorage.removeItem("auth_token");
       localStorage.removeItem("user");